@@ -1,5 +1,6 @@
 import os
 from datetime import timedelta
+from pathlib import Path
 from typing import Dict, Any
 from uuid import UUID
 
@@ -7,9 +8,66 @@ from uuid import UUID
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Кэш пользователей по токену в каждом процессе (0 секунд — выключен)
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_ENTRIES", "10000"))
+# Отозванные токены (выход из системы): "database" — общая таблица для всех процессов, "memory" — только свой процесс
+REVOCATION_STORE = os.getenv("REVOCATION_STORE", "database")
+# Как часто процесс подгружает отзывы, сделанные другими процессами, секунд
+REVOCATION_SYNC_INTERVAL = float(os.getenv("REVOCATION_SYNC_INTERVAL", "1.0"))
+# Потоки для bcrypt при входе и регистрации и сколько запросов может ждать своей очереди (0 — без ограничения)
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", str(max(1, (os.cpu_count() or 1) // 2))))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
 
 # Database
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+# Пул соединений асинхронного engine (services/database.py)
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "10"))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "20"))
+
+# Загрузка файлов
+BASE_DIR = Path(__file__).parent.parent
+UPLOADS_DIR = Path(os.getenv("UPLOADS_DIR", str(BASE_DIR / "uploads")))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+# Наибольший размер одного входного файла — и обычной загрузки, и загрузки по частям
+UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", str(100 * 1024 ** 3)))
+
+# Возобновляемая загрузка по частям
+UPLOAD_SESSION_MIN_CHUNK = int(os.getenv("UPLOAD_SESSION_MIN_CHUNK", str(256 * 1024)))
+UPLOAD_SESSION_MAX_CHUNK = int(os.getenv("UPLOAD_SESSION_MAX_CHUNK", str(64 * 1024 * 1024)))
+
+# Обработка задач анализа
+RESULTS_DIR = Path(os.getenv("RESULTS_DIR", str(BASE_DIR / "results")))
+WORKER_ENABLED = os.getenv("WORKER_ENABLED", "1") == "1"
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", str(os.cpu_count() or 1)))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "2.0"))
+SHARD_MIN_BYTES = int(os.getenv("SHARD_MIN_BYTES", str(32 * 1024 * 1024)))
+# Перепаковка загруженного gzip в BGZF при приёме: уровень сжатия и потоки на один файл
+BGZF_COMPRESSION_LEVEL = int(os.getenv("BGZF_COMPRESSION_LEVEL", "6"))
+BGZF_THREADS = int(os.getenv("BGZF_THREADS", str(max(1, (os.cpu_count() or 1) // 2))))
+# Память на таблицу дерепликации в каждом процессе пула; сверх неё — сброс на диск
+DEREP_MEMORY_BYTES = int(os.getenv("DEREP_MEMORY_BYTES", str(512 * 1024 * 1024)))
+# Оснований в пачке длинных прочтений Nanopore: память обработки пачки растёт с этим числом
+NANOPORE_BATCH_BASES = int(os.getenv("NANOPORE_BATCH_BASES", str(1024 * 1024)))
+# Пиковая память измеряется (tracemalloc) у каждой N-й пачки Nanopore; 0 — не измеряется
+NANOPORE_BATCH_MEMORY_SAMPLE = int(os.getenv("NANOPORE_BATCH_MEMORY_SAMPLE", "16"))
+# Поток событий задач (GET /api/analysis/events): очередь каждого подписчика,
+# интервал пустых сообщений для прокси и время жизни потока: браузер переподключается,
+# токен проверяется заново, а остановка сервера не ждёт открытых потоков дольше этого
+JOB_EVENTS_QUEUE_SIZE = int(os.getenv("JOB_EVENTS_QUEUE_SIZE", "100"))
+JOB_EVENTS_KEEPALIVE = float(os.getenv("JOB_EVENTS_KEEPALIVE", "15"))
+JOB_EVENTS_STREAM_SECONDS = float(os.getenv("JOB_EVENTS_STREAM_SECONDS", "60"))
+# Индексы референсов: REFERENCE_DIR/<ref_seq>_<ref_db>/<версия>/ (backend/pipeline/references.py)
+REFERENCE_DIR = Path(os.getenv("REFERENCE_DIR", str(BASE_DIR / "references")))
+
+# Кэш классификации между задачами: файл SQLite (0 байт — кэш выключен) и LRU в каждом процессе пула
+CACHE_DIR = Path(os.getenv("CACHE_DIR", str(BASE_DIR / "cache")))
+CLASSIFY_CACHE_BYTES = int(os.getenv("CLASSIFY_CACHE_BYTES", str(1024 * 1024 * 1024)))
+CLASSIFY_CACHE_ENTRIES = int(os.getenv("CLASSIFY_CACHE_ENTRIES", "200000"))
+# Выходы этапов конвейера для повторных запусков с частично изменёнными параметрами (0 — выключено)
+STAGE_CACHE_BYTES = int(os.getenv("STAGE_CACHE_BYTES", str(10 * 1024 * 1024 * 1024)))
+# Пользователи с доступом к администрированию (сборка индексов референсов), через запятую
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()}
 
 # Типы для аннотаций
 UserDict = Dict[str, Any]
@@ -1,10 +1,15 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
-from .routers import pages, auth, protected, analysis
-from .services.database import init_db, engine
+from .routers import pages, auth, protected, analysis, uploads, references
+from .services.database import init_db, engine, async_engine, SessionLocal
 from .services.task_manager import cleanup_processes
+from .services.job_runner import job_runner
+from .services.password import hasher
+from .services.metrics import JobMetrics, MetricsMiddleware, registry
+from .config import WORKER_ENABLED
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 app = FastAPI(
     title="Metabarcoding Web",
@@ -14,6 +19,7 @@ app = FastAPI(
         {"name": "Pages", "description": "HTML pages for user interface"},
         {"name": "Auth", "description": "Authentication and authorization"},
         {"name": "Analysis", "description": "Data analysis endpoints"},
+        {"name": "References", "description": "Reference databases for taxonomy classification"},
     ]
 )
 
@@ -24,11 +30,16 @@ app.include_router(pages.router)
 app.include_router(auth.router)
 app.include_router(protected.router, prefix="/private", tags=["protected"])
 app.include_router(analysis.router)
+app.include_router(uploads.router)
+app.include_router(references.router)
 
 @app.on_event("startup")
 async def startup_event():
     init_db()
     print("База данных инициализирована")
+    hasher.start()
+    if WORKER_ENABLED:
+        await job_runner.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -36,12 +47,20 @@ async def shutdown_event():
     cleanup_processes()
     print("Закрытие соединений с базой данных...")
     engine.dispose()
+    await async_engine.dispose()
     print("Сервер корректно завершает работу")
 
 @app.get("/ping", tags=["Health"], summary="Health check")
 async def ping():
     return {"status": "ok"}
 
+registry.register(JobMetrics(SessionLocal, job_runner))
+
+# Синхронный обработчик: сбор читает очередь задач из БД в пуле потоков, не в event loop
+@app.get("/metrics", tags=["Health"], summary="Prometheus metrics")
+def metrics():
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # В продакшене нужно настроить правильно
@@ -49,6 +68,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Внешний слой: в длительность запроса входят и остальные middleware
+app.add_middleware(MetricsMiddleware)
 
 # Для запуска с автоматическим подбором порта (опционально)
 if __name__ == "__main__":
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, UUID
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Boolean, ForeignKey, Text, UUID, UniqueConstraint, Index
 from sqlalchemy.sql import func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -24,16 +24,96 @@ class User(Base):
 
 class AnalysisJob(Base):
     __tablename__ = "analysis_jobs"
+    # Список задач пользователя: постраничная выборка по id (новые первыми) без сортировки
+    __table_args__ = (Index("ix_analysis_jobs_user_id", "user_id", "id"),)
     
     id = Column(Integer, primary_key=True, index=True)
     job_id = Column(String(36), unique=True, index=True, nullable=False)  # UUID как строка
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     type = Column(String(20), nullable=False)
     file_path = Column(String(500), nullable=False)
+    input_hash = Column(String(64), index=True, nullable=True)  # sha256 файла в хранилище blobs
+    file_path_r2 = Column(String(500), nullable=True)  # R2 для парных прочтений двумя файлами
+    input_hash_r2 = Column(String(64), index=True, nullable=True)
+    file_size = Column(BigInteger, nullable=True)
+    upload_throughput = Column(Float, nullable=True)  # МБ/с при загрузке
+    qc_summary = Column(Text, nullable=True)  # JSON со статистикой качества
     parameters = Column(Text, nullable=False)
-    status = Column(String(20), default="pending")
+    analysis_name = Column(String(255), nullable=True)  # копия из parameters: список задач не разбирает JSON
+    status = Column(String(20), default="pending", index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
     completed_at = Column(DateTime(timezone=True), nullable=True)
     result_path = Column(String(500), nullable=True)
+    result_key = Column(String(64), index=True, nullable=True)  # хэш входа и параметров (services/job_results)
+    reused_job_id = Column(String(36), nullable=True)  # задача, чей результат переиспользован
+    stages = Column(Text, nullable=True)  # JSON: ключ каждого этапа и взят ли его выход из кэша этапов
+    worker_id = Column(String(100), nullable=True)  # host:pid процесса, взявшего задачу
+    error_message = Column(Text, nullable=True)
+    cache_hit_rate = Column(Float, nullable=True)  # доля уникальных последовательностей из кэша классификации
+    cache_bytes_saved = Column(BigInteger, nullable=True)  # байты последовательностей, не классифицированных заново
     
-    user = relationship("User", back_populates="analysis_jobs")
\ No newline at end of file
+    user = relationship("User", back_populates="analysis_jobs")
+    stage_metrics = relationship("JobStageMetric", back_populates="job", cascade="all, delete-orphan")
+
+class JobStageMetric(Base):
+    # Измерения одного этапа задачи (backend/pipeline/metrics.py)
+    __tablename__ = "job_stage_metrics"
+
+    id = Column(Integer, primary_key=True, index=True)
+    analysis_job_id = Column(Integer, ForeignKey("analysis_jobs.id", ondelete="CASCADE"), index=True, nullable=False)
+    stage = Column(String(30), index=True, nullable=False)
+    wall_seconds = Column(Float, nullable=False)  # у параллельных частей этапа — самая долгая часть
+    cpu_seconds = Column(Float, nullable=True)  # сумма по процессам пула
+    peak_rss_bytes = Column(BigInteger, nullable=True)  # наибольший пик памяти среди процессов
+    bytes_read = Column(BigInteger, nullable=False, default=0)
+    bytes_written = Column(BigInteger, nullable=False, default=0)
+    reads = Column(BigInteger, nullable=False, default=0)  # для классификации — уникальные последовательности
+    reads_per_second = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    job = relationship("AnalysisJob", back_populates="stage_metrics")
+
+class Blob(Base):
+    __tablename__ = "blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String(500), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    upload_id = Column(String(36), unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    filename = Column(String(255), nullable=False)
+    total_size = Column(BigInteger, nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    total_chunks = Column(Integer, nullable=False)
+    file_path = Column(String(500), nullable=False)  # файл собирается на месте, чанки пишутся по смещению
+    status = Column(String(20), default="open")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    chunks = relationship("UploadChunk", back_populates="session", cascade="all, delete-orphan")
+
+class UploadChunk(Base):
+    __tablename__ = "upload_chunks"
+    __table_args__ = (UniqueConstraint("session_id", "chunk_index", name="uq_upload_chunk"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("upload_sessions.id", ondelete="CASCADE"), nullable=False)
+    chunk_index = Column(Integer, nullable=False)
+
+    session = relationship("UploadSession", back_populates="chunks")
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    # Без AUTOINCREMENT SQLite выдаёт новой строке max(id)+1: после удаления истёкших строк
+    # id повторяются, и процессы, уже прочитавшие больший id, не увидят новый отзыв
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True, index=True)  # по возрастанию id процессы подгружают новые отзывы
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)  # sha256 токена, сам токен не хранится
+    expires_at = Column(DateTime(timezone=True), index=True, nullable=False)
@@ -0,0 +1,16 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int = Field(..., gt=0, description="Total file size in bytes")
+    chunk_size: int = Field(8 * 1024 * 1024, gt=0, description="Chunk size in bytes")
+
+class UploadSessionStatus(BaseModel):
+    upload_id: str
+    filename: str
+    size: int
+    chunk_size: int
+    total_chunks: int
+    status: str
+    missing_chunks: List[int]
@@ -0,0 +1,362 @@
+"""
+Обрезка адаптеров и праймеров с приблизительным совпадением.
+
+Поиск — алгоритм Майерса: столбец матрицы редакционного расстояния
+шаблона (до 64 оснований) хранится двумя 64-битными векторами приращений
+и обновляется десятком битовых операций на основание прочтения. Пачка
+обрабатывается целиком: у каждого прочтения своя дорожка в массивах uint64.
+Прочтения упорядочены по убыванию длины, так что на шаге j активны первые
+n_j дорожек и обновляется срез массивов, без масок.
+
+Вырожденные основания IUPAC в шаблоне (R, Y, N, ...) совпадают с любым
+из своих оснований; N в прочтении не совпадает ни с чем.
+
+3'-адаптер ищется по всему прочтению: оно обрезается по самому левому
+вхождению с не более чем error_rate * длина ошибок, а если адаптер
+целиком не найден — по самому длинному префиксу адаптера на конце
+прочтения (не короче min_overlap). Начало найденного вхождения уточняется
+выравниванием перевёрнутого адаптера от конца вхождения влево. Прямой праймер ищется только в начале
+прочтения и отрезается вместе со всем, что перед ним; обратный праймер
+в обратно-комплементарном виде обрезается с 3'-конца, как адаптер.
+"""
+from dataclasses import dataclass, asdict
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from .fastq import FastqBatch
+
+MAX_PATTERN = 64
+# 3'-адаптеры библиотек (общий префикс, с которого начинается прочтение адаптера)
+ADAPTERS = {
+    "default": "AGATCGGAAGAGC",            # TruSeq
+    "nextera": "CTGTCTCTTATACACATCT",
+    "small-rna": "TGGAATTCTCGG",
+    "none": "",
+}
+
+IUPAC = {
+    "A": "A", "C": "C", "G": "G", "T": "T", "U": "T",
+    "R": "AG", "Y": "CT", "S": "CG", "W": "AT", "K": "GT", "M": "AC",
+    "B": "CGT", "D": "AGT", "H": "ACT", "V": "ACG", "N": "ACGT",
+}
+_IUPAC_COMPLEMENT = str.maketrans("ACGTURYSWKMBDHVN", "TGCAAYRSWMKVHDBN")
+
+# Столбцов в блоке: маски совпадений блока выбираются из таблицы одним обращением
+_BLOCK = 32
+# Поля буфера: блок вправо от начала прочтения или влево от конца вхождения (до 64 + 31 + _BLOCK столбцов)
+_PAD = 2 * MAX_PATTERN + _BLOCK
+
+
+@dataclass
+class TrimParams:
+    adapter: str = "none"                   # пресет из ADAPTERS или "custom"
+    adapter_sequence: Optional[str] = None  # 3'-адаптер для adapter="custom"
+    primer_forward: Optional[str] = None    # праймер в начале прочтения
+    primer_reverse: Optional[str] = None    # обратный праймер (как заказан, 5'->3')
+    adapter_error_rate: float = 0.1         # доля ошибок (замены и инделы) от длины совпадения
+    adapter_min_overlap: int = 3            # минимальный префикс адаптера на конце прочтения
+
+    @classmethod
+    def from_parameters(cls, parameters: dict) -> "TrimParams":
+        known = {name: parameters.get(name) for name in cls.__dataclass_fields__}
+        return cls(**{k: v for k, v in known.items() if v is not None})
+
+
+@dataclass
+class TrimStats:
+    reads: int = 0
+    with_adapter: int = 0
+    with_forward_primer: int = 0
+    with_reverse_primer: int = 0
+    bases_trimmed: int = 0
+
+    def merge(self, other: "TrimStats"):
+        self.reads += other.reads
+        self.with_adapter += other.with_adapter
+        self.with_forward_primer += other.with_forward_primer
+        self.with_reverse_primer += other.with_reverse_primer
+        self.bases_trimmed += other.bases_trimmed
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def reverse_complement(sequence: str) -> str:
+    return sequence.upper().translate(_IUPAC_COMPLEMENT)[::-1]
+
+
+class Pattern:
+    """Шаблон для поиска: таблица масок совпадений по символу прочтения"""
+
+    def __init__(self, sequence: str):
+        sequence = sequence.strip().upper().replace("U", "T")
+        if not sequence:
+            raise ValueError("Empty adapter or primer sequence")
+        if len(sequence) > MAX_PATTERN:
+            raise ValueError(f"Adapter and primer sequences are limited to {MAX_PATTERN} bases")
+        self.sequence = sequence
+        self.length = len(sequence)
+        masks = [0] * 256
+        for i, base in enumerate(sequence):
+            if base not in IUPAC:
+                raise ValueError(f"Invalid base '{base}' in {sequence}")
+            for code in IUPAC[base]:
+                masks[ord(code)] |= 1 << i
+                masks[ord(code.lower())] |= 1 << i
+        # Короткие шаблоны (адаптеры, праймеры) помещаются в 32 бита — вдвое меньше памяти на дорожку
+        self.peq = np.array(masks, dtype=np.uint32 if self.length <= 32 else np.uint64)
+        # Для поиска без привязки шаблон сдвинут к старшим битам: под ним строки,
+        # которые ни с чем не совпадают и не меняют приращений строк шаблона,
+        # а изменение счёта — просто старший бит слова
+        self.offset = self.peq.dtype.itemsize * 8 - self.length
+        self.peq_top = self.peq << self.peq.dtype.type(self.offset)
+        self._reversed: Optional["Pattern"] = None
+
+    def reversed(self) -> "Pattern":
+        if self._reversed is None:
+            self._reversed = Pattern(self.sequence[::-1])
+        return self._reversed
+
+
+def _scan(
+    data: np.ndarray, starts: np.ndarray, lengths: np.ndarray, pattern: Pattern,
+    anchored: bool, columns: int, step: int = 1
+) -> Iterator[Tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Столбцы Майерса по прочтениям (lengths по убыванию) блоками по _BLOCK.
+    data — буфер пачки с полями _PAD байт по краям (_padded), starts — уже
+    со сдвигом. Для блока со столбца j0 выдаёт j0, счёт (расстояние шаблона
+    до текста, кончающегося в столбце) — массив столбцы x дорожки — и векторы
+    Pv, Mv; после конца прочтения счёт дорожки не меняется. anchored — начало
+    текста не пропускается бесплатно (шаблон выравнивается от первого
+    основания). step=-1 читает текст от starts влево.
+    """
+    n, m = len(starts), pattern.length
+    dtype = pattern.peq.dtype.type
+    one = dtype(1)
+    if anchored:
+        peq, shift = pattern.peq, dtype(m - 1)
+        pv = np.full(n, (1 << m) - 1, dtype=dtype)
+    else:
+        peq, shift = pattern.peq_top, dtype(m - 1 + pattern.offset)
+        pv = np.full(n, np.iinfo(dtype).max, dtype=dtype)
+    mv = np.zeros(n, dtype=dtype)
+    eq, xv, xh, ph, mh, tmp = (np.empty(n, dtype=dtype) for _ in range(6))
+    score = np.full(n, m, dtype=dtype)
+    # Число прочтений длиннее j для каждого шага
+    active = np.searchsorted(-lengths, -np.arange(columns), side="left")
+    windows = sliding_window_view(data, _BLOCK)
+    for j0 in range(0, columns, _BLOCK):
+        a0 = int(active[j0])
+        if not a0:
+            break
+        width = min(_BLOCK, columns - j0)
+        # Основания блока для всех дорожек одним обращением, по столбцу на строку
+        if step > 0:
+            block = windows[starts[:a0] + j0, :width]
+        else:
+            block = windows[starts[:a0] - j0 - _BLOCK + 1, ::-1][:, :width]
+        codes = np.ascontiguousarray(block.T)
+        scores = np.empty((width, a0), dtype=dtype)
+        for c in range(width):
+            a = int(active[j0 + c])
+            e, p, q, s = eq[:a], pv[:a], mv[:a], score[:a]
+            x, h, hp, hm, t = xv[:a], xh[:a], ph[:a], mh[:a], tmp[:a]
+            np.take(peq, codes[c, :a], out=e, mode="wrap")
+            np.bitwise_or(e, q, out=x)
+            np.bitwise_and(e, p, out=t)
+            np.add(t, p, out=t)
+            np.bitwise_xor(t, p, out=t)
+            np.bitwise_or(t, e, out=h)
+            np.bitwise_or(h, p, out=hp)
+            np.invert(hp, out=hp)
+            np.bitwise_or(hp, q, out=hp)
+            np.bitwise_and(p, h, out=hm)
+            # Счёт меняется на старший бит горизонтальных приращений
+            np.right_shift(hp, shift, out=t)
+            if anchored:
+                np.bitwise_and(t, one, out=t)
+            np.add(s, t, out=s)
+            np.right_shift(hm, shift, out=t)
+            if anchored:
+                np.bitwise_and(t, one, out=t)
+            np.subtract(s, t, out=s)
+            scores[c] = score[:a0]
+            np.left_shift(hp, one, out=hp)
+            if anchored:
+                np.bitwise_or(hp, one, out=hp)
+            np.left_shift(hm, one, out=hm)
+            np.bitwise_or(x, hp, out=p)
+            np.invert(p, out=p)
+            np.bitwise_or(p, hm, out=p)
+            np.bitwise_and(hp, x, out=q)
+        yield j0, scores, pv, mv
+
+
+def _padded(data: np.ndarray) -> np.ndarray:
+    """Буфер с полями: окна блоков у краёв буфера не выходят за его границы"""
+    pad = np.zeros(_PAD, dtype=np.uint8)
+    return np.concatenate((pad, data, pad))
+
+
+def _best_in_window(scores: np.ndarray, columns: np.ndarray, window: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Наименьший счёт в окне по каждой дорожке и самый левый столбец с ним (счёт > 2**15, если окно пусто)"""
+    key = np.where(window, scores.astype(np.int64) << 32 | columns, np.int64(1) << 62)
+    best = key.min(axis=0)
+    return best >> 32, best & 0xFFFFFFFF
+
+
+def _find_3prime(
+    data: np.ndarray, starts: np.ndarray, lengths: np.ndarray, pattern: Pattern,
+    error_rate: float, min_overlap: int, at_end: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Позиция начала 3'-адаптера в каждом тексте (длина текста — адаптера нет).
+    at_end — у каких дорожек текст кончается концом прочтения: только там
+    ищется неполный префикс адаптера (по умолчанию — у всех)
+    """
+    n, m = len(starts), pattern.length
+    k = int(error_rate * m)
+    first = np.full(n, -1, dtype=np.int64)
+    end = np.full(n, -1, dtype=np.int64)
+    best = np.full(n, k + 1, dtype=np.int64)
+    columns = int(lengths[0]) if n else 0
+    pv = mv = None
+    for j0, scores, pv, mv in _scan(data, starts, lengths, pattern, False, columns):
+        hit = scores <= k
+        a = scores.shape[1]
+        # Дорожки с совпадением в блоке, у которых первое вхождение ещё не
+        # найдено или окно уточнения его конца (k столбцов) ещё не закрыто
+        lanes = np.flatnonzero(hit.any(axis=0) & ((first[:a] < 0) | (first[:a] + k >= j0)))
+        if not len(lanes):
+            continue
+        hit, cols = hit[:, lanes], np.arange(j0, j0 + len(scores))[:, None]
+        f = first[lanes]
+        new = f < 0
+        f[new] = j0 + hit[:, new].argmax(axis=0)
+        first[lanes] = f
+        score, column = _best_in_window(scores[:, lanes], cols, hit & (cols >= f) & (cols <= f + k))
+        better = score < best[lanes]
+        best[lanes[better]] = score[better]
+        end[lanes[better]] = column[better]
+
+    cut = lengths.copy()
+    hits = np.flatnonzero(end >= 0)
+    if len(hits):
+        # Начало вхождения — выравнивание перевёрнутого шаблона от его конца влево
+        span = np.minimum(end[hits] + 1, m + k)
+        order = np.argsort(-span, kind="stable")
+        hits, span = hits[order], span[order]
+        consumed = _find_5prime(data, starts[hits] + end[hits], span, pattern.reversed(), error_rate, step=-1)
+        cut[hits] = end[hits] + 1 - np.where(consumed > 0, consumed, np.minimum(m, end[hits] + 1))
+    if pv is None or m <= min_overlap:
+        return cut
+
+    # Префикс адаптера на конце прочтения: расстояние префикса длины i до конца
+    # прочтения — сумма приращений Pv - Mv последнего столбца по первым i строкам
+    missing = np.flatnonzero((end < 0) & (True if at_end is None else at_end))
+    if not len(missing):
+        return cut
+    shifts = np.arange(pattern.offset, pattern.offset + m - 1, dtype=pv.dtype)
+    one = pv.dtype.type(1)
+    deltas = ((pv[missing, None] >> shifts) & one).astype(np.int8) - ((mv[missing, None] >> shifts) & one).astype(np.int8)
+    distance = np.cumsum(deltas, axis=1, dtype=np.int16)
+    prefix = np.arange(1, m)
+    ok = (distance <= (error_rate * prefix).astype(np.int64)) & (prefix >= min_overlap) & (prefix <= lengths[missing, None])
+    overlap = np.where(ok, prefix, 0).max(axis=1)
+    cut[missing] = lengths[missing] - overlap
+    return cut
+
+
+def _find_5prime(
+    data: np.ndarray, starts: np.ndarray, lengths: np.ndarray, pattern: Pattern, error_rate: float,
+    step: int = 1
+) -> np.ndarray:
+    """Конец праймера в начале каждого прочтения (0 — праймер не найден)"""
+    n, m = len(starts), pattern.length
+    k = int(error_rate * m)
+    best = np.full(n, k + 1, dtype=np.int64)
+    end = np.full(n, -1, dtype=np.int64)
+    for j0, scores, _, _ in _scan(data, starts, lengths, pattern, True, m + k, step):
+        a = scores.shape[1]
+        cols = np.arange(j0, j0 + len(scores))[:, None]
+        score, column = _best_in_window(scores, cols, np.broadcast_to(cols >= m - 1 - k, scores.shape))
+        better = score < best[:a]
+        best[:a][better] = score[better]
+        end[:a][better] = column[better]
+    return end + 1
+
+
+class AdapterTrimmer:
+    """Скомпилированные шаблоны TrimParams; ValueError — некорректная последовательность"""
+
+    def __init__(self, params: TrimParams):
+        self.params = params
+        if params.adapter == "custom":
+            adapter = params.adapter_sequence or ""
+            if not adapter.strip():
+                raise ValueError("Custom adapter requires an adapter sequence")
+        elif params.adapter in ADAPTERS:
+            adapter = ADAPTERS[params.adapter]
+        else:
+            raise ValueError(f"Unknown adapter '{params.adapter}'")
+        if not 0 <= params.adapter_error_rate < 0.5:
+            raise ValueError("Adapter error rate must be in [0, 0.5)")
+        self.adapter = Pattern(adapter) if adapter.strip() else None
+        self.forward = Pattern(params.primer_forward) if params.primer_forward else None
+        self.reverse = Pattern(reverse_complement(params.primer_reverse)) if params.primer_reverse else None
+
+    @property
+    def enabled(self) -> bool:
+        return any((self.adapter, self.forward, self.reverse))
+
+    def trim(self, batch: FastqBatch, stats: Optional[TrimStats] = None) -> FastqBatch:
+        """Обрезанная пачка поверх того же буфера (меняются только смещения и длины)"""
+        if stats is not None:
+            stats.reads += len(batch)
+        if not self.enabled or not len(batch):
+            return batch
+        params = self.params
+        order = np.argsort(-batch.lengths, kind="stable")
+        data = _padded(batch.data)
+        starts, lengths = batch.seq_start[order] + _PAD, batch.lengths[order]
+
+        end = lengths.copy()
+        found: List[Tuple[str, np.ndarray]] = []
+        if self.adapter is not None:
+            end = _find_3prime(data, starts, lengths, self.adapter, params.adapter_error_rate,
+                               params.adapter_min_overlap)
+            found.append(("with_adapter", end < lengths))
+        if self.reverse is not None:
+            # Обратный праймер ищется только до найденного адаптера: вхождение,
+            # начинающееся за ним, всё равно отрезано
+            limit = np.minimum(lengths, end + self.reverse.length + int(params.adapter_error_rate * self.reverse.length))
+            sub = np.argsort(-limit, kind="stable")
+            cut = _find_3prime(data, starts[sub], limit[sub], self.reverse, params.adapter_error_rate,
+                               params.adapter_min_overlap, at_end=limit[sub] == lengths[sub])
+            primer = np.zeros(len(batch), dtype=bool)
+            primer[sub] = cut < np.minimum(limit[sub], end[sub])
+            found.append(("with_reverse_primer", primer))
+            end[sub] = np.minimum(end[sub], cut)
+        head = np.zeros(len(batch), dtype=np.int64)
+        if self.forward is not None:
+            head = _find_5prime(data, starts, lengths, self.forward, params.adapter_error_rate)
+            found.append(("with_forward_primer", head > 0))
+            head = np.minimum(head, end)
+
+        if stats is not None:
+            for name, mask in found:
+                setattr(stats, name, getattr(stats, name) + int(np.count_nonzero(mask)))
+            stats.bases_trimmed += int(lengths.sum() - (end - head).sum())
+
+        result_head = np.empty_like(head)
+        result_end = np.empty_like(end)
+        result_head[order], result_end[order] = head, end
+        return FastqBatch(
+            data=batch.data,
+            name_start=batch.name_start,
+            name_end=batch.name_end,
+            seq_start=batch.seq_start + result_head,
+            qual_start=batch.qual_start + result_head,
+            lengths=result_end - result_head,
+        )
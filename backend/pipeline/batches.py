@@ -0,0 +1,91 @@
+"""
+Пачки длинных прочтений (Nanopore) с ограничением по числу оснований.
+
+Пачки читаются по объёму сырых байтов, а временные массивы фильтрации,
+QC и дерепликации занимают десятки байтов на основание. Прочтения
+Nanopore бывают от сотен оснований до сотен тысяч, поэтому пачки
+дополнительно делятся на участки буфера не больше max_bases оснований;
+прочтение длиннее лимита идёт отдельной пачкой. Пиковая память обработки
+пачки измеряется через tracemalloc (он учитывает и буферы numpy),
+чтобы по итогам задачи можно было подобрать память процессов пула.
+Трассировка замедляет каждое выделение памяти, поэтому она включается
+только на время каждой sample_every-й пачки: пачки ограничены по числу
+оснований, и их пиковая память от пачки к пачке меняется мало.
+"""
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Iterable, Iterator
+import numpy as np
+from .fastq import FastqBatch
+
+DEFAULT_BATCH_BASES = 1024 * 1024
+DEFAULT_MEMORY_SAMPLE = 16
+
+
+def iter_base_batches(batches: Iterable[FastqBatch], max_bases: int) -> Iterator[FastqBatch]:
+    """Делит пачки на подряд идущие записи суммарной длиной не больше max_bases"""
+    for batch in batches:
+        if not len(batch):
+            continue
+        ends = np.cumsum(batch.lengths)
+        start, before = 0, 0
+        while start < len(batch):
+            stop = max(int(np.searchsorted(ends, before + max_bases, side="right")), start + 1)
+            yield batch.records(start, stop)
+            start, before = stop, int(ends[stop - 1])
+
+
+@dataclass
+class BatchStats:
+    batches: int = 0
+    max_reads: int = 0        # прочтений в самой большой пачке
+    max_bases: int = 0        # оснований в самой большой пачке
+    measured: int = 0         # пачек с измеренной памятью
+    peak_bytes: int = 0       # наибольшая память на обработку одной пачки, включая её буфер
+
+    def merge(self, other: "BatchStats"):
+        self.batches += other.batches
+        self.measured += other.measured
+        self.max_reads = max(self.max_reads, other.max_reads)
+        self.max_bases = max(self.max_bases, other.max_bases)
+        self.peak_bytes = max(self.peak_bytes, other.peak_bytes)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class BatchMeter:
+    """
+    Учёт пачек и пиковой памяти на пачку. Память измеряется у первой
+    и каждой sample_every-й пачки; sample_every=0 — не измеряется.
+    """
+
+    def __init__(self, sample_every: int = DEFAULT_MEMORY_SAMPLE):
+        self.stats = BatchStats()
+        self.sample_every = sample_every
+
+    @contextmanager
+    def measure(self, batch: FastqBatch):
+        stats = self.stats
+        sampled = self.sample_every > 0 and stats.batches % self.sample_every == 0
+        stats.batches += 1
+        stats.max_reads = max(stats.max_reads, len(batch))
+        stats.max_bases = max(stats.max_bases, batch.total_bases)
+        if not sampled:
+            yield
+            return
+        # Трассировку, включённую снаружи (профилирование), не выключаем
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            yield
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started:
+                tracemalloc.stop()
+        stats.measured += 1
+        stats.peak_bytes = max(stats.peak_bytes, peak - before + batch.data.nbytes)
@@ -0,0 +1,346 @@
+"""
+Блочный gzip (BGZF, как у bgzip/samtools) и индекс .gzi рядом с файлом.
+
+Обычный gzip распаковывается только последовательно. BGZF — это цепочка
+независимых gzip-членов по <= 64 КиБ несжатых данных, поэтому любой gzip-
+совместимый декодер читает его как обычный gzip, а по индексу можно начать
+распаковку с любого блока и распаковывать блоки параллельно.
+
+Формат .gzi совместим с htslib: uint64 число записей, затем пары
+uint64 (смещение в сжатом файле, смещение в несжатых данных) для всех
+блоков, кроме первого. Все числа little-endian.
+
+Загруженный gzip перепаковывается один раз при приёме, до переноса в
+хранилище blobs (routers/analysis.py); файлы в хранилище не переписываются.
+"""
+import os
+import struct
+import zlib
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+import numpy as np
+from .fastq import GZIP_MAGIC, FastqFormatError, DECOMPRESS_STEP
+
+# Несжатых данных в блоке (как у bgzip: блок со служебными полями помещается в 64 КиБ)
+BLOCK_DATA_SIZE = 0xFF00
+MAX_BLOCK_SIZE = 0x10000
+DEFAULT_LEVEL = 6
+
+_HEADER = struct.Struct("<4BIBBHBBHH")  # gzip-заголовок с одним подполем BC
+_HEADER_SIZE = _HEADER.size  # 18
+_FOOTER = struct.Struct("<II")  # CRC32, ISIZE
+_GZI_ENTRY = struct.Struct("<QQ")
+
+EOF_BLOCK = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+# Сколько блоков сжимается/распаковывается за один шаг пула потоков
+BLOCKS_PER_STEP = 64
+
+
+def index_path(path: Union[str, Path]) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + ".gzi")
+
+
+def compress_block(data: bytes, level: int = DEFAULT_LEVEL) -> bytes:
+    """Один BGZF-блок. zlib отпускает GIL, поэтому блоки можно сжимать в потоках"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    cdata = compressor.compress(data) + compressor.flush()
+    if len(cdata) + _HEADER_SIZE + _FOOTER.size > MAX_BLOCK_SIZE:
+        # Несжимаемые данные — сохраняем без сжатия, так блок точно помещается
+        compressor = zlib.compressobj(0, zlib.DEFLATED, -zlib.MAX_WBITS)
+        cdata = compressor.compress(data) + compressor.flush()
+    block_size = len(cdata) + _HEADER_SIZE + _FOOTER.size
+    header = _HEADER.pack(0x1F, 0x8B, 8, 4, 0, 0, 0xFF, 6, ord("B"), ord("C"), 2, block_size - 1)
+    return header + cdata + _FOOTER.pack(zlib.crc32(data), len(data))
+
+
+def _read_block_header(f: BinaryIO) -> Optional[Tuple[int, int]]:
+    """
+    Читает заголовок блока с текущей позиции. Возвращает (полный размер блока,
+    длину заголовка) или None в конце файла. Поддерживает произвольные
+    дополнительные подполя, а не только BC.
+    """
+    fixed = f.read(12)
+    if not fixed:
+        return None
+    if len(fixed) < 12 or fixed[:2] != GZIP_MAGIC or not fixed[3] & 4:
+        raise FastqFormatError("Not a BGZF block")
+    xlen = struct.unpack_from("<H", fixed, 10)[0]
+    extra = f.read(xlen)
+    position = 0
+    while position + 4 <= len(extra):
+        si1, si2, slen = extra[position], extra[position + 1], struct.unpack_from("<H", extra, position + 2)[0]
+        if si1 == ord("B") and si2 == ord("C") and slen == 2:
+            return struct.unpack_from("<H", extra, position + 4)[0] + 1, 12 + xlen
+        position += 4 + slen
+    raise FastqFormatError("Not a BGZF block")
+
+
+def is_bgzf(path: Union[str, Path]) -> bool:
+    with open(path, "rb") as f:
+        try:
+            return _read_block_header(f) is not None
+        except FastqFormatError:
+            return False
+
+
+def _decompress_block(block: bytes) -> bytes:
+    xlen = struct.unpack_from("<H", block, 10)[0]
+    _, size = _FOOTER.unpack_from(block, len(block) - _FOOTER.size)
+    try:
+        data = zlib.decompress(block[12 + xlen:-_FOOTER.size], -zlib.MAX_WBITS)
+    except zlib.error as e:
+        raise FastqFormatError(f"Corrupted BGZF block: {e}")
+    if len(data) != size:
+        raise FastqFormatError("Corrupted BGZF block: size mismatch")
+    return data
+
+
+def write_index(path: Union[str, Path], offsets: List[Tuple[int, int]]):
+    """Атомарно пишет .gzi; offsets — (сжатое, несжатое) начало каждого блока, включая первый"""
+    target = index_path(path)
+    partial = target.with_name(f"{target.name}.{os.getpid()}.part")
+    entries = offsets[1:]
+    with open(partial, "wb") as f:
+        f.write(struct.pack("<Q", len(entries)))
+        for entry in entries:
+            f.write(_GZI_ENTRY.pack(*entry))
+    os.replace(partial, target)
+
+
+def read_index(path: Union[str, Path]) -> List[Tuple[int, int]]:
+    with open(index_path(path), "rb") as f:
+        count = struct.unpack("<Q", f.read(8))[0]
+        raw = f.read(count * _GZI_ENTRY.size)
+    if len(raw) != count * _GZI_ENTRY.size:
+        raise FastqFormatError("Truncated BGZF index")
+    return [(0, 0)] + list(_GZI_ENTRY.iter_unpack(raw))
+
+
+def build_index(path: Union[str, Path]) -> List[Tuple[int, int]]:
+    """Индекс для уже готового BGZF-файла: читаются только заголовки и ISIZE блоков"""
+    offsets = []
+    compressed = uncompressed = 0
+    with open(path, "rb") as f:
+        while True:
+            f.seek(compressed)
+            header = _read_block_header(f)
+            if header is None:
+                break
+            block_size, _ = header
+            f.seek(compressed + block_size - 4)
+            size = struct.unpack("<I", f.read(4))[0]
+            # Пустые блоки (в том числе EOF) тоже индексируются, чтобы блоки шли подряд
+            offsets.append((compressed, uncompressed))
+            compressed += block_size
+            uncompressed += size
+    write_index(path, offsets)
+    return offsets
+
+
+class BgzfWriter:
+    """
+    Потоковая запись BGZF. Блоки сжимаются группами в пуле потоков,
+    память ограничена BLOCKS_PER_STEP блоками.
+    """
+
+    def __init__(self, output: BinaryIO, level: int = DEFAULT_LEVEL, threads: int = 1):
+        self.output = output
+        self.level = level
+        self.offsets: List[Tuple[int, int]] = []
+        self._buffer = bytearray()
+        self._compressed = 0
+        self._uncompressed = 0
+        self._executor = ThreadPoolExecutor(threads) if threads > 1 else None
+
+    def _flush_blocks(self, final: bool = False):
+        step = BLOCK_DATA_SIZE * BLOCKS_PER_STEP
+        while len(self._buffer) >= step or (final and self._buffer):
+            chunk = bytes(self._buffer[:step])
+            del self._buffer[:step]
+            pieces = [chunk[i:i + BLOCK_DATA_SIZE] for i in range(0, len(chunk), BLOCK_DATA_SIZE)]
+            if self._executor is not None:
+                blocks = self._executor.map(compress_block, pieces, [self.level] * len(pieces))
+            else:
+                blocks = (compress_block(piece, self.level) for piece in pieces)
+            for piece, block in zip(pieces, blocks):
+                self.offsets.append((self._compressed, self._uncompressed))
+                self.output.write(block)
+                self._compressed += len(block)
+                self._uncompressed += len(piece)
+
+    def write(self, data: bytes):
+        self._buffer += data
+        self._flush_blocks()
+
+    def close(self) -> List[Tuple[int, int]]:
+        self._flush_blocks(final=True)
+        self.output.write(EOF_BLOCK)
+        if self._executor is not None:
+            self._executor.shutdown()
+        return self.offsets
+
+
+def _iter_gzip(source: BinaryIO, read_size: int = 4 * 1024 * 1024) -> Iterator[bytes]:
+    """Распаковка обычного (в том числе многочленного) gzip с ограничением шага вывода"""
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    in_member = False
+    data = b""
+    while True:
+        if not data:
+            data = source.read(read_size)
+            if not data:
+                break
+        in_member = True
+        try:
+            out = decompressor.decompress(data, DECOMPRESS_STEP)
+        except zlib.error as e:
+            raise FastqFormatError(f"Corrupted gzip stream: {e}")
+        if out:
+            yield out
+        if decompressor.eof:
+            data = decompressor.unused_data
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            in_member = False
+        else:
+            data = decompressor.unconsumed_tail
+    if in_member:
+        # Вывод последнего шага мог быть ограничен DECOMPRESS_STEP — забираем остаток
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+        if not decompressor.eof:
+            raise FastqFormatError("Truncated gzip stream")
+
+
+def needs_reencode(path: Union[str, Path]) -> bool:
+    """Обычный (не блочный) gzip: читается только последовательно, пока не перепакован в BGZF"""
+    with open(path, "rb") as f:
+        if f.read(2) != GZIP_MAGIC:
+            return False
+    return not is_bgzf(path)
+
+
+def reencode(
+    source: Union[str, Path],
+    target: Union[str, Path],
+    level: int = DEFAULT_LEVEL,
+    threads: int = 1
+) -> List[Tuple[int, int]]:
+    """
+    Перепаковывает gzip-файл source в BGZF-файл target и пишет его индекс.
+    Содержимое после распаковки не меняется, source остаётся как есть.
+    Сначала на место встаёт файл, затем индекс: индекс рядом с файлом
+    всегда относится к нему, а при его отсутствии BgzfReader строит свой.
+    """
+    target = Path(target)
+    partial = target.with_name(f"{target.name}.{os.getpid()}.bgzf.part")
+    try:
+        with open(source, "rb") as f, open(partial, "wb") as output:
+            writer = BgzfWriter(output, level, threads)
+            for piece in _iter_gzip(f):
+                writer.write(piece)
+            offsets = writer.close()
+        index_path(target).unlink(missing_ok=True)
+        os.replace(partial, target)
+    finally:
+        partial.unlink(missing_ok=True)
+    write_index(target, offsets)
+    return offsets
+
+
+def ensure_index(path: Union[str, Path]) -> bool:
+    """
+    Строит недостающий индекс BGZF-файла; сам файл не меняется.
+    Возвращает False, если файл не BGZF (несжатый или обычный gzip).
+    """
+    if not is_bgzf(path):
+        return False
+    if not index_path(path).exists():
+        build_index(path)
+    return True
+
+
+class BgzfReader:
+    """
+    Произвольный доступ к несжатым данным BGZF-файла по индексу .gzi.
+    Блоки внутри шага распаковываются в пуле потоков (zlib отпускает GIL).
+    """
+
+    def __init__(self, path: Union[str, Path], threads: int = 1):
+        self.path = Path(path)
+        offsets = read_index(path) if index_path(path).exists() else build_index(path)
+        self.threads = threads
+        self._file = open(self.path, "rb")
+        self._coffsets = np.array([c for c, _ in offsets] + [0], dtype=np.int64)
+        self._uoffsets = [u for _, u in offsets]
+
+        if not offsets:
+            self._coffsets[-1] = 0
+            self.size = 0
+            self._uoffsets.append(0)
+            self._executor = None
+            return
+
+        # Конец последнего блока и полный несжатый размер — из заголовка последнего блока
+        last = int(self._coffsets[-2])
+        self._file.seek(last)
+        block_size, _ = _read_block_header(self._file)
+        self._file.seek(last + block_size - 4)
+        self._coffsets[-1] = last + block_size
+        self.size = self._uoffsets[-1] + struct.unpack("<I", self._file.read(4))[0]
+        self._uoffsets.append(self.size)
+        self._executor = ThreadPoolExecutor(threads) if threads > 1 else None
+
+    def __enter__(self) -> "BgzfReader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._file.close()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    @property
+    def block_count(self) -> int:
+        return len(self._uoffsets) - 1
+
+    def block_start(self, block: int) -> int:
+        """Несжатое смещение начала блока"""
+        return self._uoffsets[block]
+
+    def block_at(self, offset: int) -> int:
+        return max(0, bisect_right(self._uoffsets, offset) - 1)
+
+    def _blocks(self, first: int, last: int) -> List[bytes]:
+        """Распаковывает блоки [first, last)"""
+        self._file.seek(int(self._coffsets[first]))
+        raw = self._file.read(int(self._coffsets[last] - self._coffsets[first]))
+        bounds = self._coffsets[first:last + 1] - self._coffsets[first]
+        blocks = [raw[bounds[i]:bounds[i + 1]] for i in range(last - first)]
+        if self._executor is not None and len(blocks) > 1:
+            return list(self._executor.map(_decompress_block, blocks))
+        return [_decompress_block(block) for block in blocks]
+
+    def iter_range(self, start: int, end: int) -> Iterator[bytes]:
+        """Несжатые байты [start, end) кусками по BLOCKS_PER_STEP блоков"""
+        end = min(end, self.size)
+        if start >= end:
+            return
+        block = self.block_at(start)
+        last = self.block_at(end - 1) + 1
+        while block < last:
+            step_end = min(block + BLOCKS_PER_STEP, last)
+            data = b"".join(self._blocks(block, step_end))
+            lo = max(start - self._uoffsets[block], 0)
+            hi = min(end, self._uoffsets[step_end]) - self._uoffsets[block]
+            yield data[lo:hi]
+            block = step_end
+
+    def read(self, offset: int, length: int) -> bytes:
+        return b"".join(self.iter_range(offset, offset + length))
@@ -0,0 +1,284 @@
+"""
+Наивный байесовский классификатор по k-мерам (как RDP Classifier
+и q2-feature-classifier naive-bayes).
+
+Таблицы log P(k-мер | таксон) считаются один раз на референс (build_tables)
+и хранятся в .npy: строка на k-мер, столбец на таксон. Рабочие процессы
+открывают их через np.load(mmap_mode="r"), так что все процессы читают
+одни и те же страницы кэша ОС, а не держат по частной копии.
+
+Запросы оцениваются пачками: строки таблицы для k-меров всех запросов
+выбираются одним обращением и суммируются по запросам через reduceat.
+Бутстрэп-достоверность: каждый повтор берёт случайную 1/8 k-меров запроса;
+повторы всех запросов с одинаковым числом k-меров выбираются и суммируются
+одной операцией над массивом. Случайные номера k-меров — счётчиковый
+генератор (финализатор MurmurHash3) от хэша k-меров запроса: они
+считаются сразу для всей пачки и не зависят от её состава.
+"""
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, Union
+import numpy as np
+from .paired import BASE_CODE
+
+FORMAT_VERSION = 1
+DEFAULT_K = 8
+META_FILE = "meta.json"
+LOGPROB_FILE = "logprob.npy"
+LINEAGE_FILE = "lineage.npy"
+
+# Сколько чисел float32 выбирать из таблицы за одно обращение
+_GATHER_ELEMENTS = 16 * 1024 * 1024
+# Сколько референсных последовательностей кодировать за раз при построении
+_BUILD_BATCH = 4096
+# Генератор бутстрэпа; входит в ключ кэша классификации (classify_cache.py)
+BOOTSTRAP_SAMPLER = "fmix32"
+
+_GOLDEN = np.uint32(0x9E3779B9)
+
+
+@dataclass
+class ClassifyParams:
+    min_confidence: float = 0.8   # ранги с меньшей бутстрэп-достоверностью отбрасываются
+    bootstrap: int = 100          # число бутстрэп-повторов
+    subsample: int = 8            # каждый повтор берёт 1/subsample k-меров запроса
+
+    @classmethod
+    def from_parameters(cls, parameters: dict) -> "ClassifyParams":
+        known = {name: parameters.get(name) for name in cls.__dataclass_fields__}
+        return cls(**{k: v for k, v in known.items() if v is not None})
+
+
+@dataclass
+class Assignment:
+    lineage: List[str]         # полная линия лучшего таксона
+    confidence: List[float]    # бутстрэп-достоверность каждого ранга
+    taxon_id: int = -1         # номер таксона в таблицах референса
+
+    def taxon(self, min_confidence: float) -> Tuple[str, float]:
+        """Линия, обрезанная по порогу достоверности, и достоверность последнего ранга"""
+        kept = 0
+        while kept < len(self.lineage) and self.confidence[kept] >= min_confidence:
+            kept += 1
+        if not kept:
+            return "Unassigned", self.confidence[0] if self.confidence else 0.0
+        return ";".join(self.lineage[:kept]), self.confidence[kept - 1]
+
+
+def encode_kmers(sequences: List[bytes], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Уникальные k-меры каждой последовательности (2 бита на основание;
+    k-меры с N и IUPAC пропускаются). Возвращает k-меры всех
+    последовательностей подряд (внутри каждой — по возрастанию) и их число.
+    """
+    lengths = np.array([len(s) for s in sequences], dtype=np.int64)
+    if not len(sequences) or lengths.sum() == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(len(sequences), dtype=np.int64)
+    codes = BASE_CODE[np.frombuffer(b"".join(sequences), dtype=np.uint8)].astype(np.int64)
+    owner = np.repeat(np.arange(len(sequences)), lengths)
+    starts = np.cumsum(lengths) - lengths
+
+    n = len(codes) - k + 1
+    if n <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(len(sequences), dtype=np.int64)
+    kmers = np.zeros(n, dtype=np.int64)
+    invalid = np.zeros(n, dtype=bool)
+    for j in range(k):
+        window = codes[j:j + n]
+        kmers = (kmers << 2) | (window & 3)
+        invalid |= window > 3
+    # k-мер не должен пересекать границу последовательностей
+    positions = np.arange(n)
+    valid = ~invalid & (positions - starts[owner[:n]] <= lengths[owner[:n]] - k)
+    keys = np.unique(owner[:n][valid] * (1 << (2 * k)) + kmers[valid])
+    counts = np.bincount(keys >> (2 * k), minlength=len(sequences))
+    return keys & ((1 << (2 * k)) - 1), counts
+
+
+def _lineage_levels(taxa: List[str]) -> np.ndarray:
+    """Для каждого ранга — номер предка таксона на этом ранге (по префиксу линии)"""
+    split = [taxon.split(";") for taxon in taxa]
+    depth = max(len(parts) for parts in split)
+    levels = np.zeros((depth, len(taxa)), dtype=np.int32)
+    for level in range(depth):
+        prefixes = {}
+        for t, parts in enumerate(split):
+            prefix = ";".join(parts[:level + 1])
+            levels[level, t] = prefixes.setdefault(prefix, len(prefixes))
+    return levels
+
+
+def build_tables(
+    records: Iterable[Tuple[bytes, str]],
+    output_dir: Union[str, Path],
+    k: int = DEFAULT_K,
+    metadata: Optional[dict] = None
+) -> dict:
+    """
+    Строит таблицы классификатора из пар (последовательность, линия таксона).
+    Таксон — полная линия "d__Bacteria;p__...;g__...". Вероятности по RDP:
+    P(w|G) = (m(w,G) + P_w) / (M_G + 1), P_w = (n(w) + 0.5) / (N + 1),
+    где m — число последовательностей таксона с k-мером w, n — во всём референсе.
+    Счётчики копятся прямо в отображённом на диск файле таблицы.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    records = list(records)
+    taxa = sorted({lineage for _, lineage in records})
+    taxon_index = {taxon: i for i, taxon in enumerate(taxa)}
+    words = 1 << (2 * k)
+
+    table = np.lib.format.open_memmap(output_dir / LOGPROB_FILE, mode="w+", dtype=np.float32, shape=(words, len(taxa)))
+    flat = table.reshape(-1)
+    taxon_sizes = np.zeros(len(taxa), dtype=np.int64)
+    for i in range(0, len(records), _BUILD_BATCH):
+        chunk = records[i:i + _BUILD_BATCH]
+        kmers, counts = encode_kmers([sequence for sequence, _ in chunk], k)
+        owners = np.array([taxon_index[lineage] for _, lineage in chunk], dtype=np.int64)
+        np.add.at(taxon_sizes, owners, 1)
+        cells, hits = np.unique(kmers * len(taxa) + np.repeat(owners, counts), return_counts=True)
+        flat[cells] += hits
+
+    rows = max(1, _GATHER_ELEMENTS // max(len(taxa), 1))
+    for start in range(0, words, rows):
+        block = table[start:start + rows]
+        prior = (block.sum(axis=1, dtype=np.float64) + 0.5) / (len(records) + 1)
+        block[:] = np.log((block + prior[:, None]) / (taxon_sizes + 1))
+    table.flush()
+    del table, flat
+
+    np.save(output_dir / LINEAGE_FILE, _lineage_levels(taxa))
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "k": k,
+        "sequences": len(records),
+        "taxa": taxa,
+        **(metadata or {}),
+    }
+    (output_dir / META_FILE).write_text(json.dumps(meta, indent=2))
+    return meta
+
+
+def _fmix32(x: np.ndarray) -> np.ndarray:
+    """Финализатор MurmurHash3: перемешивает биты каждого числа uint32, на месте"""
+    tmp = np.empty_like(x)
+    with np.errstate(over="ignore"):
+        for shift, multiplier in ((16, 0x85EBCA6B), (13, 0xC2B2AE35)):
+            np.right_shift(x, np.uint32(shift), out=tmp)
+            x ^= tmp
+            x *= np.uint32(multiplier)
+    np.right_shift(x, np.uint32(16), out=tmp)
+    x ^= tmp
+    return x
+
+
+def _query_seeds(index: np.ndarray, local: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Зерно генератора каждого запроса — хэш его k-меров с их позициями; у запроса без k-меров — 0"""
+    seeds = np.zeros(len(counts), dtype=np.uint32)
+    has_kmers = counts > 0
+    if not len(index):
+        return seeds
+    position = np.arange(len(index), dtype=np.uint32) - np.repeat(local, counts).astype(np.uint32)
+    with np.errstate(over="ignore"):
+        hashed = _fmix32(index.astype(np.uint32) ^ (position * _GOLDEN))
+    seeds[has_kmers] = np.add.reduceat(hashed, local[has_kmers], dtype=np.uint32)
+    return seeds
+
+
+def _bootstrap_picks(seeds: np.ndarray, counts: np.ndarray, replicates: int, draw: int) -> np.ndarray:
+    """
+    Номера k-меров для повторов бутстрэпа: (запросы, повторы, draw), значения
+    в [0, counts). i-е случайное число запроса — fmix32(seed + i * golden)
+    """
+    steps = np.arange(1, replicates * draw + 1, dtype=np.uint32)
+    with np.errstate(over="ignore"):
+        bits = _fmix32(seeds[:, None] + steps * _GOLDEN)
+    # (32 случайных бита * counts) >> 32 — равномерно в [0, counts) без деления
+    picks = bits.astype(np.uint64)
+    picks *= counts.astype(np.uint64)[:, None]
+    picks >>= np.uint64(32)
+    return picks.view(np.int64).reshape(len(seeds), replicates, draw)
+
+
+class KmerClassifier:
+    """Классификатор над таблицами одного референса; таблица не копируется в память процесса"""
+
+    def __init__(self, path: Union[str, Path]):
+        path = Path(path)
+        self.meta = json.loads((path / META_FILE).read_text())
+        if self.meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported classifier format in {path}")
+        self.k = self.meta["k"]
+        self.taxa = self.meta["taxa"]
+        self.table = np.load(path / LOGPROB_FILE, mmap_mode="r")
+        self.levels = np.load(path / LINEAGE_FILE)
+
+    def _chunks(self, counts: np.ndarray, rows_per_query: np.ndarray) -> Iterable[Tuple[int, int]]:
+        """Диапазоны запросов, для которых выборка из таблицы укладывается в _GATHER_ELEMENTS"""
+        limit = max(1, _GATHER_ELEMENTS // max(len(self.taxa), 1))
+        start, rows = 0, 0
+        for i, n in enumerate(rows_per_query.tolist()):
+            if rows and rows + n > limit:
+                yield start, i
+                start, rows = i, 0
+            rows += n
+        if start < len(counts):
+            yield start, len(counts)
+
+    def classify(self, sequences: List[bytes], params: Optional[ClassifyParams] = None) -> List[Assignment]:
+        params = params or ClassifyParams()
+        kmers, counts = encode_kmers(sequences, self.k)
+        offsets = np.cumsum(counts) - counts
+        draws = np.maximum(counts // params.subsample, 1)
+        # Выбираются строки и для полной оценки, и для всех повторов бутстрэпа
+        cost = counts + params.bootstrap * draws
+        result: List[Assignment] = []
+        for start, end in self._chunks(counts, cost):
+            result.extend(self._classify_chunk(sequences[start:end], kmers, offsets[start:end], counts[start:end],
+                                               draws[start:end], params))
+        return result
+
+    def _classify_chunk(self, sequences, kmers, offsets, counts, draws, params) -> List[Assignment]:
+        n = len(sequences)
+        has_kmers = counts > 0
+        # Полная оценка: строки таблицы для всех k-меров, суммы по запросам
+        index = np.concatenate([kmers[o:o + c] for o, c in zip(offsets.tolist(), counts.tolist())]) \
+            if n else np.zeros(0, dtype=np.int64)
+        best = np.zeros(n, dtype=np.int64)
+        if len(index):
+            local = np.cumsum(counts) - counts
+            scores = np.add.reduceat(self.table[index], local[has_kmers], axis=0)
+            best[has_kmers] = scores.argmax(axis=1)
+
+        # Бутстрэп: случайные номера k-меров запроса; генератор зависит от самой
+        # последовательности, так что ответ не зависит от состава пачки.
+        # Запросы с одинаковым числом k-меров в повторе оцениваются вместе:
+        # выборка (запросы * повторы, k-меры, таксоны) суммируется по оси k-меров
+        local = np.cumsum(counts) - counts
+        replicate_best = np.zeros((n, params.bootstrap), dtype=np.int64)
+        if len(index):
+            seeds = _query_seeds(index, local, counts)
+            for draw in np.unique(draws[has_kmers]).tolist():
+                group = np.flatnonzero(has_kmers & (draws == draw))
+                picks = _bootstrap_picks(seeds[group], counts[group], params.bootstrap, draw) \
+                    + local[group, None, None]
+                sampled = self.table[index[picks.reshape(-1)]].reshape(-1, draw, len(self.taxa))
+                replicate_best[group] = sampled.sum(axis=1).argmax(axis=1).reshape(len(group), params.bootstrap)
+
+        # Достоверность ранга — доля повторов, чей таксон совпадает с лучшим на этом ранге
+        agree = self.levels[:, replicate_best] == self.levels[:, best][:, :, None]
+        confidence = agree.mean(axis=2) * has_kmers
+        result = []
+        for i in range(n):
+            lineage = self.taxa[best[i]].split(";")
+            confidences = [round(float(c), 4) for c in confidence[:len(lineage), i]]
+            result.append(Assignment(lineage, confidences, int(best[i])))
+        return result
+
+
+@lru_cache(maxsize=8)
+def load_classifier(path: str) -> KmerClassifier:
+    """Классификатор открывается один раз на процесс пула и переиспользуется задачами"""
+    return KmerClassifier(path)
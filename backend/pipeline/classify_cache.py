@@ -0,0 +1,265 @@
+"""
+Кэш результатов классификации между задачами.
+
+Ключ — хэш последовательности и пространство имён: классификатор, версия
+индекса референса и параметры, от которых зависит ответ (k, бутстрэп).
+Порог достоверности в ключ не входит: хранится полный ответ, а обрезка
+линии по порогу делается при выводе.
+
+Два уровня: LRU в памяти процесса пула (живёт между задачами, пока жив
+процесс) и общий для всех процессов файл SQLite в режиме WAL. Размер
+файла ограничен max_bytes: при превышении удаляются записи, к которым
+дольше всего не обращались.
+"""
+import hashlib
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .classify import BOOTSTRAP_SAMPLER, Assignment, ClassifyParams, KmerClassifier
+
+DIGEST_SIZE = 16
+# Оценка накладных расходов SQLite на запись сверх ключа и значения
+_ROW_OVERHEAD = 40
+# После вытеснения кэш занимает не больше этой доли max_bytes
+_LOW_WATER = 0.9
+_SQL_BATCH = 500
+
+
+@dataclass
+class CacheConfig:
+    path: str
+    max_bytes: int = 1024 * 1024 * 1024
+    memory_entries: int = 200_000
+
+
+@dataclass
+class CacheStats:
+    lookups: int = 0
+    memory_hits: int = 0
+    disk_hits: int = 0
+    bytes_saved: int = 0    # байты последовательностей, которые не пришлось классифицировать
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    def merge(self, other: "CacheStats"):
+        self.lookups += other.lookups
+        self.memory_hits += other.memory_hits
+        self.disk_hits += other.disk_hits
+        self.bytes_saved += other.bytes_saved
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0}
+
+
+def sequence_digest(sequence: bytes) -> bytes:
+    return hashlib.blake2b(sequence.upper(), digest_size=DIGEST_SIZE).digest()
+
+
+def cache_namespace(classifier: KmerClassifier, params: ClassifyParams) -> str:
+    meta = classifier.meta
+    return (f"naive-bayes:{meta.get('name')}@{meta.get('version')}:k={classifier.k}"
+            f":bootstrap={params.bootstrap}:subsample={params.subsample}:sampler={BOOTSTRAP_SAMPLER}")
+
+
+class _MemoryTier:
+    """LRU по числу записей; значение — (номер таксона, достоверности рангов)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._items: "OrderedDict[Tuple[str, bytes], Tuple[int, bytes]]" = OrderedDict()
+
+    def get(self, key: Tuple[str, bytes]) -> Optional[Tuple[int, bytes]]:
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key: Tuple[str, bytes], value: Tuple[int, bytes]):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+
+class _DiskTier:
+    def __init__(self, path: str, max_bytes: int):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS assignments (
+                namespace TEXT NOT NULL,
+                digest BLOB NOT NULL,
+                taxon INTEGER NOT NULL,
+                confidence BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (namespace, digest)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS ix_assignments_accessed ON assignments (accessed);
+            CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+            INSERT OR IGNORE INTO usage (id, bytes) VALUES (0, 0);
+        """)
+
+    def get_many(self, namespace: str, digests: List[bytes]) -> Dict[bytes, Tuple[int, bytes]]:
+        found = {}
+        now = time.time()
+        for i in range(0, len(digests), _SQL_BATCH):
+            chunk = digests[i:i + _SQL_BATCH]
+            rows = self.db.execute(
+                f"SELECT digest, taxon, confidence FROM assignments "
+                f"WHERE namespace = ? AND digest IN ({','.join('?' * len(chunk))})",
+                [namespace, *chunk]
+            ).fetchall()
+            found.update((digest, (taxon, confidence)) for digest, taxon, confidence in rows)
+        if found:
+            # Время обращения нужно для вытеснения; обновляется одной транзакцией на пачку
+            self.db.execute("BEGIN")
+            self.db.executemany(
+                "UPDATE assignments SET accessed = ? WHERE namespace = ? AND digest = ?",
+                [(now, namespace, digest) for digest in found]
+            )
+            self.db.execute("COMMIT")
+        return found
+
+    def _existing(self, namespace: str, digests: List[bytes]) -> set:
+        existing = set()
+        for i in range(0, len(digests), _SQL_BATCH):
+            chunk = digests[i:i + _SQL_BATCH]
+            existing.update(row[0] for row in self.db.execute(
+                f"SELECT digest FROM assignments WHERE namespace = ? AND digest IN ({','.join('?' * len(chunk))})",
+                [namespace, *chunk]
+            ))
+        return existing
+
+    def put_many(self, namespace: str, entries: List[Tuple[bytes, int, bytes]]):
+        if not entries:
+            return
+        now = time.time()
+        # BEGIN IMMEDIATE берёт блокировку записи сразу, так что проверка
+        # существующих записей и вставка не пересекаются с другими процессами
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            existing = self._existing(namespace, [digest for digest, _, _ in entries])
+            rows = [
+                (namespace, digest, taxon, confidence,
+                 len(namespace) + len(digest) + len(confidence) + _ROW_OVERHEAD, now)
+                for digest, taxon, confidence in entries
+                if digest not in existing
+            ]
+            self.db.executemany(
+                "INSERT INTO assignments (namespace, digest, taxon, confidence, size, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self.db.execute("UPDATE usage SET bytes = bytes + ? WHERE id = 0", (sum(row[4] for row in rows),))
+            self._evict()
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def _evict(self):
+        used = self.db.execute("SELECT bytes FROM usage WHERE id = 0").fetchone()[0]
+        if used <= self.max_bytes:
+            return
+        target = used - int(self.max_bytes * _LOW_WATER)
+        freed = 0
+        while freed < target:
+            victims = []
+            for namespace, digest, size in self.db.execute(
+                "SELECT namespace, digest, size FROM assignments ORDER BY accessed LIMIT ?", (_SQL_BATCH,)
+            ).fetchall():
+                victims.append((namespace, digest))
+                freed += size
+                if freed >= target:
+                    break
+            if not victims:
+                break
+            self.db.executemany("DELETE FROM assignments WHERE namespace = ? AND digest = ?", victims)
+        self.db.execute("UPDATE usage SET bytes = MAX(bytes - ?, 0) WHERE id = 0", (freed,))
+
+
+# Уровни кэша живут в процессе пула между задачами
+_memory: Optional[_MemoryTier] = None
+_disks: Dict[str, _DiskTier] = {}
+
+
+def _tiers(config: CacheConfig) -> Tuple[_MemoryTier, _DiskTier]:
+    global _memory
+    if _memory is None:
+        _memory = _MemoryTier(config.memory_entries)
+    if config.path not in _disks:
+        _disks[config.path] = _DiskTier(config.path, config.max_bytes)
+    return _memory, _disks[config.path]
+
+
+def _encode(assignment: Assignment) -> Tuple[int, bytes]:
+    return assignment.taxon_id, np.asarray(assignment.confidence, dtype=np.float32).tobytes()
+
+
+def _decode(classifier: KmerClassifier, value: Tuple[int, bytes]) -> Assignment:
+    taxon_id, confidence = value
+    lineage = classifier.taxa[taxon_id].split(";")
+    return Assignment(lineage, [round(float(c), 4) for c in np.frombuffer(confidence, dtype=np.float32)], taxon_id)
+
+
+def classify_cached(
+    classifier: KmerClassifier,
+    sequences: List[bytes],
+    params: ClassifyParams,
+    config: Optional[CacheConfig],
+    stats: Optional[CacheStats] = None
+) -> List[Assignment]:
+    """Классификация с кэшем: считаются только последовательности, которых нет ни в одном уровне"""
+    if config is None:
+        return classifier.classify(sequences, params)
+    memory, disk = _tiers(config)
+    namespace = cache_namespace(classifier, params)
+    digests = [sequence_digest(sequence) for sequence in sequences]
+    result: List[Optional[Assignment]] = [None] * len(sequences)
+
+    missing = []
+    for i, digest in enumerate(digests):
+        value = memory.get((namespace, digest))
+        if value is None:
+            missing.append(i)
+        else:
+            result[i] = _decode(classifier, value)
+    memory_hits = len(sequences) - len(missing)
+
+    found = disk.get_many(namespace, [digests[i] for i in missing]) if missing else {}
+    misses = []
+    for i in missing:
+        value = found.get(digests[i])
+        if value is None:
+            misses.append(i)
+        else:
+            memory.put((namespace, digests[i]), value)
+            result[i] = _decode(classifier, value)
+
+    if misses:
+        computed = classifier.classify([sequences[i] for i in misses], params)
+        entries = []
+        for i, assignment in zip(misses, computed):
+            value = _encode(assignment)
+            memory.put((namespace, digests[i]), value)
+            entries.append((digests[i], *value))
+            result[i] = assignment
+        disk.put_many(namespace, entries)
+
+    if stats is not None:
+        stats.lookups += len(sequences)
+        stats.memory_hits += memory_hits
+        stats.disk_hits += len(found)
+        hit = set(range(len(sequences))) - set(misses)
+        stats.bytes_saved += sum(len(sequences[i]) for i in hit)
+    return result
@@ -0,0 +1,356 @@
+"""
+Дерепликация: схлопывание одинаковых прочтений в уникальные
+последовательности с численностью (size=).
+
+Последовательность хранится строкой uint64: длина и слова по 32 основания
+(2 бита на основание). Прочтения с N и другими IUPAC-символами в 2 бита
+не укладываются и хранятся так же, но по 8 оснований в слове. Строки одной
+ширины схлопываются сортировкой (np.unique по строкам), без словаря строк.
+
+Таблица держит в памяти не больше memory_budget байт: при переполнении
+она сжимается, а если не помогло — сбрасывается на диск, разбитая по хэшу
+последовательности на PARTITIONS разделов. Одинаковые последовательности
+всех шардов попадают в один раздел, поэтому при объединении (merge_tables)
+каждый раздел схлопывается независимо и тоже в пределах бюджета.
+"""
+import heapq
+import shutil
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+import numpy as np
+from .fastq import FastqBatch, window_sums
+from .paired import BASE_CODE
+
+UNIQUES_FILE = "uniques.fasta"
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+PARTITIONS = 64
+# Раздел больше бюджета делится дальше по следующим битам хэша
+_MAX_DEPTH = 4
+# Байтов за одно чтение при поиске смещений записей
+_OFFSETS_CHUNK = 8 * 1024 * 1024
+
+_PACKED_BITS = 2
+_RAW_BITS = 8
+_DECODE = np.frombuffer(b"ACGT", dtype=np.uint8)
+_UPPER = np.arange(256, dtype=np.uint8)
+_UPPER[ord("a"):ord("z") + 1] -= 32
+# Численность в строках отсортированных прогонов записывается как MAX - size,
+# тогда порядок строк — это порядок по убыванию численности, затем по последовательности
+_MAX_SIZE = 10 ** 20 - 1
+
+
+@dataclass
+class DerepStats:
+    reads: int = 0
+    uniques: int = 0
+    singletons: int = 0
+    max_size: int = 0
+    spills: int = 0
+    spilled_bytes: int = 0
+
+    def merge(self, other: "DerepStats"):
+        self.reads += other.reads
+        self.spills += other.spills
+        self.spilled_bytes += other.spilled_bytes
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _pack(values: np.ndarray, starts: np.ndarray, lengths: np.ndarray, bits: int, words: int) -> np.ndarray:
+    """
+    Строки [длина, слово 1, ...] для прочтений одной ширины. values — коды
+    оснований (с запасом words * 64 // bits нулей в конце), starts — начала прочтений в нём.
+    Слова big-endian по основаниям, так что их порядок совпадает с порядком последовательностей.
+    """
+    span = words * (64 // bits)
+    # Окна одной ширины выбираются одним обращением, без матрицы индексов
+    padded = np.lib.stride_tricks.sliding_window_view(values, span)[starts]
+    padded[np.arange(span) >= lengths[:, None]] = 0
+    if bits == _PACKED_BITS:
+        quads = padded.reshape(len(starts), -1, 4)
+        padded = (quads[:, :, 0] << 6) | (quads[:, :, 1] << 4) | (quads[:, :, 2] << 2) | quads[:, :, 3]
+    packed = np.ascontiguousarray(padded).view(">u8").astype(np.uint64)
+    return np.column_stack([lengths.astype(np.uint64), packed])
+
+
+def _unpack(rows: np.ndarray, bits: int) -> List[bytes]:
+    codes = rows[:, 1:].astype(">u8").view(np.uint8)
+    if bits == _PACKED_BITS:
+        codes = _DECODE[np.stack([codes >> 6, (codes >> 4) & 3, (codes >> 2) & 3, codes & 3], axis=2)]
+    codes = codes.reshape(len(rows), -1)
+    raw = codes.tobytes()
+    width = codes.shape[1]
+    return [raw[i * width:i * width + length] for i, length in enumerate(rows[:, 0].tolist())]
+
+
+def _hash(rows: np.ndarray) -> np.ndarray:
+    """64-битный хэш строк (FNV-подобное перемешивание по словам)"""
+    h = np.full(len(rows), 0xCBF29CE484222325, dtype=np.uint64)
+    for column in rows.T:
+        h = (h ^ column) * np.uint64(0x100000001B3)
+        h ^= h >> np.uint64(29)
+    return h
+
+
+def _partition(rows: np.ndarray, partitions: int, depth: int) -> np.ndarray:
+    # Каждый уровень деления берёт свои биты хэша
+    return ((_hash(rows) >> np.uint64(8 * depth)) % np.uint64(partitions)).astype(np.int64)
+
+
+def _aggregate(rows: np.ndarray, sizes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Схлопывает одинаковые строки, складывая численности. Строки сортируются
+    по хэшу (сортировка целых чисел заметно быстрее сравнения строк целиком),
+    соседние строки сверяются полностью; при коллизии хэшей — np.unique по строкам.
+    """
+    if len(rows) == 0:
+        return rows, sizes
+    order = np.argsort(_hash(rows))
+    rows, sizes = rows[order], sizes[order]
+    same_row = (rows[1:] == rows[:-1]).all(axis=1)
+    hashes = _hash(rows)
+    if np.any((hashes[1:] == hashes[:-1]) & ~same_row):
+        unique, inverse = np.unique(rows, axis=0, return_inverse=True)
+        return unique, np.bincount(inverse.ravel(), weights=sizes, minlength=len(unique)).astype(np.int64)
+    starts = np.flatnonzero(np.concatenate([[True], ~same_row]))
+    return rows[starts], np.add.reduceat(sizes, starts)
+
+
+def _spill_name(bits: int, words: int, partition: int) -> str:
+    return f"{bits}_{words}_{partition:03d}.bin"
+
+
+def _parse_spill_name(path: Path) -> Tuple[int, int, int]:
+    bits, words, partition = path.stem.split("_")
+    return int(bits), int(words), int(partition)
+
+
+def _write_spill(directory: Path, bits: int, rows: np.ndarray, sizes: np.ndarray,
+                 partitions: int, depth: int) -> int:
+    """Дописывает строки с численностями в файлы разделов; возвращает число байт"""
+    words = rows.shape[1] - 1
+    records = np.column_stack([rows, sizes.astype(np.uint64)])
+    part = _partition(rows, partitions, depth)
+    order = np.argsort(part, kind="stable")
+    bounds = np.searchsorted(part[order], np.arange(partitions + 1))
+    written = 0
+    for p in np.flatnonzero(np.diff(bounds)).tolist():
+        chunk = records[order[bounds[p]:bounds[p + 1]]]
+        with open(directory / _spill_name(bits, words, p), "ab") as f:
+            chunk.tofile(f)
+        written += chunk.nbytes
+    return written
+
+
+def _read_spill(path: Path) -> Tuple[int, np.ndarray, np.ndarray]:
+    bits, words, _ = _parse_spill_name(path)
+    records = np.fromfile(path, dtype=np.uint64).reshape(-1, words + 2)
+    return bits, records[:, :-1], records[:, -1].astype(np.int64)
+
+
+class DerepTable:
+    """
+    Уникальные последовательности одного шарда. Прочтения добавляются
+    пачками (add); finish сбрасывает всю таблицу в разделы spill_dir
+    для объединения с другими шардами.
+    """
+
+    def __init__(self, spill_dir: Union[str, Path], memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 partitions: int = PARTITIONS):
+        self.spill_dir = Path(spill_dir)
+        self.memory_budget = memory_budget
+        self.partitions = partitions
+        self.stats = DerepStats()
+        # (биты на основание, слов в строке) -> списки строк и численностей
+        self._rows: Dict[Tuple[int, int], List[np.ndarray]] = {}
+        self._sizes: Dict[Tuple[int, int], List[np.ndarray]] = {}
+        self._bytes = 0
+        # Остатки прерванной попытки этого же шарда не должны попасть в результат
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+        self.spill_dir.mkdir(parents=True)
+
+    def _append(self, key: Tuple[int, int], rows: np.ndarray, sizes: np.ndarray):
+        self._rows.setdefault(key, []).append(rows)
+        self._sizes.setdefault(key, []).append(sizes)
+        self._bytes += rows.nbytes + sizes.nbytes
+
+    def add(self, batch: FastqBatch):
+        if not len(batch):
+            return
+        self.stats.reads += len(batch)
+        codes = BASE_CODE[batch.data]
+        ambiguous = window_sums(codes == 4, batch.seq_start, batch.lengths) > 0
+
+        for bits, mask in ((_PACKED_BITS, ~ambiguous), (_RAW_BITS, ambiguous)):
+            if not mask.any():
+                continue
+            values = codes if bits == _PACKED_BITS else _UPPER[batch.data]
+            starts, lengths = batch.seq_start[mask], batch.lengths[mask]
+            per_word = 64 // bits
+            words = np.maximum(-(-lengths // per_word), 1)
+            # Окно последнего прочтения может выйти за конец буфера
+            if int((starts + words * per_word).max()) > len(values):
+                values = np.concatenate([values, np.zeros(int(words.max()) * per_word, dtype=np.uint8)])
+            for width in np.unique(words).tolist():
+                group = words == width
+                rows = _pack(values, starts[group], lengths[group], bits, width)
+                self._append((bits, width), rows, np.ones(len(rows), dtype=np.int64))
+
+        if self._bytes > self.memory_budget:
+            self._compact()
+            # Сжатие освободило мало — дубликатов немного, таблица уходит на диск
+            if self._bytes > self.memory_budget // 2:
+                self._spill()
+                self.stats.spills += 1
+
+    def _compact(self):
+        self._bytes = 0
+        for key in list(self._rows):
+            rows, sizes = _aggregate(np.concatenate(self._rows[key]), np.concatenate(self._sizes[key]))
+            self._rows[key], self._sizes[key] = [rows], [sizes]
+            self._bytes += rows.nbytes + sizes.nbytes
+
+    def _spill(self) -> int:
+        written = 0
+        for key, rows in self._rows.items():
+            written += _write_spill(self.spill_dir, key[0], rows[0], self._sizes[key][0], self.partitions, 0)
+        self._rows.clear()
+        self._sizes.clear()
+        self._bytes = 0
+        return written
+
+    def finish(self) -> DerepStats:
+        self._compact()
+        spilled = self._spill()
+        # Итоговый сброс нужен только для объединения шардов и в spilled_bytes не входит
+        self.stats.spilled_bytes = sum(f.stat().st_size for f in self.spill_dir.iterdir()) - spilled
+        return self.stats
+
+
+def _sorted_run(files: Iterable[Path], run_path: Path):
+    """Схлопывает раздел в памяти и пишет его строки в порядке (-size, последовательность)"""
+    groups: Dict[Tuple[int, int], List[Tuple[np.ndarray, np.ndarray]]] = {}
+    for path in files:
+        bits, rows, sizes = _read_spill(path)
+        groups.setdefault((bits, rows.shape[1]), []).append((rows, sizes))
+
+    lines = []
+    for (bits, _), parts in groups.items():
+        rows, sizes = _aggregate(np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts]))
+        for size, sequence in zip(sizes.tolist(), _unpack(rows, bits)):
+            lines.append(b"%020d\t%s\n" % (_MAX_SIZE - size, sequence))
+    lines.sort()
+    with open(run_path, "wb") as out:
+        out.writelines(lines)
+
+
+def _merge_partition(files: List[Path], work_dir: Path, memory_budget: int, partitions: int,
+                     depth: int, runs: List[Path]):
+    """Добавляет в runs прогоны раздела; раздел больше бюджета сначала делится по следующим битам хэша"""
+    size = sum(f.stat().st_size for f in files)
+    if size <= memory_budget or depth >= _MAX_DEPTH:
+        run_path = work_dir / f"run_{len(runs):05d}.txt"
+        _sorted_run(files, run_path)
+        runs.append(run_path)
+        return
+
+    split_dir = work_dir / f"split_{len(runs):05d}_{depth}"
+    split_dir.mkdir()
+    for path in files:
+        bits, rows, sizes = _read_spill(path)
+        _write_spill(split_dir, bits, rows, sizes, partitions, depth)
+    for p in range(partitions):
+        sub = sorted(split_dir.glob(f"*_{p:03d}.bin"))
+        if sub:
+            _merge_partition(sub, work_dir, memory_budget, partitions, depth + 1, runs)
+    shutil.rmtree(split_dir)
+
+
+def _iter_runs(runs: List[Path]) -> Iterator[Tuple[int, bytes]]:
+    files = [open(run, "rb") for run in runs]
+    try:
+        for line in heapq.merge(*files):
+            yield _MAX_SIZE - int(line[:20]), line[21:-1]
+    finally:
+        for f in files:
+            f.close()
+
+
+def merge_tables(
+    spill_dirs: Iterable[Union[str, Path]],
+    output_path: Union[str, Path],
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    partitions: int = PARTITIONS
+) -> DerepStats:
+    """
+    Объединяет таблицы шардов и пишет уникальные последовательности в FASTA
+    по убыванию численности (заголовки Uniq1;size=N, как у usearch/vsearch).
+    Порядок записей зависит только от набора прочтений, но не от разбиения на шарды.
+    """
+    output_path = Path(output_path)
+    work_dir = output_path.parent / (output_path.name + ".work")
+    shutil.rmtree(work_dir, ignore_errors=True)
+    work_dir.mkdir(parents=True)
+    spill_dirs = [Path(d) for d in spill_dirs]
+    stats = DerepStats()
+    try:
+        runs = []
+        for p in range(partitions):
+            files = sorted(f for d in spill_dirs for f in d.glob(f"*_{p:03d}.bin"))
+            if files:
+                _merge_partition(files, work_dir, memory_budget, partitions, 1, runs)
+
+        partial = output_path.with_name(output_path.name + ".part")
+        with open(partial, "wb") as out:
+            for size, sequence in _iter_runs(runs):
+                stats.uniques += 1
+                stats.singletons += size == 1
+                stats.max_size = max(stats.max_size, size)
+                out.write(b">Uniq%d;size=%d\n%s\n" % (stats.uniques, size, sequence))
+        partial.replace(output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return stats
+
+
+def iter_uniques(path: Union[str, Path], offset: int = 0) -> Iterator[Tuple[bytes, int, bytes]]:
+    """
+    (имя, численность, последовательность) из FASTA, записанного merge_tables,
+    начиная с записи по байтовому смещению offset (record_offsets)
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for header in f:
+            sequence = f.readline().rstrip(b"\n")
+            name = header[1:].rstrip(b"\n")
+            yield name, int(name.rsplit(b"size=", 1)[1]), sequence
+
+
+def record_offsets(path: Union[str, Path], records: Iterable[int]) -> List[int]:
+    """
+    Байтовые смещения записей с номерами records (по возрастанию) в FASTA,
+    записанном merge_tables: запись — ровно две строки, поэтому достаточно
+    одного прохода по переводам строк без разбора записей
+    """
+    records = list(records)
+    offsets: List[int] = []
+    position = newlines = 0
+    with open(path, "rb") as f:
+        while len(offsets) < len(records):
+            # Запись r начинается после перевода строки номер 2r - 1
+            wanted = 2 * records[len(offsets)] - 1
+            if wanted < 0:
+                offsets.append(0)
+                continue
+            if wanted >= newlines:
+                chunk = f.read(_OFFSETS_CHUNK)
+                if not chunk:
+                    raise ValueError(f"{path} has fewer than {records[len(offsets)] + 1} records")
+                ends = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord("\n")) + position
+                position += len(chunk)
+                newlines += len(ends)
+                continue
+            offsets.append(int(ends[wanted - (newlines - len(ends))]) + 1)
+    return offsets
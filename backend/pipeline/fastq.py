@@ -0,0 +1,402 @@
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+import numpy as np
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Максимальный объём распакованных данных за один шаг (защита от gzip-бомб)
+DECOMPRESS_STEP = 8 * 1024 * 1024
+DEFAULT_BATCH_BYTES = 8 * 1024 * 1024
+# Предел длины одной записи при потоковом разборе (сверхдлинные прочтения Nanopore —
+# единицы мегабайт): без него файл без переводов строк копится в памяти целиком
+MAX_RECORD_BYTES = 64 * 1024 * 1024
+
+_NEWLINE = ord("\n")
+_CR = ord("\r")
+_AT = ord("@")
+_PLUS = ord("+")
+
+# Допустимые символы последовательности: IUPAC-коды в любом регистре и '.'
+VALID_SEQ = np.zeros(256, dtype=bool)
+for _c in b"ACGTUNRYSWKMBDHVacgtunryswkmbdhv.-":
+    VALID_SEQ[_c] = True
+
+
+class FastqFormatError(ValueError):
+    """Файл не является корректным FASTQ"""
+
+
+@dataclass
+class FastqBatch:
+    """
+    Пачка FASTQ-записей поверх одного буфера байтов.
+    Записи не копируются: хранятся только смещения строк в data.
+    """
+    data: np.ndarray         # uint8, исходные байты
+    name_start: np.ndarray   # int64, начало имени (после '@')
+    name_end: np.ndarray
+    seq_start: np.ndarray
+    qual_start: np.ndarray
+    lengths: np.ndarray      # int64, длина последовательности = длина строки качества
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    @property
+    def total_bases(self) -> int:
+        return int(self.lengths.sum())
+
+    def base_index(self, starts: np.ndarray) -> np.ndarray:
+        """Индексы в data всех оснований пачки подряд (для seq_start или qual_start)"""
+        return flat_index(starts, self.lengths)
+
+    def sequences(self) -> np.ndarray:
+        return self.data[self.base_index(self.seq_start)]
+
+    def qualities(self) -> np.ndarray:
+        return self.data[self.base_index(self.qual_start)]
+
+    def offsets(self) -> np.ndarray:
+        """Начало каждой записи в сплошных массивах sequences()/qualities()"""
+        return np.cumsum(self.lengths) - self.lengths
+
+    def names(self) -> List[bytes]:
+        raw = self.data.tobytes()
+        return [raw[s:e] for s, e in zip(self.name_start.tolist(), self.name_end.tolist())]
+
+    def take(self, mask_or_index: np.ndarray) -> "FastqBatch":
+        return FastqBatch(
+            data=self.data,
+            name_start=self.name_start[mask_or_index],
+            name_end=self.name_end[mask_or_index],
+            seq_start=self.seq_start[mask_or_index],
+            qual_start=self.qual_start[mask_or_index],
+            lengths=self.lengths[mask_or_index],
+        )
+
+    def records(self, start: int, stop: int) -> "FastqBatch":
+        """
+        Записи [start, stop) поверх своего участка буфера (без копирования):
+        операции над data такой пачки не проходят по чужим записям
+        """
+        lo = int(self.name_start[start]) - 1
+        hi = int(self.qual_start[stop - 1] + self.lengths[stop - 1])
+        return FastqBatch(
+            data=self.data[lo:hi],
+            name_start=self.name_start[start:stop] - lo,
+            name_end=self.name_end[start:stop] - lo,
+            seq_start=self.seq_start[start:stop] - lo,
+            qual_start=self.qual_start[start:stop] - lo,
+            lengths=self.lengths[start:stop],
+        )
+
+
+def flat_index(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Склеивает диапазоны [start, start + length) в один массив индексов"""
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(total, dtype=np.int64)
+
+
+def window_reduce(
+    ufunc: np.ufunc,
+    values: np.ndarray,
+    starts: np.ndarray,
+    lengths: np.ndarray,
+    dtype=None,
+    empty=0
+) -> np.ndarray:
+    """
+    ufunc.reduce по окнам values[start:start + length] одним вызовом reduceat.
+    Окна должны идти по возрастанию и не пересекаться (как строки записей в буфере);
+    для пустых окон возвращается empty.
+    """
+    n = len(starts)
+    if n == 0 or len(values) == 0:
+        return np.full(n, empty, dtype=dtype or values.dtype)
+    limit = len(values)
+    bounds = np.empty(2 * n, dtype=np.int64)
+    bounds[0::2] = np.minimum(starts, limit - 1)
+    bounds[1::2] = starts + lengths
+    if bounds[-1] >= limit:
+        # Последнее окно заканчивается в конце массива
+        bounds = bounds[:-1]
+    result = ufunc.reduceat(values, bounds, dtype=dtype)[0::2]
+    return np.where(lengths > 0, result, empty)
+
+
+def window_sums(values: np.ndarray, starts: np.ndarray, lengths: np.ndarray, dtype=np.uint32) -> np.ndarray:
+    """
+    Суммы по окнам. Для байтовых массивов накопление в uint32 заметно быстрее int64
+    и не переполняется на прочтениях до ~16 млн оснований.
+    """
+    if values.dtype == np.bool_:
+        values = values.view(np.uint8)
+    return window_reduce(np.add, values, starts, lengths, dtype=dtype).astype(np.int64 if dtype == np.uint32 else dtype)
+
+
+def window_counts(positions: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Сколько из отсортированных позиций попадает в каждое окно (для редких событий)"""
+    return np.searchsorted(positions, starts + lengths) - np.searchsorted(positions, starts)
+
+
+def first_in_window(positions: np.ndarray, starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Смещение первой позиции внутри каждого окна; для окон без позиций — длина окна"""
+    first = np.searchsorted(positions, starts)
+    found = np.append(positions, np.iinfo(np.int64).max)[first] - starts
+    return np.minimum(found, lengths)
+
+
+def count_common_bases(upper: np.ndarray) -> np.ndarray:
+    """Маска A/C/G/T/N по байтам, уже приведённым к верхнему регистру (data & 0xDF)"""
+    return (upper == 65) | (upper == 67) | (upper == 71) | (upper == 84) | (upper == 78)
+
+
+def empty_batch() -> FastqBatch:
+    empty = np.zeros(0, dtype=np.int64)
+    return FastqBatch(np.zeros(0, dtype=np.uint8), empty, empty, empty, empty, empty)
+
+
+def concat_batches(*batches: FastqBatch) -> FastqBatch:
+    """Объединяет пачки поверх разных буферов в одну (буферы копируются)"""
+    batches = [b for b in batches if len(b)]
+    if not batches:
+        return empty_batch()
+    if len(batches) == 1:
+        return batches[0]
+    shifts = np.cumsum([0] + [len(b.data) for b in batches[:-1]])
+
+    def shifted(field: str) -> np.ndarray:
+        return np.concatenate([getattr(b, field) + shift for b, shift in zip(batches, shifts)])
+
+    return FastqBatch(
+        data=np.concatenate([b.data for b in batches]),
+        name_start=shifted("name_start"),
+        name_end=shifted("name_end"),
+        seq_start=shifted("seq_start"),
+        qual_start=shifted("qual_start"),
+        lengths=np.concatenate([b.lengths for b in batches]),
+    )
+
+
+def parse_records(
+    buffer: Union[bytes, bytearray, memoryview],
+    final: bool = False,
+    first_record: int = 0,
+    validate: bool = True
+) -> Tuple[FastqBatch, int]:
+    """
+    Векторизованно разбирает полные FASTQ-записи из буфера.
+    Возвращает пачку и число использованных байтов; хвост с неполной
+    записью остаётся вызывающему коду до следующего вызова.
+    При final=True неполная запись в конце считается ошибкой.
+    validate=False пропускает проверку алфавита (структура проверяется всегда) —
+    для файлов из хранилища, уже проверенных при загрузке.
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    newlines = np.flatnonzero(data == _NEWLINE)
+
+    if final and len(data) and data[-1] != _NEWLINE:
+        newlines = np.append(newlines, len(data))
+
+    n_records = len(newlines) // 4
+    used_lines = n_records * 4
+
+    if final:
+        tail_start = int(newlines[used_lines - 1]) + 1 if n_records else 0
+        tail = data[tail_start:]
+        if np.any((tail != _NEWLINE) & (tail != _CR) & (tail != ord(" "))):
+            raise FastqFormatError(f"Truncated FASTQ record #{first_record + n_records + 1}")
+
+    if n_records == 0:
+        return empty_batch(), 0
+
+    ends = newlines[:used_lines]
+    starts = np.empty(used_lines, dtype=np.int64)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+
+    # Поддержка переводов строк \r\n
+    has_cr = (ends > starts) & (data[np.maximum(ends - 1, 0)] == _CR)
+    line_ends = ends - has_cr
+
+    starts = starts.reshape(-1, 4)
+    line_ends = line_ends.reshape(-1, 4)
+    header_start = starts[:, 0]
+    seq_start = starts[:, 1]
+    plus_start = starts[:, 2]
+    qual_start = starts[:, 3]
+    seq_len = line_ends[:, 1] - seq_start
+    qual_len = line_ends[:, 3] - qual_start
+
+    bad_header = (line_ends[:, 0] <= header_start) | (data[header_start] != _AT)
+    bad_plus = (line_ends[:, 2] <= plus_start) | (data[np.minimum(plus_start, len(data) - 1)] != _PLUS)
+    bad_length = seq_len != qual_len
+    bad = bad_header | bad_plus | bad_length
+    if bad.any():
+        i = int(np.argmax(bad))
+        if bad_header[i]:
+            reason = "header line must start with '@'"
+        elif bad_plus[i]:
+            reason = "separator line must start with '+'"
+        else:
+            reason = "sequence and quality lengths differ"
+        raise FastqFormatError(f"Invalid FASTQ record #{first_record + i + 1}: {reason}")
+
+    batch = FastqBatch(
+        data=data,
+        name_start=header_start + 1,
+        name_end=line_ends[:, 0],
+        seq_start=seq_start,
+        qual_start=qual_start,
+        lengths=seq_len,
+    )
+
+    consumed = min(int(ends[-1]) + 1, len(data))
+    if not validate:
+        return batch, consumed
+
+    # Алфавит: A/C/G/T/N проверяются сравнениями по всему буферу,
+    # точная проверка по таблице IUPAC — только для прочтений с другими символами
+    common = window_sums(count_common_bases(data & 0xDF), seq_start, seq_len)
+    unusual = np.flatnonzero(common != seq_len)
+    if len(unusual):
+        suspect = batch.take(unusual)
+        bad_seq = ~VALID_SEQ[suspect.sequences()]
+        if bad_seq.any():
+            record = int(unusual[np.searchsorted(np.cumsum(suspect.lengths), np.argmax(bad_seq), side="right")])
+            raise FastqFormatError(f"Invalid FASTQ record #{first_record + record + 1}: bad sequence character")
+
+    # Символы вне диапазона Phred+33 редки (переводы строк, пробелы в заголовках),
+    # поэтому достаточно проверить, не попал ли какой-то из них в строку качества
+    outside = np.flatnonzero((data < 33) | (data > 126))
+    bad_qual = first_in_window(outside, qual_start, qual_len) < qual_len
+    if bad_qual.any():
+        record = int(np.argmax(bad_qual))
+        raise FastqFormatError(f"Invalid FASTQ record #{first_record + record + 1}: bad quality character")
+
+    return batch, consumed
+
+
+class FastqStreamParser:
+    """
+    Инкрементальный разбор FASTQ из произвольных кусков байтов.
+    gzip (в том числе многочленный, как BGZF) определяется по сигнатуре
+    и распаковывается по мере поступления данных.
+
+    Хвост с неполной записью копится кусками и разбирается снова, только
+    когда вырос вдвое с прошлой попытки: запись длиннее куска склеивается
+    за линейное время. Хвост длиннее max_record_bytes — ошибка формата.
+    """
+
+    def __init__(self, validate: bool = True, max_record_bytes: int = MAX_RECORD_BYTES):
+        self.validate = validate
+        self.max_record_bytes = max_record_bytes
+        self._pending: List[bytes] = []
+        self._pending_bytes = 0
+        self._retry_at = 0
+        self._decompressor = None
+        self._gzip: Optional[bool] = None
+        self.records = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def is_gzip(self) -> bool:
+        return bool(self._gzip)
+
+    def _decompress(self, chunk: bytes) -> Iterator[bytes]:
+        data = chunk
+        while True:
+            if self._decompressor is None:
+                self._decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            decompressor = self._decompressor
+            try:
+                out = decompressor.decompress(data, DECOMPRESS_STEP)
+            except zlib.error as e:
+                raise FastqFormatError(f"Corrupted gzip stream: {e}")
+            if out:
+                yield out
+            if decompressor.eof:
+                # Дальше может идти следующий член gzip
+                data = decompressor.unused_data
+                self._decompressor = None
+                if not data:
+                    break
+            else:
+                data = decompressor.unconsumed_tail
+                # Вход исчерпан и буфер вывода не заполнен — ждём следующий кусок
+                if not data and len(out) < DECOMPRESS_STEP:
+                    break
+
+    def _take_pending(self) -> bytes:
+        buffer = b"".join(self._pending)
+        self._pending = []
+        self._pending_bytes = 0
+        return buffer
+
+    def feed(self, chunk: bytes) -> Iterator[FastqBatch]:
+        if not chunk:
+            return
+        self.bytes_in += len(chunk)
+        if self._gzip is None:
+            self._gzip = chunk[:2] == GZIP_MAGIC
+
+        pieces = self._decompress(chunk) if self._gzip else (chunk,)
+        for piece in pieces:
+            if not piece:
+                continue
+            if not self.bytes_out and piece[:1] != b"@":
+                raise FastqFormatError("File does not start with a FASTQ record ('@')")
+            self.bytes_out += len(piece)
+            self._pending.append(piece)
+            self._pending_bytes += len(piece)
+            if self._pending_bytes < self._retry_at and self._pending_bytes <= self.max_record_bytes:
+                continue
+            buffer = self._take_pending() if len(self._pending) > 1 else self._pending.pop()
+            self._pending_bytes = 0
+            batch, consumed = parse_records(buffer, final=False, first_record=self.records, validate=self.validate)
+            tail = len(buffer) - consumed
+            if tail > self.max_record_bytes:
+                raise FastqFormatError(
+                    f"FASTQ record #{self.records + len(batch) + 1} is longer than {self.max_record_bytes} bytes"
+                )
+            if tail:
+                self._pending.append(bytes(buffer[consumed:]))
+                self._pending_bytes = tail
+            self._retry_at = 2 * tail
+            if len(batch):
+                self.records += len(batch)
+                yield batch
+
+    def close(self) -> Iterator[FastqBatch]:
+        if self._gzip and self._decompressor is not None and not self._decompressor.eof:
+            raise FastqFormatError("Truncated gzip stream")
+        batch, _ = parse_records(self._take_pending(), final=True, first_record=self.records, validate=self.validate)
+        if len(batch):
+            self.records += len(batch)
+            yield batch
+
+
+def iter_batches(
+    source: Union[str, Path, BinaryIO],
+    batch_bytes: int = DEFAULT_BATCH_BYTES,
+    validate: bool = True
+) -> Iterator[FastqBatch]:
+    """Читает FASTQ (обычный или gzip) пачками примерно по batch_bytes сырых байтов"""
+    stream = open(source, "rb") if isinstance(source, (str, Path)) else source
+    parser = FastqStreamParser(validate)
+    try:
+        while True:
+            chunk = stream.read(batch_bytes)
+            if not chunk:
+                break
+            yield from parser.feed(chunk)
+        yield from parser.close()
+    finally:
+        if isinstance(source, (str, Path)):
+            stream.close()
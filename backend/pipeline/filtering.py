@@ -0,0 +1,161 @@
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Union
+import numpy as np
+from .fastq import FastqBatch, DEFAULT_BATCH_BYTES, flat_index, first_in_window, iter_batches, window_sums
+from .qc import PHRED_OFFSET, expected_errors, n_counts
+
+# Причины отбраковки в порядке проверки
+REJECT_REASONS = ("too_short", "too_many_ns", "too_many_ambiguous", "expected_errors", "low_quality")
+
+
+@dataclass
+class FilterParams:
+    """Параметры фильтрации, общие для Illumina и Nanopore"""
+    min_quality: Optional[int] = None       # минимальное среднее качество прочтения
+    max_ambiguous: Optional[int] = None     # максимум оснований, отличных от ACGT
+    minlen: int = 0                         # минимальная длина после обрезки
+    maxns: Optional[int] = None             # максимум N
+    maxee: Optional[float] = None           # максимум ожидаемых ошибок
+    trim_first_bases: int = 0               # отрезать с 5'-конца
+    trim_after_base: Optional[int] = None   # отбросить всё после этой позиции исходного прочтения
+    truncq: Optional[int] = None            # обрезать прочтение на первом основании с Q <= truncq
+
+    @classmethod
+    def from_parameters(cls, parameters: dict) -> "FilterParams":
+        """Строит параметры из JSON AnalysisJob.parameters"""
+        known = {name: parameters.get(name) for name in cls.__dataclass_fields__}
+        values = {k: v for k, v in known.items() if v is not None}
+        return cls(**values)
+
+
+@dataclass
+class FilterStats:
+    reads_in: int = 0
+    reads_out: int = 0
+    bases_in: int = 0
+    bases_out: int = 0
+    rejected: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(REJECT_REASONS, 0))
+
+    def merge(self, other: "FilterStats"):
+        self.reads_in += other.reads_in
+        self.reads_out += other.reads_out
+        self.bases_in += other.bases_in
+        self.bases_out += other.bases_out
+        for reason, count in other.rejected.items():
+            self.rejected[reason] = self.rejected.get(reason, 0) + count
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _first_low_quality(batch: FastqBatch, truncq: int) -> np.ndarray:
+    """Позиция первого основания с Q <= truncq в каждом прочтении (или его длина)"""
+    # Кандидаты ищутся по всему буферу (туда попадут и переводы строк),
+    # для каждого прочтения берётся первый кандидат внутри строки качества
+    candidates = np.flatnonzero(batch.data <= PHRED_OFFSET + truncq)
+    return first_in_window(candidates, batch.qual_start, batch.lengths)
+
+
+def filter_batch(batch: FastqBatch, params: FilterParams, stats: Optional[FilterStats] = None) -> FastqBatch:
+    """
+    Обрезка и фильтрация пачки прочтений целиком операциями над массивами.
+    Все счётчики (N, неоднозначные основания, ожидаемые ошибки, качество)
+    считаются по окнам исходного буфера через reduceat, без цикла по прочтениям.
+    Возвращает пачку с прошедшими фильтр прочтениями (без копирования данных).
+    """
+    lengths = batch.lengths
+    if stats is not None:
+        stats.reads_in += len(batch)
+        stats.bases_in += int(lengths.sum())
+
+    # Обрезка: сначала хвост по исходной координате, затем голова
+    end = lengths if params.trim_after_base is None else np.minimum(lengths, params.trim_after_base)
+    head = np.minimum(params.trim_first_bases, lengths)
+    trimmed = FastqBatch(
+        data=batch.data,
+        name_start=batch.name_start,
+        name_end=batch.name_end,
+        seq_start=batch.seq_start + head,
+        qual_start=batch.qual_start + head,
+        lengths=np.maximum(end - head, 0),
+    )
+
+    if params.truncq is not None:
+        trimmed.lengths = _first_low_quality(trimmed, params.truncq)
+
+    data = trimmed.data
+    lengths = trimmed.lengths
+    checks = [("too_short", lengths < max(params.minlen, 1))]
+
+    if params.maxns is not None:
+        checks.append(("too_many_ns", n_counts(trimmed) > params.maxns))
+    if params.max_ambiguous is not None:
+        upper = data & 0xDF
+        acgt = (upper == ord("A")) | (upper == ord("C")) | (upper == ord("G")) | (upper == ord("T"))
+        ambiguous = lengths - window_sums(acgt, trimmed.seq_start, lengths)
+        checks.append(("too_many_ambiguous", ambiguous > params.max_ambiguous))
+
+    if params.maxee is not None:
+        checks.append(("expected_errors", expected_errors(trimmed) > params.maxee))
+    if params.min_quality is not None:
+        quality_sum = window_sums(data, trimmed.qual_start, lengths) - PHRED_OFFSET * lengths
+        checks.append(("low_quality", quality_sum < params.min_quality * np.maximum(lengths, 1)))
+
+    keep = np.ones(len(lengths), dtype=bool)
+    for reason, failed in checks:
+        if stats is not None:
+            stats.rejected[reason] += int(np.count_nonzero(failed & keep))
+        keep &= ~failed
+
+    result = trimmed.take(keep)
+    if stats is not None:
+        stats.reads_out += len(result)
+        stats.bases_out += int(result.lengths.sum())
+    return result
+
+
+_SEPARATORS = np.frombuffer(b"@\n+", dtype=np.uint8)
+
+
+def format_fastq(batch: FastqBatch) -> bytes:
+    """
+    Собирает FASTQ-текст пачки одной операцией gather:
+    '@' имя '\\n' последовательность '\\n' '+' '\\n' качество '\\n'
+    """
+    if not len(batch):
+        return b""
+    base = len(batch.data)
+    source = np.concatenate((batch.data, _SEPARATORS))
+    at, newline, plus = base, base + 1, base + 2
+    n = len(batch)
+    ones = np.ones(n, dtype=np.int64)
+
+    starts = np.stack([
+        np.full(n, at), batch.name_start, np.full(n, newline),
+        batch.seq_start, np.full(n, newline), np.full(n, plus),
+        np.full(n, newline), batch.qual_start, np.full(n, newline),
+    ], axis=1)
+    lengths = np.stack([
+        ones, batch.name_end - batch.name_start, ones,
+        batch.lengths, ones, ones,
+        ones, batch.lengths, ones,
+    ], axis=1)
+    return source[flat_index(starts.ravel(), lengths.ravel())].tobytes()
+
+
+def filter_stream(
+    source: Union[str, Path, BinaryIO],
+    output: BinaryIO,
+    params: FilterParams,
+    batch_bytes: int = DEFAULT_BATCH_BYTES,
+    validate: bool = False
+) -> FilterStats:
+    """
+    Фильтрует FASTQ-файл пачками и пишет прошедшие прочтения в output.
+    Алфавит по умолчанию не проверяется: файлы в хранилище проверены при загрузке.
+    """
+    stats = FilterStats()
+    for batch in iter_batches(source, batch_bytes, validate):
+        output.write(format_fastq(filter_batch(batch, params, stats)))
+    return stats
@@ -0,0 +1,153 @@
+"""
+Измерения этапов конвейера: время, процессорное время, пиковая память
+процесса, байты ввода-вывода и число прочтений.
+
+Функции конвейера отмечают свои этапы через stage(); измерения
+накапливаются, только если функция вызвана через metered (так её
+запускает обработчик задач в процессе пула), иначе stage() ничего не
+стоит. Этапы, которые в шарде чередуются для каждой пачки (распаковка,
+обрезка, фильтрация, дерепликация, запись), суммируются по пачкам.
+
+Части одного этапа из разных процессов объединяются combine: процессорное
+время, байты и прочтения складываются, а время этапа — время самой
+долгой части, так как части выполняются одновременно. Пиковая память —
+наибольшая среди процессов (VmHWM, сбрасывается перед каждым вызовом).
+"""
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+STAGE_ORDER = ("upload", "decompress", "trim", "filter", "dereplicate", "classify", "write_results")
+
+
+@dataclass
+class StageMetrics:
+    stage: str
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    peak_rss_bytes: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    reads: int = 0
+
+    @property
+    def reads_per_second(self) -> Optional[float]:
+        if self.wall_seconds <= 0 or not self.reads:
+            return None
+        return self.reads / self.wall_seconds
+
+    def merge(self, other: "StageMetrics", parallel: bool = False):
+        """parallel — части выполнялись одновременно, время этапа не складывается"""
+        if parallel:
+            self.wall_seconds = max(self.wall_seconds, other.wall_seconds)
+        else:
+            self.wall_seconds += other.wall_seconds
+        self.cpu_seconds += other.cpu_seconds
+        self.peak_rss_bytes = max(self.peak_rss_bytes, other.peak_rss_bytes)
+        self.bytes_read += other.bytes_read
+        self.bytes_written += other.bytes_written
+        self.reads += other.reads
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def combine(parts: List[List[StageMetrics]], parallel: bool = False) -> List[StageMetrics]:
+    """Объединяет измерения нескольких вызовов по этапам, в порядке STAGE_ORDER"""
+    stages: Dict[str, StageMetrics] = {}
+    for metrics in parts:
+        for item in metrics:
+            if item.stage in stages:
+                stages[item.stage].merge(item, parallel)
+            else:
+                stages[item.stage] = StageMetrics(**asdict(item))
+    return sorted(stages.values(), key=lambda m: STAGE_ORDER.index(m.stage))
+
+
+def reset_peak_rss():
+    # Linux: запись "5" в clear_refs сбрасывает VmHWM процесса
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+    except OSError:
+        pass
+
+
+def peak_rss() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Без /proc — пик за всё время жизни процесса (в macOS в байтах, в Linux в КБ)
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+class StageMeter:
+    """Накопленные измерения этапов одного вызова в текущем процессе"""
+
+    def __init__(self):
+        self.stages: Dict[str, StageMetrics] = {}
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[StageMetrics]:
+        metrics = self.stages.get(name)
+        if metrics is None:
+            metrics = self.stages[name] = StageMetrics(name)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield metrics
+        finally:
+            metrics.wall_seconds += time.perf_counter() - wall
+            metrics.cpu_seconds += time.process_time() - cpu
+
+    def results(self) -> List[StageMetrics]:
+        peak = peak_rss()
+        for metrics in self.stages.values():
+            metrics.peak_rss_bytes = peak
+        return combine([list(self.stages.values())])
+
+
+_meter: Optional[StageMeter] = None
+
+
+@contextmanager
+def stage(name: str) -> Iterator[StageMetrics]:
+    """Измеряет участок кода как часть этапа name; вне metered — без учёта"""
+    if _meter is None:
+        yield StageMetrics(name)
+        return
+    with _meter.measure(name) as metrics:
+        yield metrics
+
+
+def timed_iter(batches: Iterable, name: str) -> Iterator:
+    """Отдаёт пачки прочтений, измеряя их получение (чтение, распаковку) как этап name"""
+    iterator = iter(batches)
+    while True:
+        with stage(name) as metrics:
+            batch = next(iterator, None)
+            if batch is not None:
+                metrics.reads += len(batch)
+                metrics.bytes_read += batch.data.nbytes
+        if batch is None:
+            return
+        yield batch
+
+
+def metered(func: Callable, *args) -> Tuple[object, List[StageMetrics]]:
+    """Вызывает func(*args) и возвращает её результат и измерения её этапов"""
+    global _meter
+    _meter = StageMeter()
+    reset_peak_rss()
+    try:
+        result = func(*args)
+        return result, _meter.results()
+    finally:
+        _meter = None
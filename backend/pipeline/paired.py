@@ -0,0 +1,302 @@
+"""
+Парные прочтения Illumina: синхронное чтение R1/R2 (двумя файлами или
+одним чередующимся) и слияние перекрывающихся пар в одно прочтение.
+
+Слияние векторизовано по всей пачке: начало перекрытия ищется по затравке —
+первым SEED_LENGTH основаниям обратно-комплементарного R2, закодированным
+по 2 бита, — среди k-меров R1, затем перекрытие проверяется на число
+несовпадений. Сдвиг, при котором R2 начинается раньше R1 (stagger),
+не рассматривается — как и в vsearch по умолчанию. Пары без перекрытия
+отбрасываются; если таких большинство (ампликон длиннее суммы прочтений,
+файлы не парные), задача завершается ошибкой (check_merge_rate), а не
+пустым результатом.
+"""
+from dataclasses import dataclass, asdict
+from typing import Iterable, Iterator, Optional, Tuple
+import numpy as np
+from .fastq import FastqBatch, FastqFormatError, concat_batches, empty_batch, first_in_window, flat_index, window_sums
+from .qc import PHRED_OFFSET
+
+SEED_LENGTH = 10
+_NO_KMER = np.uint32(0xFFFFFFFE)
+_NO_SEED = np.uint32(0xFFFFFFFF)
+
+COMPLEMENT = np.arange(256, dtype=np.uint8)
+for _a, _b in ("AT", "CG", "RY", "KM", "BV", "DH"):
+    for _x, _y in ((_a, _b), (_a.lower(), _b.lower())):
+        COMPLEMENT[ord(_x)], COMPLEMENT[ord(_y)] = ord(_y), ord(_x)
+
+# 2-битный код основания; 4 — любое другое (N, IUPAC), такие k-меры не используются
+BASE_CODE = np.full(256, 4, dtype=np.uint8)
+for _code, _base in enumerate("ACGT"):
+    BASE_CODE[ord(_base)] = BASE_CODE[ord(_base.lower())] = _code
+
+
+@dataclass
+class MergeParams:
+    min_overlap: int = 20            # минимальная длина перекрытия
+    max_diffs: int = 10              # максимум несовпадений в перекрытии
+    max_diff_fraction: float = 0.1   # максимум несовпадений относительно длины перекрытия
+    min_merge_rate: float = 0.2      # меньшая доля слитых пар — ошибка задачи
+
+    @classmethod
+    def from_parameters(cls, parameters: dict) -> "MergeParams":
+        known = {name: parameters.get(name) for name in cls.__dataclass_fields__}
+        return cls(**{k: v for k, v in known.items() if v is not None})
+
+
+@dataclass
+class MergeStats:
+    pairs: int = 0
+    merged: int = 0
+    no_overlap: int = 0
+    too_many_diffs: int = 0
+
+    def merge(self, other: "MergeStats"):
+        self.pairs += other.pairs
+        self.merged += other.merged
+        self.no_overlap += other.no_overlap
+        self.too_many_diffs += other.too_many_diffs
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def check_merge_rate(stats: MergeStats, params: MergeParams):
+    """ValueError, если слилось меньше params.min_merge_rate пар: иначе задача молча вернула бы почти пустой вывод"""
+    if stats.pairs and stats.merged < params.min_merge_rate * stats.pairs:
+        raise ValueError(
+            f"Only {stats.merged} of {stats.pairs} read pairs could be merged "
+            f"({stats.no_overlap} without overlap of at least {params.min_overlap} bases, "
+            f"{stats.too_many_diffs} with too many mismatches); check that R1 and R2 are mates "
+            f"and the amplicon is shorter than the two reads combined"
+        )
+
+
+def _mate_name(name: bytes) -> bytes:
+    name = name.split(None, 1)[0] if name else name
+    return name[:-2] if name[-2:] in (b"/1", b"/2") else name
+
+
+def check_mates(r1: FastqBatch, r2: FastqBatch):
+    """
+    Сверяет имена первой и последней пары пачки: рассинхронизация файлов
+    сдвигает все последующие пары, поэтому проверки по краям достаточно.
+    """
+    if len(r1) != len(r2):
+        raise FastqFormatError("R1 and R2 batches differ in size")
+    if not len(r1):
+        return
+    for i in (0, len(r1) - 1):
+        n1 = r1.data[r1.name_start[i]:r1.name_end[i]].tobytes()
+        n2 = r2.data[r2.name_start[i]:r2.name_end[i]].tobytes()
+        if _mate_name(n1) != _mate_name(n2):
+            raise FastqFormatError(
+                f"R1 and R2 are out of sync: '{n1.decode(errors='replace')}' vs '{n2.decode(errors='replace')}'"
+            )
+
+
+def iter_pairs(
+    batches_r1: Iterable[FastqBatch],
+    batches_r2: Iterable[FastqBatch]
+) -> Iterator[Tuple[FastqBatch, FastqBatch]]:
+    """
+    Идёт по двум потокам пачек синхронно и выдаёт пары пачек равной длины.
+    Память ограничена одной недочитанной пачкой на файл.
+    """
+    streams = (iter(batches_r1), iter(batches_r2))
+    pending = [empty_batch(), empty_batch()]
+    finished = [False, False]
+    while True:
+        for i in (0, 1):
+            while not len(pending[i]) and not finished[i]:
+                batch = next(streams[i], None)
+                if batch is None:
+                    finished[i] = True
+                else:
+                    pending[i] = batch
+        if not len(pending[0]) or not len(pending[1]):
+            if len(pending[0]) or len(pending[1]):
+                raise FastqFormatError("R1 and R2 contain different numbers of reads")
+            return
+        n = min(len(pending[0]), len(pending[1]))
+        r1, r2 = pending[0].take(slice(0, n)), pending[1].take(slice(0, n))
+        pending = [pending[0].take(slice(n, None)), pending[1].take(slice(n, None))]
+        check_mates(r1, r2)
+        yield r1, r2
+
+
+def iter_interleaved(batches: Iterable[FastqBatch]) -> Iterator[Tuple[FastqBatch, FastqBatch]]:
+    """Пары из чередующегося файла (R1, R2, R1, R2, ...)"""
+    carry = empty_batch()
+    for batch in batches:
+        if len(carry):
+            batch = concat_batches(carry, batch)
+        paired = len(batch) // 2 * 2
+        carry = batch.take(slice(paired, None))
+        if paired:
+            r1, r2 = batch.take(slice(0, paired, 2)), batch.take(slice(1, paired, 2))
+            check_mates(r1, r2)
+            yield r1, r2
+    if len(carry):
+        raise FastqFormatError("Interleaved file contains an odd number of reads")
+
+
+def reverse_complement(batch: FastqBatch) -> Tuple[np.ndarray, np.ndarray]:
+    """Обратно-комплементарные последовательности и развёрнутые качества пачки подряд"""
+    lengths = batch.lengths
+    total = int(lengths.sum())
+    back = np.arange(total, dtype=np.int64)
+    offsets = batch.offsets()
+    seq_index = np.repeat(batch.seq_start + lengths - 1 + offsets, lengths) - back
+    qual_index = np.repeat(batch.qual_start + lengths - 1 + offsets, lengths) - back
+    return COMPLEMENT[batch.data[seq_index]], batch.data[qual_index]
+
+
+def _kmers(codes: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """2-битные k-меры, начинающиеся в каждой позиции, и маска k-меров с не-ACGT"""
+    n = len(codes)
+    kmers = np.zeros(n, dtype=np.uint32)
+    bits = (codes & 3).astype(np.uint32)
+    for j in range(k):
+        window = kmers[:n - j]
+        window <<= 2
+        window |= bits[j:]
+    # Есть ли не-ACGT в окне [i, i + k) — по разности накопленных сумм
+    bad = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(codes > 3, out=bad[1:])
+    invalid = np.ones(n, dtype=bool)
+    if n >= k:
+        invalid[:n - k + 1] = bad[k:] != bad[:n - k + 1]
+    return kmers, invalid
+
+
+def _seeds(codes: np.ndarray, starts: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """k-меры только в заданных позициях (затравки R2) и маска затравок с не-ACGT"""
+    window = codes[np.minimum(starts[:, None] + np.arange(k), max(len(codes) - 1, 0))]
+    weights = np.uint32(4) ** np.arange(k - 1, -1, -1, dtype=np.uint32)
+    return ((window & 3).astype(np.uint32) * weights).sum(axis=1, dtype=np.uint32), (window > 3).any(axis=1)
+
+
+def _count_diffs(s1, s2, idx1, idx2, overlap) -> np.ndarray:
+    different = (s1[idx1] & 0xDF) != (s2[idx2] & 0xDF)
+    return window_sums(different, np.cumsum(overlap) - overlap, overlap)
+
+
+def merge_pairs(
+    r1: FastqBatch,
+    r2: FastqBatch,
+    params: MergeParams,
+    stats: Optional[MergeStats] = None
+) -> FastqBatch:
+    """
+    Сливает перекрывающиеся пары в одно прочтение; пары без надёжного
+    перекрытия отбрасываются (учитываются в stats).
+    В перекрытии берётся основание с большим качеством; при совпадении
+    оснований качество — максимальное из двух, при расхождении — |Q1 - Q2|.
+    """
+    n = len(r1)
+    if stats is not None:
+        stats.pairs += n
+    if not n:
+        return empty_batch()
+
+    l1, l2 = r1.lengths, r2.lengths
+    o1, o2 = r1.offsets(), r2.offsets()
+    s1, q1 = r1.sequences(), r1.qualities()
+    s2, q2 = reverse_complement(r2)
+    c1, c2 = BASE_CODE[s1], BASE_CODE[s2]
+
+    k = SEED_LENGTH
+    kmers1, invalid1 = _kmers(c1, k)
+    # Негодные k-меры R1 (с не-ACGT или выходящие за конец прочтения) и пары
+    # без затравки получают разные значения вне диапазона 4^k и не совпадают
+    kmers1[invalid1] = _NO_KMER
+    tail = np.minimum(k - 1, l1)
+    kmers1[flat_index(o1 + l1 - tail, tail)] = _NO_KMER
+
+    positions = np.full(n, -1, dtype=np.int64)
+    candidate_seen = np.zeros(n, dtype=bool)
+    # Вторая и следующие затравки (со сдвигом k, 2k, ...) — на случай ошибки в первой
+    for seed_offset in range(0, max(params.min_overlap - k, 0) + 1, k):
+        pending = (positions < 0) & (l2 >= seed_offset + k)
+        if not pending.any():
+            break
+        seeds, bad_seeds = _seeds(c2, o2 + seed_offset, k)
+        pending &= ~bad_seeds
+        seeds[~pending] = _NO_SEED
+        hits = kmers1 == np.repeat(seeds, l1)
+        first = first_in_window(np.flatnonzero(hits), o1, l1)
+        start = first - seed_offset
+        overlap = np.minimum(l1 - start, l2)
+        found = pending & (first < l1) & (start >= 0) & (overlap >= params.min_overlap)
+        candidate_seen |= found
+
+        index = np.flatnonzero(found)
+        if not len(index):
+            continue
+        ov = overlap[index]
+        diffs = _count_diffs(
+            s1, s2,
+            flat_index(o1[index] + start[index], ov),
+            flat_index(o2[index], ov),
+            ov
+        )
+        accepted = (diffs <= params.max_diffs) & (diffs <= params.max_diff_fraction * ov)
+        positions[index[accepted]] = start[index[accepted]]
+
+    merged = positions >= 0
+    if stats is not None:
+        stats.merged += int(np.count_nonzero(merged))
+        stats.too_many_diffs += int(np.count_nonzero(candidate_seen & ~merged))
+        stats.no_overlap += int(np.count_nonzero(~candidate_seen))
+
+    index = np.flatnonzero(merged)
+    if not len(index):
+        return empty_batch()
+    start = positions[index]
+    L1, L2 = l1[index], l2[index]
+    ov = np.minimum(L1 - start, L2)
+
+    # Консенсус в перекрытии
+    idx1 = flat_index(o1[index] + start, ov)
+    idx2 = flat_index(o2[index], ov)
+    b1, b2 = s1[idx1], s2[idx2]
+    qa, qb = q1[idx1].astype(np.int16), q2[idx2].astype(np.int16)
+    use_r2 = qb > qa
+    consensus = np.where(use_r2, b2, b1)
+    agree = (b1 & 0xDF) == (b2 & 0xDF)
+    consensus_q = np.where(
+        agree, np.maximum(qa, qb), np.maximum(np.abs(qa - qb) + PHRED_OFFSET, PHRED_OFFSET + 2)
+    ).astype(np.uint8)
+
+    # Хвост после перекрытия — из R2, если он длиннее остатка R1, иначе из R1
+    tail_from_r2 = start + L2 >= L1
+    tail_len = np.where(tail_from_r2, L2 - ov, L1 - start - L2)
+    lengths = start + ov + tail_len
+
+    consensus_base = len(s1)
+    r2_base = consensus_base + len(consensus)
+    starts = np.stack([
+        o1[index],
+        consensus_base + np.cumsum(ov) - ov,
+        np.where(tail_from_r2, r2_base + o2[index] + ov, o1[index] + start + L2),
+    ], axis=1).ravel()
+    segment_lengths = np.stack([start, ov, tail_len], axis=1).ravel()
+    gather = flat_index(starts, segment_lengths)
+    sequences = np.concatenate((s1, consensus, s2))[gather]
+    qualities = np.concatenate((q1, consensus_q, q2))[gather]
+
+    # Новая пачка: имена R1, затем все последовательности, затем все качества
+    name_lengths = r1.name_end[index] - r1.name_start[index]
+    names = r1.data[flat_index(r1.name_start[index], name_lengths)]
+    name_start = np.cumsum(name_lengths) - name_lengths
+    seq_start = len(names) + np.cumsum(lengths) - lengths
+    return FastqBatch(
+        data=np.concatenate((names, sequences, qualities)),
+        name_start=name_start,
+        name_end=name_start + name_lengths,
+        seq_start=seq_start,
+        qual_start=seq_start + len(sequences),
+        lengths=lengths,
+    )
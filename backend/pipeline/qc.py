@@ -0,0 +1,167 @@
+from typing import Optional
+import numpy as np
+from .fastq import FastqBatch, FastqFormatError, FastqStreamParser, window_sums, window_counts
+
+PHRED_OFFSET = 33
+
+# Вероятность ошибки для каждого символа качества Phred+33
+# (float32: таблица применяется ко всему буферу, суммирование идёт в float64)
+ERROR_PROBABILITY = np.zeros(256, dtype=np.float32)
+ERROR_PROBABILITY[PHRED_OFFSET:127] = 10.0 ** (-np.arange(127 - PHRED_OFFSET) / 10.0)
+# Те же значения в float64: суммы по окнам накапливаются в float64, и reduceat
+# без приведения типа на каждом элементе заметно быстрее
+_ERROR_PROBABILITY_64 = ERROR_PROBABILITY.astype(np.float64)
+
+PHRED_SCORE = np.zeros(256, dtype=np.float64)
+PHRED_SCORE[PHRED_OFFSET:127] = np.arange(127 - PHRED_OFFSET)
+
+# Сколько столбцов оставлять в гистограммах сводки
+LENGTH_BINS = 50
+POSITION_BINS = 500
+
+
+def expected_errors(batch: FastqBatch) -> np.ndarray:
+    """Ожидаемое число ошибок в каждом прочтении: сумма 10^(-Q/10)"""
+    # mode="wrap": индексы-байты всегда в таблице, проверка границ не нужна
+    probabilities = np.take(_ERROR_PROBABILITY_64, batch.data, mode="wrap")
+    return window_sums(probabilities, batch.qual_start, batch.lengths, dtype=np.float64)
+
+
+def n_counts(batch: FastqBatch) -> np.ndarray:
+    # N встречаются редко, поэтому позиции ищутся по всему буферу и считаются по окнам
+    positions = np.flatnonzero((batch.data & 0xDF) == ord("N"))
+    return window_counts(positions, batch.seq_start, batch.lengths)
+
+
+def _binned(values: np.ndarray, max_bins: int) -> tuple:
+    width = max(1, -(-len(values) // max_bins))
+    padded = np.zeros(-(-len(values) // width) * width, dtype=values.dtype)
+    padded[:len(values)] = values
+    return width, padded.reshape(-1, width)
+
+
+class QcAccumulator:
+    """
+    Статистика качества, накапливаемая по пачкам за один проход.
+    Аккумуляторы можно объединять через merge (для параллельной обработки).
+    """
+
+    def __init__(self, maxee: Optional[float] = None):
+        self.maxee = maxee
+        self.reads = 0
+        self.bases = 0
+        self.n_bases = 0
+        self.passing_maxee = 0
+        self.length_counts = np.zeros(0, dtype=np.int64)
+        self.position_quality_sum = np.zeros(0, dtype=np.float64)
+
+    def _grow(self, size: int):
+        if size > len(self.length_counts):
+            self.length_counts = np.pad(self.length_counts, (0, size - len(self.length_counts)))
+            self.position_quality_sum = np.pad(
+                self.position_quality_sum, (0, size - len(self.position_quality_sum))
+            )
+
+    def update(self, batch: FastqBatch):
+        if not len(batch):
+            return
+        lengths = batch.lengths
+        total = int(lengths.sum())
+        max_length = int(lengths.max())
+        self._grow(max_length + 1)
+
+        self.reads += len(batch)
+        self.bases += total
+        self.length_counts[:max_length + 1] += np.bincount(lengths, minlength=max_length + 1)
+
+        if total:
+            qualities = batch.qualities()
+            positions = np.arange(total, dtype=np.int64) - np.repeat(batch.offsets(), lengths)
+            self.position_quality_sum[:max_length] += np.bincount(
+                positions, weights=PHRED_SCORE[qualities], minlength=max_length
+            )
+            self.n_bases += int(n_counts(batch).sum())
+            if self.maxee is not None:
+                self.passing_maxee += int(np.count_nonzero(expected_errors(batch) <= self.maxee))
+        elif self.maxee is not None:
+            self.passing_maxee += len(batch)
+
+    def merge(self, other: "QcAccumulator"):
+        self._grow(len(other.length_counts))
+        self.reads += other.reads
+        self.bases += other.bases
+        self.n_bases += other.n_bases
+        self.passing_maxee += other.passing_maxee
+        self.length_counts[:len(other.length_counts)] += other.length_counts
+        self.position_quality_sum[:len(other.position_quality_sum)] += other.position_quality_sum
+
+    def summary(self) -> dict:
+        lengths = np.flatnonzero(self.length_counts)
+        if not self.reads:
+            return {"read_count": 0, "total_bases": 0}
+
+        max_length = int(lengths[-1])
+        # Число прочтений, покрывающих позицию p, = число прочтений длиннее p
+        coverage = np.cumsum(self.length_counts[::-1])[::-1][1:max_length + 1]
+
+        length_width, length_bins = _binned(self.length_counts[:max_length + 1], LENGTH_BINS)
+        position_width, quality_bins = _binned(self.position_quality_sum[:max_length], POSITION_BINS)
+        _, coverage_bins = _binned(coverage, POSITION_BINS)
+        quality_sums = quality_bins.sum(axis=1)
+        coverage_sums = coverage_bins.sum(axis=1)
+        mean_quality = np.divide(
+            quality_sums, coverage_sums,
+            out=np.zeros_like(quality_sums), where=coverage_sums > 0
+        )
+
+        summary = {
+            "read_count": self.reads,
+            "total_bases": self.bases,
+            "min_length": int(lengths[0]),
+            "max_length": max_length,
+            "mean_length": round(self.bases / self.reads, 2),
+            "length_histogram": {
+                "bin_width": length_width,
+                "counts": length_bins.sum(axis=1).tolist(),
+            },
+            "per_position_mean_quality": {
+                "bin_width": position_width,
+                "values": np.round(mean_quality, 2).tolist(),
+            },
+            "n_content": round(self.n_bases / self.bases, 6) if self.bases else 0.0,
+        }
+        if self.maxee is not None:
+            summary["maxee"] = self.maxee
+            summary["fraction_passing_maxee"] = round(self.passing_maxee / self.reads, 6)
+        return summary
+
+
+class FastqInspector:
+    """
+    Проверка формата и сбор QC-статистики по мере поступления байтов загрузки.
+    Ошибка формата поднимается сразу, на первом некорректном куске.
+    """
+
+    def __init__(self, maxee: Optional[float] = None):
+        self.parser = FastqStreamParser()
+        self.qc = QcAccumulator(maxee)
+
+    def feed(self, chunk: bytes):
+        for batch in self.parser.feed(chunk):
+            self.qc.update(batch)
+
+    def close(self) -> dict:
+        for batch in self.parser.close():
+            self.qc.update(batch)
+        if not self.qc.reads:
+            raise FastqFormatError("FASTQ file contains no reads")
+        summary = self.qc.summary()
+        summary["gzip"] = self.parser.is_gzip
+        return summary
+
+
+def validate_prefix(data: bytes):
+    """Проверяет начало файла (полные записи в нём) без требования полноты хвоста"""
+    parser = FastqStreamParser()
+    for _ in parser.feed(data):
+        pass
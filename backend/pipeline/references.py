@@ -0,0 +1,319 @@
+"""
+Индексы референсных баз для классификации.
+
+Индекс строится из FASTA (SILVA, GTDB SSU или любой локальный) и, если
+линии таксонов не записаны в заголовках, из таблицы таксономии
+(ID<TAB>линия, как taxonomy.tsv QIIME 2 или bac120_taxonomy.tsv GTDB).
+В индекс входят таблицы k-меров классификатора (classify.build_tables),
+отсортированные хэши референсных последовательностей (точные совпадения
+классифицируются без k-меров, ExactMatches) и дерево таксономии
+(GET /api/references/{name}/taxonomy).
+
+Раскладка на диске:
+    <root>/<name>/<version>/   — готовый индекс, version — хэш входных данных и параметров
+    <root>/<name>/CURRENT      — версия, которую используют задачи
+Повторная сборка с теми же входами ничего не пересчитывает, а задачи
+только открывают готовый индекс и никогда не строят его сами.
+
+    python -m backend.pipeline.references build silva_gtdb --fasta SILVA.fasta.gz
+    python -m backend.pipeline.references list
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+import numpy as np
+from .classify import DEFAULT_K, FORMAT_VERSION, META_FILE, build_tables
+from .fastq import GZIP_MAGIC
+
+CURRENT_FILE = "CURRENT"
+SOURCES_DIR = "sources"
+HASHES_FILE = "sequence_hashes.npy"
+HASH_TAXA_FILE = "sequence_taxa.npy"
+TREE_FILE = "taxonomy.json"
+_PARTIAL_SUFFIX = ".partial"
+
+
+def file_digest(path: Union[str, Path]) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def index_version(fasta_sha256: str, taxonomy_sha256: Optional[str], k: int, depth: Optional[int]) -> str:
+    """Версия индекса — хэш содержимого входных файлов, параметров и формата таблиц"""
+    key = json.dumps([FORMAT_VERSION, fasta_sha256, taxonomy_sha256, k, depth])
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def _open_text(path: Union[str, Path]):
+    with open(path, "rb") as f:
+        compressed = f.read(2) == GZIP_MAGIC
+    return gzip.open(path, "rt") if compressed else open(path)
+
+
+def read_fasta(path: Union[str, Path]) -> Iterator[Tuple[str, str, bytes]]:
+    """(ID, остаток заголовка, последовательность); РНК (U) приводится к ДНК"""
+    with _open_text(path) as f:
+        header, parts = None, []
+        for line in f:
+            line = line.rstrip("\r\n")
+            if line.startswith(">"):
+                if header is not None:
+                    yield header[0], header[1], "".join(parts).upper().replace("U", "T").encode()
+                fields = line[1:].split(None, 1)
+                header, parts = (fields[0] if fields else "", fields[1] if len(fields) > 1 else ""), []
+            elif header is not None:
+                parts.append(line.strip())
+        if header is not None:
+            yield header[0], header[1], "".join(parts).upper().replace("U", "T").encode()
+
+
+def read_taxonomy(path: Union[str, Path]) -> Dict[str, str]:
+    """Таблица ID -> линия; строка заголовка (Feature ID ...) пропускается"""
+    taxonomy = {}
+    with _open_text(path) as f:
+        for line in f:
+            fields = line.rstrip("\r\n").split("\t")
+            if len(fields) < 2 or fields[0].lower() in ("feature id", "featureid", "#otu id"):
+                continue
+            taxonomy[fields[0]] = fields[1]
+    return taxonomy
+
+
+def normalize_lineage(text: str, depth: Optional[int] = None) -> str:
+    """
+    Линия из заголовка или таблицы: без атрибутов GTDB в скобках ([location=...]),
+    без пустых рангов и пробелов по краям; depth оставляет только первые ранги
+    """
+    text = text.split(" [", 1)[0]
+    ranks = [rank.strip() for rank in text.split(";")]
+    ranks = [rank for rank in ranks if rank and not rank.endswith("__")]
+    return ";".join(ranks[:depth] if depth else ranks)
+
+
+def load_records(
+    fasta: Union[str, Path],
+    taxonomy: Optional[Union[str, Path]] = None,
+    depth: Optional[int] = None
+) -> Tuple[List[Tuple[bytes, str]], List[str], int]:
+    """Пары (последовательность, линия), ID в том же порядке и число пропущенных записей"""
+    lineages = read_taxonomy(taxonomy) if taxonomy else None
+    records, ids, skipped = [], [], 0
+    for record_id, description, sequence in read_fasta(fasta):
+        text = lineages.get(record_id) if lineages is not None else description
+        lineage = normalize_lineage(text, depth) if text else ""
+        if not lineage or not sequence:
+            skipped += 1
+            continue
+        records.append((sequence, lineage))
+        ids.append(record_id)
+    return records, ids, skipped
+
+
+def sequence_hash(sequence: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(sequence, digest_size=8).digest(), "little")
+
+
+def taxonomy_tree(lineages: List[str]) -> dict:
+    """Дерево таксонов с числом референсных последовательностей в каждом узле"""
+    root = {"name": "root", "count": 0, "children": {}}
+    for lineage, count in Counter(lineages).items():
+        node = root
+        node["count"] += count
+        for rank in lineage.split(";"):
+            node = node["children"].setdefault(rank, {"name": rank, "count": 0, "children": {}})
+            node["count"] += count
+
+    def to_list(node: dict) -> dict:
+        return {**node, "children": [to_list(child) for child in node["children"].values()]}
+
+    return to_list(root)
+
+
+def current_index(root: Union[str, Path], name: str) -> Optional[Path]:
+    """Каталог текущей версии индекса или None, если индекс не собран"""
+    current = Path(root) / name / CURRENT_FILE
+    if not current.exists():
+        return None
+    path = current.parent / current.read_text().strip()
+    return path if (path / META_FILE).exists() else None
+
+
+def _set_current(root: Path, name: str, version: str):
+    current = root / name / CURRENT_FILE
+    tmp = current.with_suffix(".tmp")
+    tmp.write_text(version)
+    os.replace(tmp, current)
+
+
+def build_index(
+    root: Union[str, Path],
+    name: str,
+    fasta: Union[str, Path],
+    taxonomy: Optional[Union[str, Path]] = None,
+    k: int = DEFAULT_K,
+    depth: Optional[int] = None,
+    force: bool = False
+) -> dict:
+    """
+    Собирает индекс name и делает его текущим. Если версия с тем же
+    содержимым входов уже собрана, она только становится текущей.
+    Сборка идёт во временный каталог, который переименовывается целиком,
+    так что задачи никогда не видят недостроенный индекс.
+    """
+    root = Path(root)
+    fasta_sha256 = file_digest(fasta)
+    taxonomy_sha256 = file_digest(taxonomy) if taxonomy else None
+    version = index_version(fasta_sha256, taxonomy_sha256, k, depth)
+    target = root / name / version
+    if (target / META_FILE).exists() and not force:
+        _set_current(root, name, version)
+        return json.loads((target / META_FILE).read_text())
+
+    partial = root / name / (version + _PARTIAL_SUFFIX)
+    shutil.rmtree(partial, ignore_errors=True)
+    partial.mkdir(parents=True)
+    try:
+        records, ids, skipped = load_records(fasta, taxonomy, depth)
+        if not records:
+            raise ValueError("Reference contains no sequences with taxonomy")
+        metadata = {
+            "name": name,
+            "version": version,
+            "fasta": Path(fasta).name,
+            "fasta_sha256": fasta_sha256,
+            "taxonomy": Path(taxonomy).name if taxonomy else None,
+            "taxonomy_sha256": taxonomy_sha256,
+            "depth": depth,
+            "skipped": skipped,
+        }
+        meta = build_tables(records, partial, k, metadata)
+
+        # Хэши последовательностей отсортированы для поиска точных совпадений (searchsorted),
+        # одинаковые — по таксону, чтобы неоднозначное совпадение определялось по краям диапазона
+        taxon_index = {taxon: i for i, taxon in enumerate(meta["taxa"])}
+        hashes = np.array([sequence_hash(sequence) for sequence, _ in records], dtype=np.uint64)
+        taxa = np.array([taxon_index[lineage] for _, lineage in records], dtype=np.int32)
+        order = np.lexsort((taxa, hashes))
+        np.save(partial / HASHES_FILE, hashes[order])
+        np.save(partial / HASH_TAXA_FILE, taxa[order])
+        (partial / TREE_FILE).write_text(json.dumps(taxonomy_tree([lineage for _, lineage in records])))
+
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(partial, target)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    _set_current(root, name, version)
+    return meta
+
+
+class ExactMatches:
+    """
+    Поиск референсов, совпадающих с запросом целиком, по отсортированным хэшам.
+    Таблицы открываются через mmap, как таблицы классификатора
+    """
+
+    def __init__(self, index_path: Union[str, Path]):
+        index_path = Path(index_path)
+        self.hashes = np.load(index_path / HASHES_FILE, mmap_mode="r")
+        self.taxa = np.load(index_path / HASH_TAXA_FILE, mmap_mode="r")
+
+    def lookup(self, sequences: List[bytes]) -> np.ndarray:
+        """
+        Номер таксона (как в таблицах классификатора) для каждой последовательности;
+        -1 — совпадения нет или совпавшие референсы относятся к разным таксонам
+        """
+        result = np.full(len(sequences), -1, dtype=np.int64)
+        if not len(self.hashes) or not sequences:
+            return result
+        query = np.array([sequence_hash(s.upper()) for s in sequences], dtype=np.uint64)
+        first = np.searchsorted(self.hashes, query, side="left")
+        last = np.searchsorted(self.hashes, query, side="right") - 1
+        found = last >= first
+        first, last = first[found], last[found]
+        unambiguous = self.taxa[first] == self.taxa[last]
+        result[np.flatnonzero(found)[unambiguous]] = self.taxa[first[unambiguous]]
+        return result
+
+
+@lru_cache(maxsize=8)
+def load_exact_matches(index_path: str) -> ExactMatches:
+    """Открывается один раз на процесс пула, как load_classifier"""
+    return ExactMatches(index_path)
+
+
+def read_taxonomy_tree(index_path: Union[str, Path]) -> dict:
+    return json.loads((Path(index_path) / TREE_FILE).read_text())
+
+
+def list_indexes(root: Union[str, Path]) -> List[dict]:
+    """Все собранные версии индексов с пометкой текущей"""
+    root = Path(root)
+    result = []
+    if not root.exists():
+        return result
+    for directory in sorted(p for p in root.iterdir() if p.is_dir()):
+        current = current_index(root, directory.name)
+        for version_dir in sorted(directory.iterdir()):
+            if version_dir.name.endswith(_PARTIAL_SUFFIX):
+                result.append({"name": directory.name, "version": version_dir.name[:-len(_PARTIAL_SUFFIX)],
+                               "status": "building", "current": False})
+                continue
+            meta_path = version_dir / META_FILE
+            if not meta_path.exists():
+                continue
+            meta = json.loads(meta_path.read_text())
+            result.append({
+                "name": directory.name,
+                "version": version_dir.name,
+                "status": "ready",
+                "current": current == version_dir,
+                "k": meta["k"],
+                "sequences": meta["sequences"],
+                "taxa": len(meta["taxa"]),
+                "fasta": meta.get("fasta"),
+                "taxonomy": meta.get("taxonomy"),
+                "built_at": version_dir.stat().st_mtime,
+            })
+    return result
+
+
+def main():
+    from ..config import REFERENCE_DIR
+
+    parser = argparse.ArgumentParser(description="Reference indexes for taxonomy classification")
+    parser.add_argument("--root", default=str(REFERENCE_DIR), help="index directory (REFERENCE_DIR)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build an index and make it current")
+    build.add_argument("name", help="index name, <ref_seq>_<ref_db> as used by analysis jobs (e.g. silva_gtdb)")
+    build.add_argument("--fasta", required=True, help="reference sequences, optionally gzipped")
+    build.add_argument("--taxonomy", help="ID<TAB>lineage table; without it lineages are read from FASTA headers")
+    build.add_argument("-k", type=int, default=DEFAULT_K, help="k-mer length")
+    build.add_argument("--depth", type=int, help="keep only the first N ranks of each lineage")
+    build.add_argument("--force", action="store_true", help="rebuild even if the inputs did not change")
+    commands.add_parser("list", help="list built indexes")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        meta = build_index(args.root, args.name, args.fasta, args.taxonomy, args.k, args.depth, args.force)
+        print(f"{args.name}@{meta['version']}: {meta['sequences']} sequences, {len(meta['taxa'])} taxa, "
+              f"{meta['skipped']} skipped")
+    else:
+        for index in list_indexes(args.root):
+            marker = "*" if index["current"] else " "
+            details = f"{index['sequences']} sequences, {index['taxa']} taxa" if index["status"] == "ready" else "building"
+            print(f"{marker} {index['name']}@{index['version']}  {details}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Выполнение задачи анализа в рабочих процессах.
+Модуль не зависит от БД и веб-приложения: процесс пула получает
+только пути и параметры и возвращает результаты.
+
+Входной файл делится на шарды (sharding.plan_shards), каждый шард
+обрабатывается отдельно (run_shard): адаптеры и праймеры обрезаются
+(adapters.AdapterTrimmer) перед фильтрацией в том же проходе. Затем результаты объединяются
+в порядке шардов (merge_shards) — вывод не зависит от числа шардов.
+Прошедшие фильтр прочтения дереплицируются (derep): каждый шард пишет
+свою таблицу по разделам, merge_shards объединяет их в uniques.fasta,
+и следующие этапы работают с уникальными последовательностями.
+Уникальные последовательности классифицируются диапазонами в процессах
+пула (classify_part) и собираются в taxonomy.tsv (merge_classification).
+Длинные прочтения Nanopore обрабатываются пачками с ограничением по числу
+оснований (batches.iter_base_batches), с учётом пиковой памяти на пачку.
+Парные прочтения сначала сливаются (paired.merge_pairs); такие задачи
+выполняются одним шардом, так как R1 и R2 нельзя делить по байтам.
+Этапы отмечены через metrics.stage: обработчик задач получает их время,
+память и объёмы, вызывая функции через metrics.metered.
+"""
+import json
+import os
+import shutil
+from contextlib import nullcontext
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+from .adapters import AdapterTrimmer, TrimParams, TrimStats
+from .bgzf import ensure_index, index_path
+from .batches import DEFAULT_MEMORY_SAMPLE, BatchMeter, BatchStats, iter_base_batches
+from .classify import Assignment, ClassifyParams, load_classifier
+from .classify_cache import CacheConfig, CacheStats, classify_cached
+from .derep import DEFAULT_MEMORY_BUDGET, UNIQUES_FILE, DerepStats, DerepTable, iter_uniques, merge_tables, record_offsets
+from .fastq import FastqBatch, iter_batches
+from .filtering import FilterParams, FilterStats, filter_batch, format_fastq
+from .metrics import stage, timed_iter
+from .paired import MergeParams, MergeStats, check_merge_rate, iter_interleaved, iter_pairs, merge_pairs
+from .qc import QcAccumulator
+from .references import load_exact_matches
+from .sharding import Shard, MIN_SHARD_BYTES, iter_shard_batches, plan_shards
+
+# Версия вывода конвейера: меняется, когда при тех же входах и параметрах
+# результат становится другим, и сохранённые результаты больше не переиспользуются
+PIPELINE_VERSION = 4
+SUMMARY_FILE = "summary.json"
+FILTERED_FILE = "filtered.fastq"
+SHARDS_DIR = "shards"
+TAXONOMY_FILE = "taxonomy.tsv"
+CLASSIFICATION_DIR = "classification"
+# Сколько уникальных последовательностей классифицировать за один вызов
+CLASSIFY_BATCH = 1024
+CLASSIFY_COUNTERS = (
+    "uniques", "reads", "unassigned_uniques", "unassigned_reads", "exact_matches",
+    "cache_lookups", "cache_hits", "cache_bytes_saved"
+)
+
+
+@dataclass
+class ShardResult:
+    shard: Shard
+    output_path: str
+    filtering: FilterStats
+    qc: QcAccumulator
+    merging: Optional[MergeStats] = None
+    derep_dir: Optional[str] = None
+    dereplication: Optional[DerepStats] = None
+    trimming: Optional[TrimStats] = None
+    batches: Optional[BatchStats] = None
+
+
+def shard_output_path(output_dir: Union[str, Path], shard: Shard) -> Path:
+    return Path(output_dir) / SHARDS_DIR / f"{shard.index:05d}.fastq"
+
+
+def shard_derep_dir(output_dir: Union[str, Path], shard: Shard) -> Path:
+    return Path(output_dir) / SHARDS_DIR / f"{shard.index:05d}.derep"
+
+
+def is_paired(parameters: dict) -> bool:
+    return parameters.get("sequencing_type") == "paired-end"
+
+
+def _read_batches(
+    input_path: Union[str, Path],
+    parameters: dict,
+    shard: Shard,
+    mate_path: Optional[Union[str, Path]],
+    merge_stats: Optional[MergeStats]
+) -> Iterator[FastqBatch]:
+    """Пачки прочтений шарда; для парных данных — уже слитые пары"""
+    if not is_paired(parameters):
+        yield from iter_shard_batches(input_path, shard)
+        return
+    if mate_path is not None:
+        pairs = iter_pairs(iter_batches(input_path, validate=False), iter_batches(mate_path, validate=False))
+    else:
+        pairs = iter_interleaved(iter_shard_batches(input_path, shard))
+    params = MergeParams.from_parameters(parameters)
+    stats = merge_stats if merge_stats is not None else MergeStats()
+    for r1, r2 in pairs:
+        yield merge_pairs(r1, r2, params, stats)
+    # Парные задачи идут одним шардом, так что здесь счётчики всего файла
+    check_merge_rate(stats, params)
+
+
+def prepare_input(input_path: Union[str, Path]) -> bool:
+    """
+    Индекс BGZF (bgzf.ensure_index) как часть этапа распаковки. gzip
+    перепаковывается в BGZF ещё при загрузке; обычный gzip, сохранённый
+    раньше, читается последовательно одним шардом.
+    """
+    with stage("decompress") as metrics:
+        indexed = ensure_index(input_path)
+        if indexed:
+            metrics.bytes_written += os.path.getsize(index_path(input_path))
+    return indexed
+
+
+def run_shard(
+    job_type: str,
+    input_path: Union[str, Path],
+    parameters: dict,
+    shard: Shard,
+    output_dir: Union[str, Path],
+    mate_path: Optional[Union[str, Path]] = None,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    batch_bases: Optional[int] = None,
+    memory_sample: int = DEFAULT_MEMORY_SAMPLE
+) -> ShardResult:
+    """
+    Обрезает адаптеры и фильтрует один шард в отдельный файл, собирает QC прошедших прочтений
+    и дереплицирует их в пределах memory_budget. С batch_bases пачки делятся
+    до этого числа оснований, а у каждой memory_sample-й измеряется пиковая память.
+    """
+    params = FilterParams.from_parameters(parameters)
+    trimmer = AdapterTrimmer(TrimParams.from_parameters(parameters))
+    trim_stats = TrimStats() if trimmer.enabled else None
+    stats = FilterStats()
+    qc = QcAccumulator(params.maxee)
+    merge_stats = MergeStats() if is_paired(parameters) else None
+    output_path = shard_output_path(output_dir, shard)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    derep = DerepTable(shard_derep_dir(output_dir, shard), memory_budget)
+
+    batches = timed_iter(_read_batches(input_path, parameters, shard, mate_path, merge_stats), "decompress")
+    meter = None
+    if batch_bases is not None:
+        batches = iter_base_batches(batches, batch_bases)
+        meter = BatchMeter(memory_sample)
+
+    with open(output_path, "wb") as out:
+        for batch in batches:
+            with meter.measure(batch) if meter else nullcontext():
+                # Обрезка концов, обрезка адаптеров и фильтры — за один проход по пачке
+                if trimmer.enabled:
+                    with stage("trim") as metrics:
+                        batch = trimmer.trim(batch, trim_stats)
+                        metrics.reads += len(batch)
+                with stage("filter") as metrics:
+                    passed = filter_batch(batch, params, stats)
+                    qc.update(passed)
+                    metrics.reads += len(batch)
+                with stage("dereplicate") as metrics:
+                    derep.add(passed)
+                    metrics.reads += len(passed)
+                with stage("write_results") as metrics:
+                    data = format_fastq(passed)
+                    out.write(data)
+                    metrics.bytes_written += len(data)
+                    metrics.reads += len(passed)
+    with stage("dereplicate"):
+        dereplication = derep.finish()
+    return ShardResult(
+        shard=shard,
+        output_path=str(output_path),
+        filtering=stats,
+        qc=qc,
+        merging=merge_stats,
+        derep_dir=str(derep.spill_dir),
+        dereplication=dereplication,
+        trimming=trim_stats,
+        batches=meter.stats if meter else None,
+    )
+
+
+def merge_shards(
+    job_type: str,
+    results: List[ShardResult],
+    output_dir: Union[str, Path],
+    memory_budget: int = DEFAULT_MEMORY_BUDGET
+) -> dict:
+    """
+    Склеивает выходы шардов по порядку их индексов, объединяет счётчики
+    и таблицы дерепликации. Все счётчики целочисленные, поэтому сумма
+    не зависит от разбиения.
+    """
+    output_dir = Path(output_dir)
+    results = sorted(results, key=lambda r: r.shard.index)
+    stats = FilterStats()
+    qc = QcAccumulator(results[0].qc.maxee if results else None)
+    merging = MergeStats() if results and results[0].merging is not None else None
+    trimming = TrimStats() if results and results[0].trimming is not None else None
+    batches = BatchStats() if results and results[0].batches is not None else None
+
+    # Результат пишется во временный файл, чтобы прерванная задача не оставила неполный вывод
+    filtered = output_dir / FILTERED_FILE
+    partial = output_dir / (FILTERED_FILE + ".part")
+    with stage("write_results") as metrics, open(partial, "wb") as out:
+        for result in results:
+            with open(result.output_path, "rb") as shard_file:
+                shutil.copyfileobj(shard_file, out, 1024 * 1024)
+            metrics.bytes_read += os.path.getsize(result.output_path)
+            stats.merge(result.filtering)
+            qc.merge(result.qc)
+            if merging is not None:
+                merging.merge(result.merging)
+            if trimming is not None:
+                trimming.merge(result.trimming)
+            if batches is not None:
+                batches.merge(result.batches)
+        metrics.bytes_written += out.tell()
+    os.replace(partial, filtered)
+
+    with stage("dereplicate") as metrics:
+        dereplication = merge_tables([r.derep_dir for r in results], output_dir / UNIQUES_FILE, memory_budget)
+        metrics.bytes_written += (output_dir / UNIQUES_FILE).stat().st_size
+    for result in results:
+        dereplication.merge(result.dereplication)
+    shutil.rmtree(output_dir / SHARDS_DIR, ignore_errors=True)
+
+    summary = {
+        "type": job_type,
+        "shards": len(results),
+        "filtering": stats.to_dict(),
+        "qc_filtered": qc.summary(),
+        "dereplication": dereplication.to_dict(),
+    }
+    if merging is not None:
+        summary["merging"] = merging.to_dict()
+    if trimming is not None:
+        summary["trimming"] = trimming.to_dict()
+    if batches is not None:
+        summary["batches"] = batches.to_dict()
+    (output_dir / SUMMARY_FILE).write_text(json.dumps(summary, indent=2))
+    return summary
+
+
+def classification_parts(output_dir: Union[str, Path], parts: int) -> List[Tuple[int, int, int]]:
+    """
+    Диапазоны номеров уникальных последовательностей для параллельной
+    классификации: (start, end, байтовое смещение записи start в uniques.fasta),
+    чтобы каждая часть читала файл со своего места, а не с начала
+    """
+    output_dir = Path(output_dir)
+    summary = json.loads((output_dir / SUMMARY_FILE).read_text())
+    uniques = summary["dereplication"]["uniques"]
+    parts = max(1, min(parts, -(-uniques // CLASSIFY_BATCH)))
+    bounds = [uniques * i // parts for i in range(parts + 1)]
+    ranges = [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+    offsets = record_offsets(output_dir / UNIQUES_FILE, [start for start, _ in ranges])
+    return [(start, end, offset) for (start, end), offset in zip(ranges, offsets)]
+
+
+def exact_assignment(taxa: List[str], taxon: int) -> Assignment:
+    lineage = taxa[taxon].split(";")
+    return Assignment(lineage, [1.0] * len(lineage), taxon)
+
+
+def classify_part(
+    output_dir: Union[str, Path],
+    reference_path: Union[str, Path],
+    parameters: dict,
+    start: int,
+    end: int,
+    offset: int,
+    cache: Optional[CacheConfig] = None
+) -> dict:
+    """
+    Классифицирует уникальные последовательности [start, end) в отдельный файл;
+    offset — байтовое смещение записи start (classification_parts).
+    Последовательность, целиком совпадающая с референсами одного таксона,
+    получает его линию с достоверностью 1 без оценки по k-мерам; с cache
+    уже классифицированные в других задачах берутся из кэша
+    """
+    output_dir = Path(output_dir)
+    classifier = load_classifier(str(reference_path))
+    exact = load_exact_matches(str(reference_path))
+    params = ClassifyParams.from_parameters(parameters)
+    part_path = output_dir / CLASSIFICATION_DIR / f"{start:010d}.tsv"
+    part_path.parent.mkdir(parents=True, exist_ok=True)
+    counts = dict.fromkeys(CLASSIFY_COUNTERS, 0)
+    cache_stats = CacheStats()
+
+    records = islice(iter_uniques(output_dir / UNIQUES_FILE, offset), end - start)
+    # Прочтения этапа классификации — уникальные последовательности
+    with stage("classify") as metrics, open(part_path, "w") as out:
+        while True:
+            batch = list(islice(records, CLASSIFY_BATCH))
+            if not batch:
+                break
+            sequences = [sequence for _, _, sequence in batch]
+            assignments = [exact_assignment(classifier.taxa, taxon) if taxon >= 0 else None
+                           for taxon in exact.lookup(sequences).tolist()]
+            rest = [i for i, assignment in enumerate(assignments) if assignment is None]
+            counts["exact_matches"] += len(batch) - len(rest)
+            classified = classify_cached(classifier, [sequences[i] for i in rest], params, cache, cache_stats)
+            for i, assignment in zip(rest, classified):
+                assignments[i] = assignment
+            for (name, size, _), assignment in zip(batch, assignments):
+                taxon, confidence = assignment.taxon(params.min_confidence)
+                out.write(f"{name.decode()}\t{taxon}\t{confidence:.4f}\n")
+                counts["uniques"] += 1
+                counts["reads"] += size
+                if taxon == "Unassigned":
+                    counts["unassigned_uniques"] += 1
+                    counts["unassigned_reads"] += size
+            metrics.reads += len(batch)
+        metrics.bytes_written += out.tell()
+    counts["cache_lookups"] = cache_stats.lookups
+    counts["cache_hits"] = cache_stats.hits
+    counts["cache_bytes_saved"] = cache_stats.bytes_saved
+    return counts
+
+
+def merge_classification(output_dir: Union[str, Path], parts: List[dict], details: dict) -> dict:
+    """
+    Склеивает части классификации по порядку в taxonomy.tsv (формат QIIME 2:
+    Feature ID, Taxon, Confidence) и дописывает итоги в summary.json.
+    Если классификация не выполнялась, причина передаётся в details["skipped"].
+    """
+    output_dir = Path(output_dir)
+    classification = dict(details)
+    part_files = sorted((output_dir / CLASSIFICATION_DIR).glob("*.tsv"))
+    if "skipped" not in details:
+        partial = output_dir / (TAXONOMY_FILE + ".part")
+        with stage("write_results") as metrics, open(partial, "w") as out:
+            out.write("Feature ID\tTaxon\tConfidence\n")
+            for part_file in part_files:
+                with open(part_file) as f:
+                    shutil.copyfileobj(f, out, 1024 * 1024)
+                metrics.bytes_read += part_file.stat().st_size
+            metrics.bytes_written += out.tell()
+        os.replace(partial, output_dir / TAXONOMY_FILE)
+        for key in CLASSIFY_COUNTERS:
+            classification[key] = sum(part[key] for part in parts)
+        lookups = classification["cache_lookups"]
+        classification["cache_hit_rate"] = round(classification["cache_hits"] / lookups, 4) if lookups else 0.0
+    shutil.rmtree(output_dir / CLASSIFICATION_DIR, ignore_errors=True)
+
+    summary_path = output_dir / SUMMARY_FILE
+    summary = json.loads(summary_path.read_text())
+    summary["classification"] = classification
+    summary_path.write_text(json.dumps(summary, indent=2))
+    return summary
+
+
+def run_analysis(
+    job_type: str,
+    input_path: Union[str, Path],
+    parameters: dict,
+    output_dir: Union[str, Path],
+    shard_count: int = 1,
+    min_shard_bytes: int = MIN_SHARD_BYTES,
+    mate_path: Optional[Union[str, Path]] = None,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    reference_path: Optional[Union[str, Path]] = None,
+    batch_bases: Optional[int] = None,
+    memory_sample: int = DEFAULT_MEMORY_SAMPLE
+) -> dict:
+    """Последовательное выполнение всех этапов в текущем процессе"""
+    if is_paired(parameters):
+        shard_count = 1
+    shards = plan_shards(input_path, shard_count, min_shard_bytes)
+    results = [
+        run_shard(job_type, input_path, parameters, shard, output_dir, mate_path, memory_budget, batch_bases,
+                  memory_sample)
+        for shard in shards
+    ]
+    summary = merge_shards(job_type, results, output_dir, memory_budget)
+    if reference_path is None:
+        return summary
+    parts = [
+        classify_part(output_dir, reference_path, parameters, start, end, offset)
+        for start, end, offset in classification_parts(output_dir, 1)
+    ]
+    return merge_classification(output_dir, parts, {"reference": str(reference_path)})
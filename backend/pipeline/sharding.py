@@ -0,0 +1,178 @@
+"""
+Разбиение одного FASTQ-файла на диапазоны байтов по границам записей
+для параллельной обработки. Границы ищутся только рядом с точками
+деления (mmap.find или окно распакованного BGZF), весь файл заранее
+не сканируется.
+"""
+import mmap
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Union
+from .bgzf import BgzfReader, is_bgzf
+from .fastq import GZIP_MAGIC, DEFAULT_BATCH_BYTES, FastqBatch, FastqStreamParser, iter_batches, parse_records
+
+# Файлы меньше этого размера на шарды не делятся
+MIN_SHARD_BYTES = 32 * 1024 * 1024
+
+
+@dataclass
+class Shard:
+    index: int
+    start: int
+    end: int
+    compression: Optional[str] = None  # None, "gzip" или "bgzf"; start/end — в несжатых байтах
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start
+
+
+def _line_end(buf, start: int, size: int) -> int:
+    end = buf.find(b"\n", start)
+    return size if end < 0 or end > size else end
+
+
+def _line_length(buf, start: int, end: int) -> int:
+    return end - start - (end > start and buf[end - 1:end] == b"\r")
+
+
+def _is_record_start(buf, start: int, size: int, at_eof: bool = True) -> Optional[bool]:
+    """
+    Проверяет, что с позиции start начинается запись: '@' заголовок,
+    последовательность, '+', качество той же длины и затем '@' или конец файла.
+    Строка качества тоже может начинаться с '@', но после неё идёт
+    заголовок и последовательность, а не строка '+', так что она отсеивается.
+    Если буфер — окно в середине данных (at_eof=False) и для решения
+    не хватило байтов, возвращает None.
+    """
+    if buf[start:start + 1] != b"@":
+        return False
+    header_end = _line_end(buf, start, size)
+    seq_start = header_end + 1
+    seq_end = _line_end(buf, seq_start, size)
+    plus_start = seq_end + 1
+    if plus_start >= size:
+        return False if at_eof else None
+    if buf[plus_start:plus_start + 1] != b"+":
+        return False
+    qual_start = _line_end(buf, plus_start, size) + 1
+    qual_end = _line_end(buf, qual_start, size)
+    next_start = qual_end + 1
+    if next_start >= size and not at_eof:
+        return None
+    if _line_length(buf, seq_start, seq_end) != _line_length(buf, qual_start, qual_end):
+        return False
+    return next_start >= size or buf[next_start:next_start + 1] == b"@"
+
+
+def find_record_start(buf, position: int, size: int, at_eof: bool = True) -> int:
+    """
+    Первое начало записи не раньше position (size, если записей дальше нет).
+    buf — mmap или bytes; для окна в середине данных (at_eof=False) возвращает -1,
+    если окна не хватило.
+    """
+    if position <= 0:
+        return 0
+    # Ищем с position - 1, чтобы не пропустить запись, начинающуюся ровно в position
+    newline = buf.find(b"\n", position - 1)
+    while 0 <= newline < size - 1:
+        start = newline + 1
+        found = _is_record_start(buf, start, size, at_eof)
+        if found is None:
+            return -1
+        if found:
+            return start
+        newline = buf.find(b"\n", start)
+    return size if at_eof else -1
+
+
+def _find_in_bgzf(reader: BgzfReader, position: int, window: int = 256 * 1024) -> int:
+    """Граница записи в несжатых данных BGZF: распаковывается только окно около position"""
+    if position <= 0:
+        return 0
+    base = position - 1
+    while True:
+        end = min(reader.size, base + window)
+        buf = reader.read(base, end - base)
+        found = find_record_start(buf, 1, len(buf), at_eof=end == reader.size)
+        if found >= 0:
+            return base + found
+        window *= 2
+
+
+def _split(bounds: List[int], compression: Optional[str] = None) -> List[Shard]:
+    ranges = [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+    return [Shard(i, start, end, compression) for i, (start, end) in enumerate(ranges)]
+
+
+def plan_shards(path: Union[str, Path], shard_count: int, min_shard_bytes: int = MIN_SHARD_BYTES) -> List[Shard]:
+    """
+    Делит файл примерно на shard_count равных по размеру диапазонов.
+    Для BGZF диапазоны задаются в несжатых координатах и начинаются
+    с блоков, так что шард распаковывает только свои блоки.
+    Обычный gzip распаковывается последовательно и остаётся одним шардом.
+    """
+    size = Path(path).stat().st_size
+    with open(path, "rb") as f:
+        gzip = f.read(2) == GZIP_MAGIC
+
+    if gzip:
+        if not is_bgzf(path):
+            return [Shard(0, 0, size, "gzip")]
+        with BgzfReader(path) as reader:
+            shard_count = max(1, min(shard_count, reader.size // max(min_shard_bytes, 1)))
+            bounds = [0]
+            for i in range(1, shard_count):
+                position = reader.block_start(reader.block_count * i // shard_count)
+                bounds.append(max(bounds[-1], _find_in_bgzf(reader, position)))
+            bounds.append(reader.size)
+        return _split(bounds, "bgzf")
+
+    shard_count = max(1, min(shard_count, size // max(min_shard_bytes, 1)))
+    if shard_count == 1:
+        return [Shard(0, 0, size)]
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        bounds = [0]
+        for i in range(1, shard_count):
+            bounds.append(max(bounds[-1], find_record_start(mm, size * i // shard_count, size)))
+        bounds.append(size)
+    return _split(bounds)
+
+
+def iter_shard_batches(
+    path: Union[str, Path],
+    shard: Shard,
+    batch_bytes: int = DEFAULT_BATCH_BYTES,
+    validate: bool = False
+) -> Iterator[FastqBatch]:
+    """Пачки записей из диапазона файла: несжатый читается через mmap, BGZF — по индексу"""
+    if shard.compression == "gzip":
+        yield from iter_batches(path, batch_bytes, validate)
+        return
+    if shard.compression == "bgzf":
+        parser = FastqStreamParser(validate)
+        with BgzfReader(path) as reader:
+            for chunk in reader.iter_range(shard.start, shard.end):
+                yield from parser.feed(chunk)
+        yield from parser.close()
+        return
+    if shard.size <= 0:
+        return
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        position = shard.start
+        step = batch_bytes
+        while position < shard.end:
+            end = min(position + step, shard.end)
+            final = end == shard.end
+            # Срез mmap копирует байты, поэтому пачки не держат отображение открытым
+            batch, consumed = parse_records(mm[position:end], final=final, validate=validate)
+            if not consumed:
+                if final:
+                    break
+                # Запись длиннее пачки (длинные прочтения Nanopore) — расширяем окно
+                step *= 2
+                continue
+            position += consumed
+            step = batch_bytes
+            yield batch
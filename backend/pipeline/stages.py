@@ -0,0 +1,162 @@
+"""
+Кэш этапов конвейера.
+
+Задача выполняется двумя этапами: filtering (обрезка, фильтрация и
+дерепликация за один проход по прочтениям, merge_shards) и classification
+(merge_classification). Ключ этапа — хэш ключа предыдущего этапа (у первого —
+типа задачи и хэшей входных файлов) и только тех параметров, от которых
+этап зависит. Смена классификатора или референса не меняет ключ filtering,
+и повторный запуск начинается сразу с классификации.
+
+Выходные файлы этапа сохраняются в <root>/<stage>/<key>/ жёсткими ссылками
+(копией, если каталоги на разных файловых системах) вместе со stage.json —
+списком файлов и частью summary.json, которую записал этап. Записи сверх
+лимита удаляются, начиная с давно не использованных.
+"""
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+from .classify import ClassifyParams
+from .derep import UNIQUES_FILE
+from .runner import FILTERED_FILE, PIPELINE_VERSION, SUMMARY_FILE, TAXONOMY_FILE
+
+STAGES = ("filtering", "classification")
+STAGE_META_FILE = "stage.json"
+# Файлы, которые оставляет каждый этап в каталоге результатов
+STAGE_FILES = {
+    "filtering": (FILTERED_FILE, UNIQUES_FILE),
+    "classification": (TAXONOMY_FILE,),
+}
+# Параметры, которые не меняют результат анализа
+DESCRIPTIVE_PARAMETERS = frozenset({"additional_email", "analysis_name", "original_filename", "original_filename_r2"})
+# Параметры, от которых зависит только классификация
+CLASSIFICATION_PARAMETERS = frozenset({
+    "classifier", "reference_sequences", "reference_db", *ClassifyParams.__dataclass_fields__
+})
+_PARTIAL_SUFFIX = ".partial"
+
+
+def canonical_parameters(parameters: dict) -> str:
+    """JSON параметров с сортировкой ключей; пустые значения равны отсутствующим"""
+    relevant = {
+        key: value for key, value in parameters.items()
+        if key not in DESCRIPTIVE_PARAMETERS and value is not None
+    }
+    return json.dumps(relevant, sort_keys=True, separators=(",", ":"))
+
+
+def _digest(material: list) -> str:
+    return hashlib.sha256(json.dumps(material).encode()).hexdigest()
+
+
+def stage_keys(
+    job_type: str,
+    input_hash: str,
+    input_hash_r2: Optional[str],
+    parameters: dict,
+    reference: Optional[str]
+) -> Dict[str, str]:
+    """
+    Ключи этапов по порядку. reference — имя и версия индекса референса
+    (None, если классификация не выполняется).
+    """
+    filtering = {k: v for k, v in parameters.items() if k not in CLASSIFICATION_PARAMETERS}
+    classification = {k: v for k, v in parameters.items() if k in CLASSIFICATION_PARAMETERS}
+    keys = {"filtering": _digest([PIPELINE_VERSION, job_type, input_hash, input_hash_r2,
+                                  canonical_parameters(filtering)])}
+    keys["classification"] = _digest([keys["filtering"], canonical_parameters(classification), reference])
+    return keys
+
+
+def _link(source: Path, target: Path):
+    target.unlink(missing_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def _entry_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.iterdir())
+
+
+class StageStore:
+    """Сохранённые выходы этапов; процессы и экземпляры приложения могут делить один каталог"""
+
+    def __init__(self, root: Union[str, Path], max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def _path(self, stage: str, key: str) -> Path:
+        return self.root / stage / key
+
+    def restore(self, stage: str, key: str, output_dir: Union[str, Path]) -> bool:
+        """
+        Переносит выход этапа в каталог результатов и дописывает его часть
+        summary.json. False — этапа с таким ключом нет (или его удалили
+        одновременно с чтением), и этап нужно выполнить.
+        """
+        path, output_dir = self._path(stage, key), Path(output_dir)
+        try:
+            meta = json.loads((path / STAGE_META_FILE).read_text())
+            output_dir.mkdir(parents=True, exist_ok=True)
+            for name in meta["files"]:
+                _link(path / name, output_dir / name)
+            # Время изменения stage.json — время последнего использования для вытеснения
+            os.utime(path / STAGE_META_FILE)
+        except (OSError, ValueError):
+            return False
+        summary_path = output_dir / SUMMARY_FILE
+        summary = json.loads(summary_path.read_text()) if summary_path.exists() else {}
+        summary.update(meta["summary"])
+        summary_path.write_text(json.dumps(summary, indent=2))
+        return True
+
+    def save(self, stage: str, key: str, output_dir: Union[str, Path], summary_keys: Optional[Iterable[str]] = None):
+        """Сохраняет выход этапа из каталога результатов; summary_keys=None — вся summary.json"""
+        path, output_dir = self._path(stage, key), Path(output_dir)
+        if (path / STAGE_META_FILE).exists():
+            return
+        summary = json.loads((output_dir / SUMMARY_FILE).read_text())
+        if summary_keys is not None:
+            summary = {name: summary[name] for name in summary_keys}
+        files = [name for name in STAGE_FILES[stage] if (output_dir / name).exists()]
+
+        partial = path.with_name(key + _PARTIAL_SUFFIX + f".{os.getpid()}")
+        shutil.rmtree(partial, ignore_errors=True)
+        partial.mkdir(parents=True)
+        try:
+            for name in files:
+                _link(output_dir / name, partial / name)
+            (partial / STAGE_META_FILE).write_text(json.dumps({"files": files, "summary": summary}))
+            os.replace(partial, path)
+        except OSError:
+            # Тот же этап уже сохранил другой процесс
+            shutil.rmtree(partial, ignore_errors=True)
+        self.evict()
+
+    def entries(self) -> List[Path]:
+        if not self.root.exists():
+            return []
+        return [
+            entry for stage_dir in self.root.iterdir() if stage_dir.is_dir()
+            for entry in stage_dir.iterdir() if (entry / STAGE_META_FILE).exists()
+        ]
+
+    def evict(self):
+        """Удаляет давно не использованные записи, пока общий размер больше лимита"""
+        sized = []
+        for entry in self.entries():
+            try:
+                sized.append(((entry / STAGE_META_FILE).stat().st_mtime, _entry_size(entry), entry))
+            except OSError:
+                continue
+        total = sum(size for _, size, _ in sized)
+        for _, size, entry in sorted(sized):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
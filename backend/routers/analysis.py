@@ -1,15 +1,34 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form, Query, Request, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from pathlib import Path
+import asyncio
+import base64
+import time
 import uuid
 import json
 from typing import Annotated, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from ..models.analysis import AnalysisResponse
-from ..models.db_models import AnalysisJob
+from ..models.db_models import AnalysisJob, JobStageMetric
 from ..dependencies import get_current_user
 from ..models.user import UserInDB
-from ..services.database import get_db
+from ..services.database import get_async_db
+from ..services.uploads import save_upload, UploadStats
+from ..services.upload_sessions import complete_session, finalize_session
+from ..services import blob_store
+from ..services.job_runner import job_runner, stage_metric_row
+from ..services.job_events import job_event, job_events
+from ..services.job_results import find_completed, result_key, reuse_result
+from ..pipeline.adapters import AdapterTrimmer, TrimParams
+from ..pipeline.bgzf import index_path, needs_reencode, reencode
+from ..pipeline.fastq import FastqFormatError
+from ..pipeline.metrics import STAGE_ORDER, StageMetrics
+from ..pipeline.qc import FastqInspector
+from ..config import (
+    BGZF_COMPRESSION_LEVEL, BGZF_THREADS, JOB_EVENTS_KEEPALIVE, JOB_EVENTS_STREAM_SECONDS, UPLOADS_DIR
+)
 
 router = APIRouter(
     prefix="/api/analysis",
@@ -17,8 +36,88 @@ router = APIRouter(
 )
 
 # Configuration paths
-UPLOADS_DIR = Path(__file__).parent.parent.parent / "uploads"
-UPLOADS_DIR.mkdir(exist_ok=True)
+UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+
+async def _receive_input(
+    job_id: str,
+    fastq_file: Optional[UploadFile],
+    upload_id: Optional[str],
+    maxee: Optional[float],
+    current_user: UserInDB,
+    db: AsyncSession,
+    incoming: list[Path]
+) -> tuple[Path, str, UploadStats]:
+    """
+    Saves the direct upload into a temporary incoming file (added to
+    incoming for the endpoint to remove if the request is rejected) or
+    checks that a chunked upload session is complete, validating the FASTQ
+    and collecting QC statistics in the same pass. The file is moved into
+    the blob store by _store_input once the whole request is validated.
+    Upload session bookkeeping is shared with the synchronous routers,
+    so it runs on the async session through run_sync
+    """
+    inspector = FastqInspector(maxee)
+    if upload_id:
+        tmp_path, filename, upload_stats = await db.run_sync(finalize_session, upload_id, current_user.id)
+        # Chunks arrive out of order, so the file is hashed and inspected once assembled;
+        # an invalid file stays in its open session and can be fixed by re-sending chunks
+        upload_stats.sha256 = await asyncio.to_thread(blob_store.hash_file, tmp_path, inspector.feed)
+        upload_stats.qc_summary = await asyncio.to_thread(inspector.close)
+    elif fastq_file is not None:
+        tmp_path = blob_store.incoming_path(job_id)
+        incoming.append(tmp_path)
+        filename = fastq_file.filename
+        # Save uploaded file (streamed in fixed-size chunks, hashed and validated on the fly)
+        upload_stats = await save_upload(fastq_file, tmp_path, inspector)
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Either fastq_file or upload_id is required"
+        )
+
+    return tmp_path, filename, upload_stats
+
+async def _store_input(
+    tmp_path: Path,
+    upload_stats: UploadStats,
+    upload_id: Optional[str],
+    current_user: UserInDB,
+    db: AsyncSession,
+    incoming: list[Path]
+) -> Path:
+    """
+    Adds a validated upload to the content-addressed blob store and
+    completes its upload session. Called last before the commit: a request
+    rejected earlier leaves no orphaned blob and no session without its file.
+    Plain gzip is re-encoded into BGZF with its .gzi index here, once per
+    new blob, so workers never rewrite files in the store; the blob keeps
+    the sha256 of the uploaded bytes. The file itself is moved by
+    blob_store.finish once the job is committed
+    """
+    stored_path = tmp_path
+    if not await db.run_sync(blob_store.contains, upload_stats.sha256) and \
+            await asyncio.to_thread(needs_reencode, tmp_path):
+        stored_path = blob_store.incoming_path(f"{tmp_path.stem}.bgzf")
+        incoming.extend([stored_path, index_path(stored_path)])
+        await asyncio.to_thread(reencode, tmp_path, stored_path, BGZF_COMPRESSION_LEVEL, BGZF_THREADS)
+        if upload_id:
+            # The session keeps its original file until the job is committed
+            await db.run_sync(blob_store.remove_after_commit, tmp_path)
+    file_path = await db.run_sync(
+        blob_store.store_file, stored_path, upload_stats.sha256, upload_stats.bytes_written
+    )
+    if upload_id:
+        await db.run_sync(complete_session, upload_id, current_user.id, file_path)
+    return file_path
+
+def _upload_metric(stats: UploadStats, reads: int) -> JobStageMetric:
+    """Загрузка как первый этап задачи; процессорное время и память запроса не выделить"""
+    row = stage_metric_row(StageMetrics(
+        "upload", wall_seconds=stats.seconds, bytes_read=stats.bytes_written,
+        bytes_written=stats.bytes_written, reads=reads
+    ))
+    row.cpu_seconds = row.peak_rss_bytes = None
+    return row
 
 @router.post(
     "/illumina",
@@ -44,9 +143,17 @@ UPLOADS_DIR.mkdir(exist_ok=True)
     }
 )
 async def analyze_illumina(
-    fastq_file: Annotated[UploadFile, File(description="FASTQ file for analysis")],
+    fastq_file: Annotated[Optional[UploadFile], File(description="FASTQ file for analysis")] = None,
+    upload_id: Optional[str] = Form(None),
+    fastq_file_r2: Annotated[Optional[UploadFile], File(description="R2 FASTQ file for paired-end data")] = None,
+    upload_id_r2: Optional[str] = Form(None),
+    interleaved: bool = Form(False),
     sequencing_type: str = Form("single-end"),
     adapter: str = Form("default"),
+    adapter_sequence: Optional[str] = Form(None),
+    adapter_error_rate: float = Form(0.1),
+    primer_forward: Optional[str] = Form(None),
+    primer_reverse: Optional[str] = Form(None),
     min_quality: int = Form(20),
     max_ambiguous: int = Form(2),
     minlen: int = Form(150),
@@ -58,13 +165,16 @@ async def analyze_illumina(
     additional_email: Optional[str] = Form(None),
     analysis_name: Optional[str] = Form(None),
     current_user: UserInDB = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Process Illumina sequencing data with the following steps:
     1. Validate user authentication
-    2. Save uploaded FASTQ file
-    3. Create analysis job record
+    2. Save uploaded FASTQ file (or finalize chunked upload session),
+       validating it and collecting QC statistics in a single pass.
+       Paired-end data is either an R1/R2 pair of files or one interleaved file
+    3. Create analysis job record; an identical earlier analysis
+       (same input content and parameters) completes it immediately
     4. Return job information
     """
 
@@ -74,20 +184,72 @@ async def analyze_illumina(
             detail="Authentication required"
         )
 
+    paired = sequencing_type == "paired-end"
+    if fastq_file_r2 is not None and not fastq_file_r2.filename:
+        # Browsers send an empty part for an unused file input
+        fastq_file_r2 = None
+    has_r2 = fastq_file_r2 is not None or bool(upload_id_r2)
+    if has_r2 and (not paired or interleaved):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="R2 file is only accepted for non-interleaved paired-end data"
+        )
+    if paired and not has_r2 and not interleaved:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Paired-end analysis requires an R2 file or an interleaved file"
+        )
+    # Browsers send empty strings for unused text inputs
+    adapter_sequence = (adapter_sequence or "").strip() or None
+    primer_forward = (primer_forward or "").strip() or None
+    primer_reverse = (primer_reverse or "").strip() or None
+    try:
+        AdapterTrimmer(TrimParams(adapter, adapter_sequence, primer_forward, primer_reverse, adapter_error_rate))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    incoming = []
     try:
         # Generate job ID
         job_id = str(uuid.uuid4())
-        file_path = UPLOADS_DIR / f"{job_id}_{fastq_file.filename}"
+        tmp_path, filename, upload_stats = await _receive_input(
+            job_id, fastq_file, upload_id, maxee, current_user, db, incoming
+        )
+        file_path_r2, filename_r2, upload_stats_r2 = None, None, None
+        qc_summary = upload_stats.qc_summary
+        # Size and throughput cover both files of a pair
+        total_stats = UploadStats(upload_stats.bytes_written, upload_stats.seconds)
+
+        if has_r2:
+            tmp_path_r2, filename_r2, upload_stats_r2 = await _receive_input(
+                f"{job_id}_r2", fastq_file_r2, upload_id_r2, maxee, current_user, db, incoming
+            )
+            if upload_stats_r2.qc_summary["read_count"] != upload_stats.qc_summary["read_count"]:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="R1 and R2 files contain different numbers of reads"
+                )
+            qc_summary = {"r1": upload_stats.qc_summary, "r2": upload_stats_r2.qc_summary}
+            total_stats.bytes_written += upload_stats_r2.bytes_written
+            total_stats.seconds += upload_stats_r2.seconds
+        elif paired and upload_stats.qc_summary["read_count"] % 2:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Interleaved file contains an odd number of reads"
+            )
 
-        # Save uploaded file
-        with open(file_path, "wb") as buffer:
-            content = await fastq_file.read()
-            buffer.write(content)
+        file_path = await _store_input(tmp_path, upload_stats, upload_id, current_user, db, incoming)
+        if has_r2:
+            file_path_r2 = await _store_input(tmp_path_r2, upload_stats_r2, upload_id_r2, current_user, db, incoming)
 
         # Prepare parameters as JSON
         params = {
             "sequencing_type": sequencing_type,
             "adapter": adapter,
+            "adapter_sequence": adapter_sequence,
+            "adapter_error_rate": adapter_error_rate,
+            "primer_forward": primer_forward,
+            "primer_reverse": primer_reverse,
             "min_quality": min_quality,
             "max_ambiguous": max_ambiguous,
             "minlen": minlen,
@@ -98,7 +260,9 @@ async def analyze_illumina(
             "reference_db": ref_db,
             "additional_email": additional_email,
             "analysis_name": analysis_name,
-            "original_filename": fastq_file.filename
+            "original_filename": filename,
+            "interleaved": paired and interleaved,
+            "original_filename_r2": filename_r2
         }
 
         # Create database record with REAL user ID
@@ -107,13 +271,36 @@ async def analyze_illumina(
             user_id=current_user.id,  # Используем реальный ID пользователя
             type="illumina",
             file_path=str(file_path),
+            input_hash=upload_stats.sha256,
+            file_path_r2=str(file_path_r2) if file_path_r2 else None,
+            input_hash_r2=upload_stats_r2.sha256 if upload_stats_r2 else None,
+            file_size=total_stats.bytes_written,
+            upload_throughput=total_stats.throughput_mbps,
+            qc_summary=json.dumps(qc_summary),
             parameters=json.dumps(params),
-            status="pending"
+            analysis_name=analysis_name,
+            result_key=await asyncio.to_thread(
+                result_key, "illumina", upload_stats.sha256, upload_stats_r2.sha256 if upload_stats_r2 else None, params
+            ),
+            status="pending",
+            stage_metrics=[_upload_metric(total_stats, upload_stats.qc_summary["read_count"] * (2 if has_r2 else 1))]
         )
+        # The same input with the same parameters was already analyzed: reuse its results
+        previous = await db.run_sync(find_completed, db_job.result_key)
+        if previous is not None:
+            reuse_result(db_job, previous)
         
         db.add(db_job)
-        db.commit()
-        db.refresh(db_job)
+        await db.commit()
+        await asyncio.to_thread(blob_store.finish, db.sync_session, True)
+        job_events.publish(current_user.id, job_event(job_id, db_job.status, reused_from=db_job.reused_job_id))
+        if previous is not None:
+            return AnalysisResponse(
+                job_id=job_id,
+                status="completed",
+                message="Identical analysis already completed, results reused"
+            )
+        job_runner.notify()
 
         return AnalysisResponse(
             job_id=job_id,
@@ -121,12 +308,27 @@ async def analyze_illumina(
             message="Illumina data processing started"
         )
 
+    except HTTPException:
+        await db.rollback()
+        raise
+    except FastqFormatError as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid FASTQ file: {str(e)}"
+        )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Analysis failed: {str(e)}"
         )
+    finally:
+        # Blob store changes of a rolled back request are undone; files moved into
+        # the store are gone from incoming, the rest belong to a rejected request
+        await asyncio.to_thread(blob_store.finish, db.sync_session, False)
+        for path in incoming:
+            path.unlink(missing_ok=True)
 
 @router.post(
     "/nanopore",
@@ -152,7 +354,8 @@ async def analyze_illumina(
     }
 )
 async def analyze_nanopore(
-    fastq_file: Annotated[UploadFile, File(description="FASTQ file for analysis")],
+    fastq_file: Annotated[Optional[UploadFile], File(description="FASTQ file for analysis")] = None,
+    upload_id: Optional[str] = Form(None),
     trim_first_bases: int = Form(80),
     trim_after_base: int = Form(700),
     min_quality: Optional[int] = Form(None),
@@ -166,13 +369,15 @@ async def analyze_nanopore(
     additional_email: Optional[str] = Form(None),
     analysis_name: Optional[str] = Form(None),
     current_user: UserInDB = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Process Nanopore sequencing data with the following steps:
     1. Validate user authentication
-    2. Save uploaded FASTQ file
-    3. Create analysis job record
+    2. Save uploaded FASTQ file (or finalize chunked upload session),
+       validating it and collecting QC statistics in a single pass
+    3. Create analysis job record; an identical earlier analysis
+       (same input content and parameters) completes it immediately
     4. Return job information
     """
     if not current_user:
@@ -181,13 +386,13 @@ async def analyze_nanopore(
             detail="Authentication required"
         )
 
+    incoming = []
     try:
         job_id = str(uuid.uuid4())
-        file_path = UPLOADS_DIR / f"{job_id}_{fastq_file.filename}"
-
-        with open(file_path, "wb") as buffer:
-            content = await fastq_file.read()
-            buffer.write(content)
+        tmp_path, filename, upload_stats = await _receive_input(
+            job_id, fastq_file, upload_id, maxee, current_user, db, incoming
+        )
+        file_path = await _store_input(tmp_path, upload_stats, upload_id, current_user, db, incoming)
 
         # Prepare parameters as JSON
         params = {
@@ -203,7 +408,7 @@ async def analyze_nanopore(
             "reference_db": ref_db,
             "additional_email": additional_email,
             "analysis_name": analysis_name,
-            "original_filename": fastq_file.filename
+            "original_filename": filename
         }
 
         # Используем реальный ID пользователя
@@ -212,13 +417,32 @@ async def analyze_nanopore(
             user_id=current_user.id,  # Используем реальный ID пользователя
             type="nanopore",
             file_path=str(file_path),
+            input_hash=upload_stats.sha256,
+            file_size=upload_stats.bytes_written,
+            upload_throughput=upload_stats.throughput_mbps,
+            qc_summary=json.dumps(upload_stats.qc_summary),
             parameters=json.dumps(params),
-            status="pending"
+            analysis_name=analysis_name,
+            result_key=await asyncio.to_thread(result_key, "nanopore", upload_stats.sha256, None, params),
+            status="pending",
+            stage_metrics=[_upload_metric(upload_stats, upload_stats.qc_summary["read_count"])]
         )
+        # The same input with the same parameters was already analyzed: reuse its results
+        previous = await db.run_sync(find_completed, db_job.result_key)
+        if previous is not None:
+            reuse_result(db_job, previous)
         
         db.add(db_job)
-        db.commit()
-        db.refresh(db_job)
+        await db.commit()
+        await asyncio.to_thread(blob_store.finish, db.sync_session, True)
+        job_events.publish(current_user.id, job_event(job_id, db_job.status, reused_from=db_job.reused_job_id))
+        if previous is not None:
+            return AnalysisResponse(
+                job_id=job_id,
+                status="completed",
+                message="Identical analysis already completed, results reused"
+            )
+        job_runner.notify()
 
         return AnalysisResponse(
             job_id=job_id,
@@ -226,22 +450,62 @@ async def analyze_nanopore(
             message="Nanopore data processing started"
         )
 
+    except HTTPException:
+        await db.rollback()
+        raise
+    except FastqFormatError as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid FASTQ file: {str(e)}"
+        )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Analysis failed: {str(e)}"
         )
+    finally:
+        # Blob store changes of a rolled back request are undone; files moved into
+        # the store are gone from incoming, the rest belong to a rejected request
+        await asyncio.to_thread(blob_store.finish, db.sync_session, False)
+        for path in incoming:
+            path.unlink(missing_ok=True)
 
 # Дополнительные эндпоинты для работы с задачами анализа
+JOBS_PAGE_SIZE = 50
+JOBS_PAGE_MAX = 200
+
+def _encode_cursor(job: AnalysisJob) -> str:
+    """
+    Позиция последней задачи страницы — её id. id растёт в порядке постановки
+    задач и, в отличие от created_at (в SQLite — строка с точностью до секунды),
+    сравнивается в БД однозначно
+    """
+    return base64.urlsafe_b64encode(str(job.id).encode()).decode()
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
 @router.get(
     "/jobs",
     summary="Get user's analysis jobs",
-    description="Returns list of analysis jobs for the current user"
+    description="Returns a page of the current user's analysis jobs, newest first; "
+                "pass next_cursor back as cursor to get the next page"
 )
 async def get_user_jobs(
+    limit: int = Query(JOBS_PAGE_SIZE, ge=1, le=JOBS_PAGE_MAX),
+    cursor: Optional[str] = Query(None),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    type_filter: Optional[str] = Query(None, alias="type"),
     current_user: UserInDB = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if not current_user:
         raise HTTPException(
@@ -249,9 +513,20 @@ async def get_user_jobs(
             detail="Authentication required"
         )
     
-    jobs = db.query(AnalysisJob).filter(
-        AnalysisJob.user_id == current_user.id
-    ).order_by(AnalysisJob.created_at.desc()).all()
+    # Keyset-пагинация по индексу (user_id, id): страница
+    # читается с позиции курсора, без OFFSET и подсчёта всех задач
+    query = select(AnalysisJob).where(AnalysisJob.user_id == current_user.id)
+    if status_filter:
+        query = query.where(AnalysisJob.status == status_filter)
+    if type_filter:
+        query = query.where(AnalysisJob.type == type_filter)
+    if cursor:
+        query = query.where(AnalysisJob.id < _decode_cursor(cursor))
+    result = await db.execute(
+        query.order_by(AnalysisJob.id.desc()).limit(limit + 1)
+    )
+    jobs = result.scalars().all()
+    page = jobs[:limit]
     
     return {
         "jobs": [
@@ -261,12 +536,69 @@ async def get_user_jobs(
                 "status": job.status,
                 "created_at": job.created_at.isoformat() if job.created_at else None,
                 "completed_at": job.completed_at.isoformat() if job.completed_at else None,
-                "analysis_name": json.loads(job.parameters).get('analysis_name') if job.parameters else None
+                "analysis_name": job.analysis_name
             }
-            for job in jobs
-        ]
+            for job in page
+        ],
+        "next_cursor": _encode_cursor(page[-1]) if len(jobs) > limit else None
     }
 
+def _sse(event: dict) -> str:
+    return f"event: job\ndata: {json.dumps(event)}\n\n"
+
+@router.get(
+    "/events",
+    summary="Stream analysis job events",
+    description="Server-sent events with status changes and stage progress "
+                "(stage, progress, reads_processed, eta_seconds) of the current user's jobs"
+)
+async def stream_job_events(
+    request: Request,
+    current_user: UserInDB = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required"
+        )
+
+    # Незавершённые задачи на момент подключения: в том числе выполняемые другими процессами
+    result = await db.execute(
+        select(AnalysisJob.job_id, AnalysisJob.status).where(
+            AnalysisJob.user_id == current_user.id,
+            AnalysisJob.status.in_(("pending", "running"))
+        )
+    )
+    snapshot = {job_id: job_event(job_id, job_status) for job_id, job_status in result.all()}
+    # Поток открыт долго: соединение с БД возвращается в пул до начала передачи
+    await db.close()
+    snapshot.update({event["job_id"]: event for event in job_events.latest(current_user.id)})
+
+    async def stream():
+        deadline = time.monotonic() + JOB_EVENTS_STREAM_SECONDS
+        async with job_events.subscribe(current_user.id) as queue:
+            # retry: через сколько миллисекунд браузер переподключится после конца потока
+            yield "retry: 1000\n\n"
+            for event in snapshot.values():
+                yield _sse(event)
+            while not await request.is_disconnected():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(queue.get(), min(JOB_EVENTS_KEEPALIVE, remaining))
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse(event)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get(
     "/jobs/{job_id}",
     summary="Get analysis job details",
@@ -275,7 +607,7 @@ async def get_user_jobs(
 async def get_job_details(
     job_id: str,
     current_user: UserInDB = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if not current_user:
         raise HTTPException(
@@ -283,10 +615,13 @@ async def get_job_details(
             detail="Authentication required"
         )
     
-    job = db.query(AnalysisJob).filter(
-        AnalysisJob.job_id == job_id,
-        AnalysisJob.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(AnalysisJob).where(
+            AnalysisJob.job_id == job_id,
+            AnalysisJob.user_id == current_user.id
+        )
+    )
+    job = result.scalars().first()
     
     if not job:
         raise HTTPException(
@@ -294,12 +629,98 @@ async def get_job_details(
             detail="Job not found"
         )
     
+    result = await db.execute(select(JobStageMetric).where(JobStageMetric.analysis_job_id == job.id))
+    stage_metrics = sorted(result.scalars().all(), key=lambda m: STAGE_ORDER.index(m.stage))
+    
     return {
         "job_id": job.job_id,
         "type": job.type,
         "status": job.status,
         "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
         "completed_at": job.completed_at.isoformat() if job.completed_at else None,
+        "error": job.error_message,
         "parameters": json.loads(job.parameters) if job.parameters else {},
+        "file_size": job.file_size,
+        "upload_throughput_mbps": job.upload_throughput,
+        "qc": json.loads(job.qc_summary) if job.qc_summary else None,
+        "classification_cache": {
+            "hit_rate": job.cache_hit_rate,
+            "bytes_saved": job.cache_bytes_saved
+        },
+        "reused_from": job.reused_job_id,
+        "stages": json.loads(job.stages) if job.stages else None,
+        "stage_metrics": [
+            {
+                "stage": m.stage,
+                "wall_seconds": m.wall_seconds,
+                "cpu_seconds": m.cpu_seconds,
+                "peak_rss_bytes": m.peak_rss_bytes,
+                "bytes_read": m.bytes_read,
+                "bytes_written": m.bytes_written,
+                "reads": m.reads,
+                "reads_per_second": m.reads_per_second
+            }
+            for m in stage_metrics
+        ],
         "result_path": job.result_path
-    }
\ No newline at end of file
+    }
+
+def _delete_job(db: Session, job: AnalysisJob):
+    """
+    Releases the job's input blobs and deletes the job. Runs through run_sync:
+    reference counting is shared with the synchronous services and the
+    cascade to stage metrics loads them lazily
+    """
+    for sha256 in (job.input_hash, job.input_hash_r2):
+        if sha256:
+            blob_store.release(db, sha256)
+    db.delete(job)
+
+@router.delete(
+    "/jobs/{job_id}",
+    summary="Delete analysis job",
+    description="Deletes the job and releases its input file; the file is removed once no job uses it"
+)
+async def delete_job(
+    job_id: str,
+    current_user: UserInDB = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required"
+        )
+
+    job = (await db.execute(select(AnalysisJob).filter(
+        AnalysisJob.job_id == job_id,
+        AnalysisJob.user_id == current_user.id
+    ))).scalar_one_or_none()
+
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+
+    if job.status == "running":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Job is running"
+        )
+
+    try:
+        await db.run_sync(_delete_job, job)
+        await db.commit()
+        # Blob files are removed only after the commit, outside the event loop
+        await asyncio.to_thread(blob_store.finish, db.sync_session, True)
+    except Exception as e:
+        await db.rollback()
+        await asyncio.to_thread(blob_store.finish, db.sync_session, False)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Delete failed: {str(e)}"
+        )
+
+    return {"job_id": job_id, "status": "deleted"}
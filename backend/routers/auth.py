@@ -3,19 +3,23 @@ from fastapi.responses import RedirectResponse, HTMLResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.security import OAuth2PasswordRequestForm
 from pathlib import Path
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..models.user import UserCreate, UserInDB
 from ..services.auth import (
     register_user, 
     authenticate_user,
     oauth2_scheme,
-    add_to_blacklist
+    add_to_blacklist,
+    set_user_disabled
 )
 from ..services.jwt import create_access_token
-from ..services.database import get_db
+from ..services.database import get_async_db
 from fastapi import status
 from ..dependencies import get_current_user
 from ..models.db_models import User as DBUser
+from ..services.password import hasher
+from ..config import ADMIN_USERNAMES
 
 router = APIRouter()
 BASE_DIR = Path(__file__).parent.parent.parent
@@ -64,9 +68,9 @@ async def register_page(request: Request):
 )
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = authenticate_user(form_data.username, form_data.password, db)
+    user = await authenticate_user(form_data.username, form_data.password, db)
     access_token = create_access_token(data={"sub": user.username})
     
     response = RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
@@ -89,14 +93,14 @@ async def login(
 )
 async def register(
     user_data: UserCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        return register_user(user_data, db)
+        return await register_user(user_data, db)
     except HTTPException as e:
         raise e
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
 
 @router.get(
@@ -156,7 +160,7 @@ async def logout(
     if token:
         if token.startswith("Bearer "):
             token = token[7:]
-        add_to_blacklist(token)
+        await add_to_blacklist(token)
     
     response.delete_cookie("access_token")
     return response
@@ -168,7 +172,7 @@ async def logout(
     description="Возвращает статистику по пользователям (только для админов)"
 )
 async def get_user_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserInDB = Depends(get_current_user)
 ):
     if not current_user:
@@ -178,11 +182,54 @@ async def get_user_stats(
         )
     
     # Простая статистика
-    total_users = db.query(DBUser).count()
-    active_users = db.query(DBUser).filter(DBUser.disabled == False).count()
+    total_users = await db.scalar(select(func.count()).select_from(DBUser))
+    active_users = await db.scalar(select(func.count()).select_from(DBUser).where(DBUser.disabled == False))
     
     return {
         "total_users": total_users,
         "active_users": active_users,
-        "disabled_users": total_users - active_users
-    }
\ No newline at end of file
+        "disabled_users": total_users - active_users,
+        "password_hashing": hasher.metrics()
+    }
+
+def _require_admin(current_user: UserInDB):
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated"
+        )
+    if current_user.username not in ADMIN_USERNAMES:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administrator access required"
+        )
+
+@router.post(
+    "/api/auth/users/{username}/disable",
+    tags=["Auth"],
+    summary="Отключение пользователя",
+    description="Запрещает вход; уже выданные токены пользователя перестают приниматься (только для админов)"
+)
+async def disable_user(
+    username: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    _require_admin(current_user)
+    await set_user_disabled(username, True, db)
+    return {"username": username, "disabled": True}
+
+@router.post(
+    "/api/auth/users/{username}/enable",
+    tags=["Auth"],
+    summary="Включение пользователя",
+    description="Снова разрешает вход отключённому пользователю (только для админов)"
+)
+async def enable_user(
+    username: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    _require_admin(current_user)
+    await set_user_disabled(username, False, db)
+    return {"username": username, "disabled": False}
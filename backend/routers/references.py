@@ -0,0 +1,83 @@
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+from typing import Optional
+import asyncio
+from ..config import ADMIN_USERNAMES, REFERENCE_DIR
+from ..dependencies import get_current_user
+from ..models.user import UserInDB
+from ..pipeline.references import current_index, list_indexes, read_taxonomy_tree
+from ..services import references
+
+router = APIRouter(
+    prefix="/api/references",
+    tags=["References"],
+)
+
+def _require_user(current_user: UserInDB):
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required"
+        )
+
+def _require_admin(current_user: UserInDB):
+    _require_user(current_user)
+    if current_user.username not in ADMIN_USERNAMES:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administrator access required"
+        )
+
+@router.get(
+    "",
+    summary="List reference indexes",
+    description="Built reference index versions; analysis jobs use the current version of <ref_seq>_<ref_db>"
+)
+async def get_references(current_user: UserInDB = Depends(get_current_user)):
+    _require_user(current_user)
+    return await asyncio.to_thread(list_indexes, REFERENCE_DIR)
+
+@router.get(
+    "/{name}/taxonomy",
+    summary="Reference taxonomy tree",
+    description="Taxa of the current version of the index with the number of reference sequences in each node"
+)
+async def get_reference_taxonomy(name: str, current_user: UserInDB = Depends(get_current_user)):
+    _require_user(current_user)
+    references.check_name(name)
+    path = current_index(REFERENCE_DIR, name)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Reference '{name}' is not installed"
+        )
+    return await asyncio.to_thread(read_taxonomy_tree, path)
+
+@router.post(
+    "/{name}/build",
+    summary="Build reference index",
+    description="Uploads reference FASTA (and optional ID<TAB>lineage taxonomy) and builds a versioned index. "
+                "Inputs identical to an existing version only switch the current version; "
+                "otherwise the build runs in the background (202)."
+)
+async def build_reference(
+    name: str,
+    fasta: UploadFile = File(...),
+    taxonomy: Optional[UploadFile] = File(None),
+    k: int = Form(8),
+    depth: Optional[int] = Form(None),
+    force: bool = Form(False),
+    current_user: UserInDB = Depends(get_current_user)
+):
+    _require_admin(current_user)
+    references.check_name(name)
+    if not 4 <= k <= 12:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="k must be between 4 and 12"
+        )
+    fasta_path = await references.store_source(name, fasta)
+    taxonomy_path = await references.store_source(name, taxonomy) if taxonomy and taxonomy.filename else None
+    result = await references.start_build(name, fasta_path, taxonomy_path, k, depth, force)
+    code = status.HTTP_202_ACCEPTED if result["status"] == "building" else status.HTTP_200_OK
+    return JSONResponse(status_code=code, content=result)
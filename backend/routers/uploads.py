@@ -0,0 +1,104 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.upload import UploadSessionCreate, UploadSessionStatus
+from ..models.db_models import UploadSession
+from ..dependencies import get_current_user
+from ..models.user import UserInDB
+from ..services.database import get_async_db
+from ..services import upload_sessions
+
+# Сессии загрузки ведутся синхронными функциями services/upload_sessions, общими с
+# эндпоинтами анализа; здесь они выполняются через run_sync асинхронной сессии,
+# чтобы запросы к БД при параллельной отправке чанков не блокировали event loop
+router = APIRouter(
+    prefix="/api/analysis/uploads",
+    tags=["Analysis"],
+)
+
+def _require_user(current_user: UserInDB):
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required"
+        )
+
+async def _session_status(db: AsyncSession, session: UploadSession) -> UploadSessionStatus:
+    missing = await db.run_sync(upload_sessions.missing_chunks, session) if session.status == "open" else []
+    return UploadSessionStatus(
+        upload_id=session.upload_id,
+        filename=session.filename,
+        size=session.total_size,
+        chunk_size=session.chunk_size,
+        total_chunks=session.total_chunks,
+        status=session.status,
+        missing_chunks=missing
+    )
+
+@router.post(
+    "",
+    response_model=UploadSessionStatus,
+    summary="Create upload session",
+    description="Starts a resumable chunked upload. Chunks may be sent in parallel and in any order; "
+                "pass the returned upload_id to /api/analysis/illumina or /nanopore to finalize."
+)
+async def create_upload_session(
+    data: UploadSessionCreate,
+    current_user: UserInDB = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    _require_user(current_user)
+    session = await db.run_sync(
+        upload_sessions.create_session, current_user.id, data.filename, data.size, data.chunk_size
+    )
+    return await _session_status(db, session)
+
+@router.get(
+    "/{upload_id}",
+    response_model=UploadSessionStatus,
+    summary="Get upload session status",
+    description="Returns the list of chunks that still have to be uploaded"
+)
+async def get_upload_session(
+    upload_id: str,
+    current_user: UserInDB = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    _require_user(current_user)
+    session = await db.run_sync(upload_sessions.get_session, upload_id, current_user.id)
+    return await _session_status(db, session)
+
+@router.put(
+    "/{upload_id}/chunks/{chunk_index}",
+    summary="Upload chunk",
+    description="Raw request body with the bytes of chunk number chunk_index"
+)
+async def put_upload_chunk(
+    upload_id: str,
+    chunk_index: int,
+    request: Request,
+    current_user: UserInDB = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    _require_user(current_user)
+    session = await db.run_sync(upload_sessions.get_session, upload_id, current_user.id)
+    content_length = request.headers.get("content-length")
+    received = await upload_sessions.write_chunk(
+        db, session, chunk_index, request.stream(),
+        int(content_length) if content_length and content_length.isdigit() else None
+    )
+    return {"upload_id": upload_id, "chunk_index": chunk_index, "received": received}
+
+@router.delete(
+    "/{upload_id}",
+    summary="Abort upload session",
+    description="Deletes the upload session and its partially uploaded data"
+)
+async def delete_upload_session(
+    upload_id: str,
+    current_user: UserInDB = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    _require_user(current_user)
+    session = await db.run_sync(upload_sessions.get_session, upload_id, current_user.id)
+    await db.run_sync(upload_sessions.abort_session, session)
+    return {"upload_id": upload_id, "status": "deleted"}
@@ -2,12 +2,16 @@ from datetime import datetime, timezone, timedelta
 from fastapi import HTTPException, status, Depends, Request
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from ..models.user import UserCreate, UserInDB, TokenData
-from ..services.database import get_db
+from ..services.database import get_async_db
 from ..models.db_models import User as DBUser
 from ..services.jwt import decode_token
-from ..services.password import verify_password, get_password_hash
+from ..services.password import verify_password_async, get_password_hash_async
+from ..services.principal_cache import principal_cache
+from ..services.revocation import revocations
 from ..config import ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY, ALGORITHM
 from typing import Optional
 import re
@@ -15,40 +19,33 @@ from pprint import pprint
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
 
-# Хранилище для черного списка токенов
-TOKEN_BLACKLIST = {}
-
-def add_to_blacklist(token: str):
-    """Добавляет токен в черный список с временем экспирации из самого токена"""
+async def add_to_blacklist(token: str):
+    """Отзывает токен до истечения его срока действия (поле exp самого токена)"""
+    principal_cache.invalidate_token(token)
     try:
         # Декодируем токен без проверки подписи, чтобы получить expiration
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_signature": False})
         exp_timestamp = payload.get("exp")
-        if exp_timestamp:
-            expire_time = datetime.fromtimestamp(exp_timestamp, timezone.utc)
-            TOKEN_BLACKLIST[token] = expire_time
-        else:
-            # Если нет exp, используем стандартное время
-            expires_in = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-            TOKEN_BLACKLIST[token] = datetime.now(timezone.utc) + expires_in
     except JWTError:
-        # Если токен невалидный, всё равно добавляем в чёрный список
+        # Если токен невалидный, всё равно отзываем его на стандартное время
+        exp_timestamp = None
+    if not exp_timestamp:
         expires_in = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        TOKEN_BLACKLIST[token] = datetime.now(timezone.utc) + expires_in
+        exp_timestamp = (datetime.now(timezone.utc) + expires_in).timestamp()
+    await revocations.revoke(token, float(exp_timestamp))
 
-async def clean_blacklist():
-    """Очищает истекшие токены из черного списка"""
-    now = datetime.now(timezone.utc)
-    global TOKEN_BLACKLIST
-    TOKEN_BLACKLIST = {k: v for k, v in TOKEN_BLACKLIST.items() if v > now}
+async def _find_user(db: AsyncSession, username: str) -> Optional[DBUser]:
+    result = await db.execute(select(DBUser).where(DBUser.username == username))
+    return result.scalars().first()
 
-def authenticate_user(username: str, password: str, db: Session) -> UserInDB:
+async def authenticate_user(username: str, password: str, db: AsyncSession) -> UserInDB:
     """
-    Аутентификация пользователя через PostgreSQL
+    Аутентификация пользователя через PostgreSQL; bcrypt выполняется
+    в пуле потоков, не останавливая остальные запросы
     """
-    user = db.query(DBUser).filter(DBUser.username == username).first()
+    user = await _find_user(db, username)
     
-    if not user or not verify_password(password, user.hashed_password):
+    if not user or not await verify_password_async(password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password",
@@ -74,15 +71,16 @@ def authenticate_user(username: str, password: str, db: Session) -> UserInDB:
         registration_date=user.registration_date.isoformat() if user.registration_date else None
     )
 
-def register_user(user_data: UserCreate, db: Session) -> UserInDB:
+async def register_user(user_data: UserCreate, db: AsyncSession) -> UserInDB:
     """
     Регистрация нового пользователя в PostgreSQL
     """
     # Проверяем существующего пользователя
-    existing_user = db.query(DBUser).filter(
+    result = await db.execute(select(DBUser).where(
         (DBUser.username == user_data.username) | 
         (DBUser.email == user_data.email)
-    ).first()
+    ))
+    existing_user = result.scalars().first()
     
     if existing_user:
         raise HTTPException(
@@ -90,7 +88,7 @@ def register_user(user_data: UserCreate, db: Session) -> UserInDB:
             detail="Username or email already registered"
         )
     
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     
     # Создаем нового пользователя в БД
     db_user = DBUser(
@@ -104,8 +102,9 @@ def register_user(user_data: UserCreate, db: Session) -> UserInDB:
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    # id и значения по умолчанию (registration_date, disabled) заполняет БД
+    await db.refresh(db_user)
     
     return UserInDB(
         id=db_user.id,
@@ -122,13 +121,11 @@ def register_user(user_data: UserCreate, db: Session) -> UserInDB:
 async def get_current_user(
     request: Request,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> Optional[UserInDB]:
     """
     Получение текущего пользователя из JWT токена через PostgreSQL
     """
-    await clean_blacklist()
-    
     # Получаем токен из куки, если не передан в заголовке
     if token is None:
         token = request.cookies.get("access_token")
@@ -145,10 +142,15 @@ async def get_current_user(
             print(f"DEBUG: Normalized token: {token[:10]}...")
 
             # Проверка черного списка
-            if token in TOKEN_BLACKLIST:
+            if await revocations.is_revoked(token):
                 print("DEBUG: Token is blacklisted")
                 return None
-                
+
+            # Уже проверенный токен: без разбора JWT и запроса к БД
+            cached = principal_cache.get(token)
+            if cached is not None:
+                return cached
+
             # Декодирование JWT
             payload = decode_token(token)
             username = payload.get("sub")
@@ -157,7 +159,7 @@ async def get_current_user(
                 return None
                 
             # Поиск пользователя в PostgreSQL
-            user = db.query(DBUser).filter(DBUser.username == username).first()
+            user = await _find_user(db, username)
             if not user:
                 print(f"DEBUG: User {username} not found in database")
                 return None
@@ -167,8 +169,8 @@ async def get_current_user(
                 return None
                 
             print(f"DEBUG: Authenticated user: {username}")
-            
-            return UserInDB(
+
+            principal = UserInDB(
                 id=user.id,
                 username=user.username,
                 email=user.email,
@@ -179,7 +181,9 @@ async def get_current_user(
                 disabled=user.disabled,
                 registration_date=user.registration_date.isoformat() if user.registration_date else None
             )
-            
+            principal_cache.put(token, principal, payload.get("exp"))
+            return principal
+
     except JWTError as e:
         print(f"DEBUG: JWT Error: {str(e)}")
     except Exception as e:
@@ -187,6 +191,21 @@ async def get_current_user(
     
     return None
 
+async def set_user_disabled(username: str, disabled: bool, db: AsyncSession):
+    """
+    Отключает или включает пользователя; токены отключённого сразу
+    перестают приниматься этим процессом (кэш сбрасывается)
+    """
+    user = await _find_user(db, username)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    user.disabled = disabled
+    await db.commit()
+    principal_cache.invalidate_user(username)
+
 # Функция для тестирования (может быть удалена после перехода на реальную БД)
 def get_test_user(db: Session) -> Optional[UserInDB]:
     """
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import uuid
+from functools import partial
+from pathlib import Path
+from typing import Callable, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from ..config import UPLOADS_DIR
+from ..models.db_models import Blob
+from ..pipeline.bgzf import index_path
+
+BLOBS_DIR = UPLOADS_DIR / "blobs"
+INCOMING_DIR = UPLOADS_DIR / "incoming"
+
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def blob_path(sha256: str) -> Path:
+    return BLOBS_DIR / sha256[:2] / sha256
+
+
+def incoming_path(name: str) -> Path:
+    """Временный файл для загрузки, ещё не перенесённой в хранилище"""
+    INCOMING_DIR.mkdir(parents=True, exist_ok=True)
+    return INCOMING_DIR / f"{name}.part"
+
+
+def hash_file(path: Path, consumer: Optional[Callable[[bytes], None]] = None) -> str:
+    """
+    sha256 файла блоками (для загрузок, собранных из чанков не по порядку).
+    consumer получает те же блоки, чтобы другие проверки шли в том же проходе.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+            if consumer is not None:
+                consumer(block)
+    return digest.hexdigest()
+
+
+# Изменения файлов, отложенные до конца транзакции (finish): список действий после коммита и после отката
+_ON_COMMIT = "blob_store_on_commit"
+_ON_ROLLBACK = "blob_store_on_rollback"
+
+
+def _defer(db: Session, when: str, action: Callable[[], None]):
+    db.info.setdefault(when, []).append(action)
+
+
+def finish(db: Session, committed: bool):
+    """
+    Применяет изменения файлов, отложенные store_file и release, после
+    коммита транзакции или отменяет их после отката. Пока транзакция не
+    завершена, файлы хранилища не меняются: неудачный коммит не оставляет
+    blob без строки, строку без файла или сессию загрузки без её файла.
+    Повторный вызов ничего не делает.
+    """
+    actions = db.info.pop(_ON_COMMIT, [])
+    undo = db.info.pop(_ON_ROLLBACK, [])
+    if not committed:
+        actions = list(reversed(undo))
+    for action in actions:
+        try:
+            action()
+        except OSError as e:
+            print(f"Не удалось обновить файл хранилища: {e}")
+
+
+def _acquire_existing(db: Session, sha256: str) -> bool:
+    updated = db.query(Blob).filter(Blob.sha256 == sha256).update(
+        {Blob.ref_count: Blob.ref_count + 1},
+        synchronize_session=False
+    )
+    return updated > 0
+
+
+def contains(db: Session, sha256: str) -> bool:
+    return db.query(Blob.sha256).filter(Blob.sha256 == sha256).first() is not None
+
+
+def remove_after_commit(db: Session, path: Path):
+    """Удаляет файл, когда транзакция закоммичена (finish); после отката файл остаётся"""
+    _defer(db, _ON_COMMIT, partial(path.unlink, missing_ok=True))
+
+
+def _publish(tmp_path: Path, path: Path):
+    """
+    Переносит загрузку и её индекс BGZF (если есть) в хранилище; если такой
+    файл там уже есть, загрузка не нужна. Индекс переносится после файла:
+    рядом с файлом не бывает индекса от другого содержимого.
+    """
+    if path.exists():
+        tmp_path.unlink(missing_ok=True)
+        index_path(tmp_path).unlink(missing_ok=True)
+        return
+    # Файла нет: новый blob или файл был удалён с диска вручную — старый индекс к нему не относится
+    path.parent.mkdir(parents=True, exist_ok=True)
+    index_path(path).unlink(missing_ok=True)
+    os.replace(tmp_path, path)
+    if index_path(tmp_path).exists():
+        os.replace(index_path(tmp_path), index_path(path))
+
+
+def store_file(db: Session, tmp_path: Path, sha256: str, size: int) -> Path:
+    """
+    Добавляет ссылку на blob с содержимым загруженного файла и возвращает
+    путь к нему в content-addressed хранилище. Файл переносится туда после
+    коммита (finish); если такой blob уже есть, временный файл удаляется и
+    повторная загрузка не занимает места на диске.
+    Ключ и size — sha256 и размер загруженных байтов; обычный gzip
+    хранится перепакованным в BGZF (bgzf.reencode при приёме, то же
+    содержимое после распаковки), и файл blob'а не меняется до удаления.
+    Коммит транзакции выполняет вызывающий код вместе с созданием задачи.
+    """
+    path = blob_path(sha256)
+    if not _acquire_existing(db, sha256):
+        try:
+            with db.begin_nested():
+                db.add(Blob(sha256=sha256, path=str(path), size=size, ref_count=1))
+        except IntegrityError:
+            # Такой же файл параллельно загрузил другой запрос
+            _acquire_existing(db, sha256)
+    _defer(db, _ON_COMMIT, partial(_publish, tmp_path, path))
+    return path
+
+
+def release(db: Session, sha256: str):
+    """
+    Уменьшает счётчик ссылок и удаляет blob, когда на него не ссылается ни одна задача.
+    Пока строка заблокирована, файл переименовывается во временное имя,
+    поэтому параллельная загрузка того же файла не может увидеть запись без
+    файла и не потеряет свой файл при удалении; после коммита (finish) он
+    удаляется, после отката возвращается на место.
+    """
+    db.query(Blob).filter(Blob.sha256 == sha256).update(
+        {Blob.ref_count: Blob.ref_count - 1},
+        synchronize_session=False
+    )
+    deleted = db.query(Blob).filter(
+        Blob.sha256 == sha256,
+        Blob.ref_count <= 0
+    ).delete(synchronize_session=False)
+    if not deleted:
+        return
+    suffix = f".{uuid.uuid4().hex}.deleted"
+    for path in (blob_path(sha256), index_path(blob_path(sha256))):
+        trash = path.with_name(path.name + suffix)
+        try:
+            os.replace(path, trash)
+        except FileNotFoundError:
+            continue
+        _defer(db, _ON_ROLLBACK, partial(os.replace, trash, path))
+        _defer(db, _ON_COMMIT, partial(trash.unlink, missing_ok=True))
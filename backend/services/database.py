@@ -1,12 +1,31 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, scoped_session, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from ..models.db_models import Base
+from ..config import ASYNC_DB_MAX_OVERFLOW, ASYNC_DB_POOL_SIZE
+import json
 import os
 from contextlib import contextmanager
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
 
+# Асинхронные драйверы для тех же баз: запрос ждёт ответа БД, не занимая цикл событий
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+def async_database_url(url: str) -> str:
+    """URL той же базы для асинхронного драйвера (aiosqlite, asyncpg)"""
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", async_database_url(DATABASE_URL))
+
 # Настройка engine с pool_pre_ping для проверки соединений
 engine = create_engine(
     DATABASE_URL,
@@ -20,10 +39,83 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+# Асинхронный engine для горячих эндпоинтов (задачи анализа, аутентификация);
+# обработчик задач и остальные роутеры работают через синхронный engine
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    # Для aiosqlite по умолчанию NullPool: новое соединение и поток на каждую сессию
+    poolclass=AsyncAdaptedQueuePool,
+    pool_pre_ping=True,
+    pool_size=ASYNC_DB_POOL_SIZE,
+    max_overflow=ASYNC_DB_MAX_OVERFLOW,
+    pool_recycle=3600,
+    echo=True  # Для отладки SQL запросов
+)
+
+# Объекты не сбрасываются после commit: ленивую загрузку в async-сессии не выполнить
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+def init_db(bind=engine):
+    Base.metadata.create_all(bind=bind)
+    upgrade_schema(bind)
     print("Таблицы БД созданы")
 
+def upgrade_schema(bind=engine):
+    """
+    Дополняет таблицы, созданные прежними версиями, столбцами и индексами
+    моделей: create_all создаёт только отсутствующие таблицы. Проверки
+    через инспектор делают шаг идемпотентным — при каждом запуске
+    добавляется только то, чего нет. Новые столбцы добавляются без NOT NULL,
+    если у них нет постоянного server_default: старым строкам нечем их заполнить.
+    AUTOINCREMENT у revoked_tokens так не добавить; прежняя таблица
+    остаётся без него (services/revocation не удаляет строку с наибольшим id).
+    """
+    with bind.begin() as conn:
+        inspector = inspect(conn)
+        quote = conn.dialect.identifier_preparer.quote
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} " \
+                      f"{column.type.compile(dialect=conn.dialect)}"
+                # Постоянное значение по умолчанию; now() и другие выражения ALTER TABLE в SQLite не принимает
+                default = getattr(column.server_default, "arg", None)
+                if isinstance(default, str):
+                    ddl += f" DEFAULT '{default}'"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                conn.execute(text(ddl))
+                print(f"Добавлен столбец {table.name}.{column.name}")
+                backfill = _BACKFILL.get((table.name, column.name))
+                if backfill is not None:
+                    backfill(conn)
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+                    print(f"Создан индекс {index.name}")
+
+def _backfill_analysis_name(conn):
+    # Имя задачи раньше хранилось только в JSON параметров
+    rows = conn.execute(text("SELECT id, parameters FROM analysis_jobs")).all()
+    names = []
+    for job_id, parameters in rows:
+        try:
+            name = json.loads(parameters or "{}").get("analysis_name")
+        except (ValueError, AttributeError):
+            name = None
+        if name:
+            names.append({"id": job_id, "name": str(name)[:255]})
+    if names:
+        conn.execute(text("UPDATE analysis_jobs SET analysis_name = :name WHERE id = :id"), names)
+
+# Заполнение столбцов, значение которых есть в старых строках
+_BACKFILL = {("analysis_jobs", "analysis_name"): _backfill_analysis_name}
+
 def get_db() -> Generator[Session, None, None]:
     """
     Генератор сессий БД для использования в зависимостях FastAPI
@@ -32,4 +124,11 @@ def get_db() -> Generator[Session, None, None]:
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Асинхронная сессия БД для зависимостей FastAPI
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,103 @@
+"""
+События задач анализа для браузеров: смена статуса и ход этапов.
+
+Издатели (эндпоинты постановки задач, services/job_runner.py) вызывают
+publish один раз на событие, брокер раздаёт его очередям подписчиков
+этого пользователя. Сколько бы вкладок ни следило за задачами, обработчик
+публикует событие один раз, а подписчики ничего не опрашивают.
+
+Последнее событие каждой незавершённой задачи сохраняется: подписчик,
+подключившийся посреди этапа, сразу получает текущий прогресс.
+Очередь подписчика ограничена; медленный подписчик теряет самые старые
+события — каждое следующее событие задачи заменяет предыдущее.
+
+Брокер свой у каждого процесса uvicorn и видит задачи, поставленные
+и выполняемые этим процессом; статус остальных задач эндпоинт потока
+читает из БД при подключении.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set
+from ..config import JOB_EVENTS_QUEUE_SIZE
+
+FINAL_STATUSES = ("completed", "failed")
+
+
+def job_event(job_id: str, status: str, **fields) -> dict:
+    return {"job_id": job_id, "status": status, **fields}
+
+
+class StageProgress:
+    """
+    Прогресс этапа задачи: доля выполненной работы (байты шардов, число
+    уникальных последовательностей), обработанные прочтения и оценка
+    оставшегося времени по средней скорости с начала этапа
+    """
+
+    def __init__(self, job_id: str, stage: str, total: float):
+        self.job_id = job_id
+        self.stage = stage
+        self.total = max(total, 1)
+        self.done = 0.0
+        self.reads = 0
+        self.started = time.monotonic()
+
+    def advance(self, amount: float, reads: int = 0) -> dict:
+        self.done = min(self.total, self.done + amount)
+        self.reads += reads
+        elapsed = time.monotonic() - self.started
+        fraction = self.done / self.total
+        eta = elapsed * (1 - fraction) / fraction if fraction > 0 else None
+        return job_event(
+            self.job_id, "running",
+            stage=self.stage,
+            progress=round(fraction, 4),
+            reads_processed=self.reads,
+            eta_seconds=round(eta, 1) if eta is not None else None
+        )
+
+
+class JobEventBroker:
+    """Раздача событий задач подписчикам по user_id; методы вызываются в event loop"""
+
+    def __init__(self, queue_size: int = JOB_EVENTS_QUEUE_SIZE):
+        self.queue_size = max(1, queue_size)
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._latest: Dict[str, tuple] = {}  # job_id -> (user_id, последнее событие)
+
+    @property
+    def subscribers(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def publish(self, user_id: Optional[int], event: dict):
+        if user_id is None:
+            return
+        if event["status"] in FINAL_STATUSES:
+            self._latest.pop(event["job_id"], None)
+        else:
+            self._latest[event["job_id"]] = (user_id, event)
+        for queue in self._subscribers.get(user_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def latest(self, user_id: int) -> list:
+        """Текущее состояние незавершённых задач пользователя, известных этому процессу"""
+        return [event for owner, event in self._latest.values() if owner == user_id]
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int) -> AsyncIterator[asyncio.Queue]:
+        queue = asyncio.Queue(self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self._subscribers.get(user_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[user_id]
+
+
+job_events = JobEventBroker()
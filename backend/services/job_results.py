@@ -0,0 +1,58 @@
+"""
+Повторное использование результатов анализа.
+Задача с тем же содержимым входа и теми же параметрами, влияющими на
+результат, получает result_path уже выполненной задачи и завершается
+сразу, не попадая в очередь.
+
+Ключ результата — ключ последнего этапа (pipeline/stages.py): он зависит
+от типа задачи, хэшей входных файлов, канонической записи параметров,
+версии референса и PIPELINE_VERSION. Описательные параметры (имя анализа,
+e-mail, имена файлов) в ключ не входят.
+"""
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+from sqlalchemy.orm import Session
+from ..models.db_models import AnalysisJob
+from ..pipeline.stages import STAGES, stage_keys
+from .references import resolve_reference
+
+
+def reference_label(reference: Optional[Path]) -> Optional[str]:
+    return f"{reference.parent.name}@{reference.name}" if reference is not None else None
+
+
+def result_key(job_type: str, input_hash: str, input_hash_r2: Optional[str], parameters: dict) -> str:
+    """
+    Ключ результата — ключ последнего этапа конвейера. Читает файлы
+    текущей версии референса, поэтому из обработчиков вызывается
+    через asyncio.to_thread
+    """
+    # Результат зависит от версии референса: после пересборки индекса задача выполняется заново
+    reference, _ = resolve_reference(parameters)
+    keys = stage_keys(job_type, input_hash, input_hash_r2, parameters, reference_label(reference))
+    return keys[STAGES[-1]]
+
+
+def find_completed(db: Session, key: str) -> Optional[AnalysisJob]:
+    """Самая новая завершённая задача с этим ключом, чьи результаты ещё на диске"""
+    candidates = db.query(AnalysisJob).filter(
+        AnalysisJob.result_key == key,
+        AnalysisJob.status == "completed",
+        AnalysisJob.result_path.isnot(None)
+    ).order_by(AnalysisJob.completed_at.desc())
+    for job in candidates:
+        if os.path.isdir(job.result_path):
+            return job
+    return None
+
+
+def reuse_result(job: AnalysisJob, source: AnalysisJob):
+    """Помечает новую задачу завершённой с результатами source"""
+    now = datetime.now(timezone.utc)
+    job.status = "completed"
+    job.started_at = now
+    job.completed_at = now
+    job.result_path = source.result_path
+    job.reused_job_id = source.reused_job_id or source.job_id
@@ -0,0 +1,444 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+import psutil
+from sqlalchemy.orm import Session
+from ..config import (
+    CACHE_DIR, CLASSIFY_CACHE_BYTES, CLASSIFY_CACHE_ENTRIES, DEREP_MEMORY_BYTES,
+    NANOPORE_BATCH_BASES, NANOPORE_BATCH_MEMORY_SAMPLE, RESULTS_DIR, SHARD_MIN_BYTES, STAGE_CACHE_BYTES, WORKER_CONCURRENCY, WORKER_POLL_INTERVAL
+)
+from ..models.db_models import AnalysisJob, JobStageMetric
+from ..pipeline.classify_cache import CacheConfig
+from ..pipeline.metrics import StageMetrics, combine, metered
+from ..pipeline.runner import (
+    classification_parts, classify_part, is_paired, merge_classification, merge_shards, prepare_input, run_shard
+)
+from ..pipeline.sharding import plan_shards
+from ..pipeline.stages import STAGES, StageStore, stage_keys
+from .database import SessionLocal
+from .job_events import StageProgress, job_event, job_events
+from .job_results import find_completed, reference_label
+from .references import resolve_reference
+from .task_manager import register_shutdown_hook
+
+
+@dataclass
+class ClaimedJob:
+    """Снимок задачи, взятой в работу: всё, что нужно процессу пула, без ORM-объекта"""
+    id: int
+    job_id: str
+    type: str
+    file_path: str
+    parameters: dict
+    file_path_r2: Optional[str] = None
+    input_hash: Optional[str] = None
+    input_hash_r2: Optional[str] = None
+    user_id: Optional[int] = None
+
+    @classmethod
+    def from_job(cls, job: AnalysisJob) -> "ClaimedJob":
+        return cls(
+            id=job.id,
+            job_id=job.job_id,
+            type=job.type,
+            file_path=job.file_path,
+            parameters=json.loads(job.parameters) if job.parameters else {},
+            file_path_r2=job.file_path_r2,
+            input_hash=job.input_hash,
+            input_hash_r2=job.input_hash_r2,
+            user_id=job.user_id,
+        )
+
+
+def classification_cache() -> Optional[CacheConfig]:
+    if CLASSIFY_CACHE_BYTES <= 0:
+        return None
+    return CacheConfig(str(CACHE_DIR / "classification.sqlite3"), CLASSIFY_CACHE_BYTES, CLASSIFY_CACHE_ENTRIES)
+
+
+def stage_store() -> Optional[StageStore]:
+    if STAGE_CACHE_BYTES <= 0:
+        return None
+    return StageStore(CACHE_DIR / "stages", STAGE_CACHE_BYTES)
+
+
+def stage_metric_row(metrics: StageMetrics) -> JobStageMetric:
+    return JobStageMetric(**metrics.to_dict(), reads_per_second=metrics.reads_per_second)
+
+
+def _pending_jobs(db: Session):
+    return db.query(AnalysisJob).filter(
+        AnalysisJob.status == "pending"
+    ).order_by(AnalysisJob.created_at, AnalysisJob.id)
+
+
+def claim_next_job(db: Session, worker_id: str) -> Optional[ClaimedJob]:
+    """
+    Атомарно переводит самую старую задачу из pending в running.
+    На PostgreSQL строка блокируется через FOR UPDATE SKIP LOCKED, и несколько
+    экземпляров приложения разбирают очередь, не ожидая друг друга.
+    SQLite блокировок строк не имеет, но сериализует запись, поэтому хватает
+    условного UPDATE ... WHERE status = 'pending': если задачу успели забрать,
+    изменится ноль строк и берётся следующий кандидат.
+    """
+    values = {
+        AnalysisJob.status: "running",
+        AnalysisJob.started_at: datetime.now(timezone.utc),
+        AnalysisJob.worker_id: worker_id,
+    }
+
+    if db.bind.dialect.name != "sqlite":
+        job = _pending_jobs(db).with_for_update(skip_locked=True).first()
+        if job is None:
+            db.rollback()
+            return None
+        for column, value in values.items():
+            setattr(job, column.key, value)
+        db.commit()
+        return ClaimedJob.from_job(job)
+
+    while True:
+        candidate = _pending_jobs(db).with_entities(AnalysisJob.id).first()
+        if candidate is None:
+            db.rollback()
+            return None
+        claimed = db.query(AnalysisJob).filter(
+            AnalysisJob.id == candidate.id,
+            AnalysisJob.status == "pending"
+        ).update(values, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return ClaimedJob.from_job(db.get(AnalysisJob, candidate.id))
+
+
+def finish_job(db: Session, job: ClaimedJob, worker_id: str,
+               result_path: Optional[str] = None, error: Optional[str] = None,
+               classification: Optional[dict] = None, key: Optional[str] = None,
+               reused_job_id: Optional[str] = None, stages: Optional[dict] = None,
+               metrics: Optional[List[StageMetrics]] = None):
+    """
+    Записывает итог задачи и измерения её этапов. Условие на worker_id не даёт
+    перезаписать задачу, которую уже вернули в очередь при остановке или восстановлении.
+    """
+    classification = classification or {}
+    values = {AnalysisJob.result_key: key} if key else {}
+    finished = db.query(AnalysisJob).filter(
+        AnalysisJob.id == job.id,
+        AnalysisJob.status == "running",
+        AnalysisJob.worker_id == worker_id
+    ).update({
+        AnalysisJob.status: "failed" if error else "completed",
+        AnalysisJob.completed_at: datetime.now(timezone.utc),
+        AnalysisJob.result_path: result_path,
+        AnalysisJob.error_message: error,
+        AnalysisJob.cache_hit_rate: classification.get("cache_hit_rate"),
+        AnalysisJob.cache_bytes_saved: classification.get("cache_bytes_saved"),
+        AnalysisJob.reused_job_id: reused_job_id,
+        AnalysisJob.stages: json.dumps(stages) if stages else None,
+        **values,
+    }, synchronize_session=False)
+    if finished:
+        for item in metrics or ():
+            row = stage_metric_row(item)
+            row.analysis_job_id = job.id
+            db.add(row)
+    db.commit()
+
+
+def _requeue(db: Session, *conditions) -> int:
+    requeued = db.query(AnalysisJob).filter(
+        AnalysisJob.status == "running", *conditions
+    ).update({
+        AnalysisJob.status: "pending",
+        AnalysisJob.started_at: None,
+        AnalysisJob.worker_id: None,
+    }, synchronize_session=False)
+    db.commit()
+    return requeued
+
+
+def requeue_orphaned_jobs(db: Session) -> int:
+    """
+    Возвращает в очередь задачи, зависшие в running после аварийной остановки
+    процесса на этом хосте (процесс с pid из worker_id больше не существует).
+    """
+    host = socket.gethostname()
+    orphaned = []
+    running = db.query(AnalysisJob.id, AnalysisJob.worker_id).filter(
+        AnalysisJob.status == "running",
+        AnalysisJob.worker_id.like(f"{host}:%")
+    ).all()
+    for job_id, worker_id in running:
+        pid = worker_id.rsplit(":", 1)[1]
+        if not pid.isdigit() or not psutil.pid_exists(int(pid)):
+            orphaned.append(job_id)
+    if not orphaned:
+        return 0
+    return _requeue(db, AnalysisJob.id.in_(orphaned))
+
+
+class JobRunner:
+    """
+    Локальный исполнитель задач анализа. Цикл в event loop приложения
+    забирает pending-задачи из БД, пока есть свободные слоты, и выполняет
+    их в пуле процессов (FASTQ-обработка упирается в CPU и держит GIL).
+    Задач в работе не больше, чем процессов в пуле, так что остальные
+    остаются в очереди и доступны другим экземплярам приложения.
+    """
+
+    def __init__(self, concurrency: int = WORKER_CONCURRENCY, poll_interval: float = WORKER_POLL_INTERVAL):
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._active: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        # spawn: дочерние процессы не наследуют потоки и соединения веб-сервера
+        return ProcessPoolExecutor(
+            max_workers=self.concurrency,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._loop_task is not None and not self._loop_task.done()
+
+    @property
+    def active_jobs(self) -> int:
+        return len(self._active)
+
+    async def start(self):
+        if self.running:
+            return
+        # pid мог смениться после перезапуска, поэтому worker_id вычисляется заново
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = False
+        self._pool = self._create_pool()
+        self._wakeup = asyncio.Event()
+        requeued = await asyncio.to_thread(self._with_session, requeue_orphaned_jobs)
+        if requeued:
+            print(f"Возвращено в очередь незавершённых задач: {requeued}")
+        register_shutdown_hook(self.shutdown)
+        self._loop_task = asyncio.create_task(self._poll())
+        print(f"Обработчик задач запущен ({self.concurrency} процессов)")
+
+    def notify(self):
+        """Будит цикл сразу после постановки задачи, не дожидаясь интервала опроса"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    @staticmethod
+    def _with_session(func, *args, **kwargs):
+        db = SessionLocal()
+        try:
+            return func(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    async def _poll(self):
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                while len(self._active) < self.concurrency and not self._stopping:
+                    job = await asyncio.to_thread(self._with_session, claim_next_job, self.worker_id)
+                    if job is None:
+                        break
+                    job_events.publish(job.user_id, job_event(job.job_id, "running"))
+                    task = asyncio.create_task(self._execute(job))
+                    self._active.add(task)
+                    task.add_done_callback(self._active.discard)
+            except Exception as e:
+                print(f"Ошибка при получении задачи: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _analyze(
+        self, job: ClaimedJob, output_dir: Path, reference: Optional[Path], skipped: Optional[str],
+        keys: Optional[dict], metrics: list
+    ) -> Tuple[str, Optional[dict], dict]:
+        """
+        Этапы конвейера в пуле процессов. Этап, чей ключ уже есть в кэше этапов,
+        не выполняется: его выход переносится в каталог результатов.
+        Возвращает каталог результатов, сводку классификации (None, если она
+        взята из кэша) и сведения об этапах для get_job_details.
+        В metrics добавляются измерения каждого шага по порядку выполнения.
+        """
+        store = stage_store() if keys else None
+        stages = {stage: {"key": keys[stage] if keys else None, "reused": False} for stage in STAGES}
+
+        async def restore(stage: str) -> bool:
+            if store is None:
+                return False
+            stages[stage]["reused"] = await asyncio.to_thread(store.restore, stage, keys[stage], output_dir)
+            if stages[stage]["reused"]:
+                job_events.publish(job.user_id, job_event(job.job_id, "running", stage=stage, progress=1, reused=True))
+            return stages[stage]["reused"]
+
+        async def save(stage: str, summary_keys=None):
+            if store is not None:
+                await asyncio.to_thread(store.save, stage, keys[stage], output_dir, summary_keys)
+
+        if not await restore("filtering"):
+            await self._filter(job, output_dir, metrics)
+            await save("filtering")
+        if await restore("classification"):
+            return str(output_dir), None, stages
+        classification = await self._classify(job, output_dir, reference, skipped, metrics)
+        await save("classification", ["classification"])
+        return str(output_dir), classification, stages
+
+    async def _filter(self, job: ClaimedJob, output_dir: Path, metrics: list):
+        loop = asyncio.get_running_loop()
+        pool = self._pool
+        # gzip перепакован в BGZF при загрузке, шарды распаковываются независимо;
+        # здесь только строится недостающий индекс — и для R1, и для R2 пары
+        inputs = [path for path in (job.file_path, job.file_path_r2) if path]
+        prepared = await asyncio.gather(*(
+            loop.run_in_executor(pool, metered, prepare_input, path) for path in inputs
+        ))
+        metrics.append(combine([part for _, part in prepared], parallel=True))
+        # Файл делится на шарды по числу процессов; шарды всех задач
+        # разделяют один пул, так что процессы не простаивают.
+        # Парные данные читаются синхронно с начала и не делятся
+        shard_count = 1 if is_paired(job.parameters) else self.concurrency
+        shards = await asyncio.to_thread(plan_shards, job.file_path, shard_count, SHARD_MIN_BYTES)
+        # Длинные прочтения — пачками по числу оснований, чтобы память процесса была предсказуемой
+        batch_bases = NANOPORE_BATCH_BASES if job.type == "nanopore" else None
+        progress = StageProgress(job.job_id, "filtering", sum(shard.size for shard in shards))
+        job_events.publish(job.user_id, progress.advance(0))
+
+        async def filter_shard(shard):
+            result, shard_metrics = await loop.run_in_executor(
+                pool, metered, run_shard, job.type, job.file_path, job.parameters, shard, str(output_dir),
+                job.file_path_r2, DEREP_MEMORY_BYTES, batch_bases, NANOPORE_BATCH_MEMORY_SAMPLE
+            )
+            job_events.publish(job.user_id, progress.advance(shard.size, result.filtering.reads_in))
+            return result, shard_metrics
+
+        shard_results = await asyncio.gather(*(filter_shard(shard) for shard in shards))
+        metrics.append(combine([m for _, m in shard_results], parallel=True))
+        _, merged = await loop.run_in_executor(
+            pool, metered, merge_shards, job.type, [r for r, _ in shard_results], str(output_dir), DEREP_MEMORY_BYTES
+        )
+        metrics.append(merged)
+
+    async def _classify(self, job: ClaimedJob, output_dir: Path, reference: Optional[Path],
+                        skipped: Optional[str], metrics: list) -> dict:
+        # Классификация уникальных последовательностей диапазонами в том же пуле;
+        # таблицы референса процессы разделяют через кэш страниц ОС
+        loop = asyncio.get_running_loop()
+        pool = self._pool
+        parts, details = [], {"skipped": skipped}
+        if reference is not None:
+            ranges = await asyncio.to_thread(classification_parts, str(output_dir), self.concurrency)
+            cache = classification_cache()
+            progress = StageProgress(job.job_id, "classification", sum(end - start for start, end, _ in ranges))
+            job_events.publish(job.user_id, progress.advance(0))
+
+            async def classify_range(start, end, offset):
+                counts, part_metrics = await loop.run_in_executor(
+                    pool, metered, classify_part, str(output_dir), str(reference), job.parameters, start, end, offset,
+                    cache
+                )
+                job_events.publish(job.user_id, progress.advance(end - start, counts["reads"]))
+                return counts, part_metrics
+
+            classified = await asyncio.gather(*(classify_range(*part) for part in ranges))
+            parts = [counts for counts, _ in classified]
+            metrics.append(combine([m for _, m in classified], parallel=True))
+            details = {
+                "classifier": "naive-bayes",
+                "reference": reference.parent.name,
+                "reference_version": reference.name,
+            }
+        summary, merged = await loop.run_in_executor(
+            pool, metered, merge_classification, str(output_dir), list(parts), details
+        )
+        metrics.append(merged)
+        return summary["classification"]
+
+    async def _execute(self, job: ClaimedJob):
+        output_dir = RESULTS_DIR / job.job_id
+        result_path, error, classification, key, reused, stages = None, None, None, None, None, None
+        metrics = []
+        try:
+            # Ключи пересчитываются при запуске (референс мог смениться после постановки);
+            # одинаковые задачи, поставленные до завершения первой, берут её результат
+            reference, skipped = await asyncio.to_thread(resolve_reference, job.parameters)
+            keys = stage_keys(
+                job.type, job.input_hash, job.input_hash_r2, job.parameters, reference_label(reference)
+            ) if job.input_hash else None
+            key = keys[STAGES[-1]] if keys else None
+            previous = await asyncio.to_thread(self._with_session, find_completed, key) if key else None
+            if previous is not None:
+                result_path, reused = previous.result_path, previous.reused_job_id or previous.job_id
+            else:
+                result_path, classification, stages = await self._analyze(
+                    job, output_dir, reference, skipped, keys, metrics
+                )
+        except BrokenProcessPool:
+            if self._stopping:
+                return
+            # Процесс пула упал (например, по памяти) — пул пересоздаётся для следующих задач
+            self._pool = self._create_pool()
+            error = "Worker process terminated unexpectedly"
+        except Exception as e:
+            if self._stopping:
+                return
+            error = f"{type(e).__name__}: {e}"
+
+        if error:
+            await asyncio.to_thread(shutil.rmtree, output_dir, True)
+        try:
+            await asyncio.to_thread(
+                self._with_session, finish_job, job, self.worker_id, result_path, error, classification, key, reused,
+                stages, combine(metrics)
+            )
+            job_events.publish(job.user_id, job_event(
+                job.job_id, "failed" if error else "completed", error_message=error, reused_from=reused
+            ))
+        except Exception as e:
+            print(f"Не удалось сохранить результат задачи {job.job_id}: {e}")
+        finally:
+            self._wakeup.set()
+
+    def shutdown(self):
+        """
+        Остановка при завершении приложения (через cleanup_processes).
+        Задачи в работе возвращаются в очередь, ожидающие в пуле отменяются;
+        сами процессы пула завершает kill_child_processes.
+        """
+        if self._pool is None:
+            return
+        self._stopping = True
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+        for task in list(self._active):
+            task.cancel()
+        try:
+            requeued = self._with_session(_requeue, AnalysisJob.worker_id == self.worker_id)
+            if requeued:
+                print(f"Задач возвращено в очередь: {requeued}")
+        except Exception as e:
+            print(f"Не удалось вернуть задачи в очередь: {e}")
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+        self._loop_task = None
+
+
+job_runner = JobRunner()
@@ -0,0 +1,214 @@
+"""
+Метрики приложения в формате Prometheus (GET /metrics).
+
+Счётчики на пути запроса — обычные числа и списки: их меняет только
+event loop (middleware, загрузки), поэтому блокировки не нужны, а запрос
+не создаёт новых объектов метрик. Всё, что можно прочитать в момент
+сбора, читается при запросе /metrics коллекторами: пулы соединений
+SQLAlchemy (занято, переполнение), очередь задач по статусам из БД
+и загрузка обработчика задач. Время удержания соединения пула
+измеряется событиями checkout/checkin, которые вызываются и из потоков,
+поэтому для него используется потокобезопасная гистограмма prometheus_client.
+"""
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, Tuple
+from prometheus_client import CollectorRegistry, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+from ..models.db_models import AnalysisJob
+from .database import async_engine, engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+HOLD_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+registry = CollectorRegistry()
+
+
+class LoopHistogram:
+    """Гистограмма без блокировок для значений, которые пишет только event loop"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def cumulative(self) -> list:
+        total, result = 0, []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append(("+Inf" if bound == float("inf") else str(bound), total))
+        return result
+
+
+class RequestMetrics:
+    """Длительность HTTP-запросов по методу, шаблону маршрута и статусу"""
+
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, str, int], LoopHistogram] = {}
+        self._routes: Dict[object, str] = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        route = self._routes.get(endpoint)
+        if route is None:
+            for candidate in scope["app"].routes:
+                # У Mount (/static) нет endpoint: в scope попадает само смонтированное приложение
+                key = candidate.endpoint if hasattr(candidate, "endpoint") else candidate.app
+                self._routes[key] = candidate.path
+            route = self._routes.setdefault(endpoint, "unmatched")
+        return route
+
+    def observe(self, scope, status_code: int, seconds: float):
+        key = (scope["method"], self._route(scope), status_code)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LoopHistogram()
+        histogram.observe(seconds)
+
+    def collect(self) -> Iterable:
+        family = HistogramMetricFamily(
+            "http_request_duration_seconds", "HTTP request latency by route",
+            labels=["method", "route", "status"]
+        )
+        for (method, route, status_code), histogram in list(self.histograms.items()):
+            family.add_metric([method, route, str(status_code)], histogram.cumulative(), histogram.sum)
+        yield family
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware для request_metrics. Шаблон маршрута (/api/analysis/jobs/{job_id})
+    берётся по endpoint, который Starlette кладёт в scope, так что число рядов
+    не растёт с числом задач; запросы мимо маршрутов идут под route="unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_metrics.observe(scope, status_code, time.perf_counter() - started)
+
+
+class UploadMetrics:
+    """Загрузки в процессе и принятые байты (скорость — rate() счётчика); пишет только event loop"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.bytes_total = 0
+        self.completed = 0
+
+    def started(self):
+        self.in_flight += 1
+
+    def received(self, size: int):
+        self.bytes_total += size
+
+    def finished(self):
+        self.in_flight -= 1
+        self.completed += 1
+
+    def collect(self) -> Iterable:
+        yield GaugeMetricFamily("uploads_in_flight", "Uploads and upload chunks being received", self.in_flight)
+        yield CounterMetricFamily("upload_bytes", "Bytes received in uploads", self.bytes_total)
+        yield CounterMetricFamily("uploads", "Uploads and upload chunks received", self.completed)
+
+
+class PoolMetrics:
+    """Пулы соединений SQLAlchemy: занятые соединения и переполнение при сборе, время удержания — по событиям"""
+
+    def __init__(self):
+        self.engines: Dict[str, Engine] = {}
+        self.connection_hold_seconds = Histogram(
+            "db_pool_connection_hold_seconds", "Time a pooled connection stays checked out, from checkout to checkin",
+            ["engine"], buckets=HOLD_BUCKETS, registry=registry
+        )
+
+    def watch(self, name: str, engine: Engine):
+        self.engines[name] = engine
+        histogram = self.connection_hold_seconds.labels(name)
+
+        @event.listens_for(engine, "checkout")
+        def checkout(dbapi_connection, record, proxy):
+            record.info["checked_out_at"] = time.perf_counter()
+
+        @event.listens_for(engine, "checkin")
+        def checkin(dbapi_connection, record):
+            started = record.info.pop("checked_out_at", None)
+            if started is not None:
+                histogram.observe(time.perf_counter() - started)
+
+    def collect(self) -> Iterable:
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Connections checked out of the pool", labels=["engine"])
+        overflow = GaugeMetricFamily("db_pool_overflow", "Connections open beyond pool_size", labels=["engine"])
+        size = GaugeMetricFamily("db_pool_size", "Configured pool_size", labels=["engine"])
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            # У NullPool/StaticPool (SQLite в памяти и т.п.) счётчиков нет
+            if not hasattr(pool, "checkedout"):
+                continue
+            checked_out.add_metric([name], pool.checkedout())
+            overflow.add_metric([name], max(pool.overflow(), 0))
+            size.add_metric([name], pool.size())
+        yield from (checked_out, overflow, size)
+
+
+class JobMetrics:
+    """
+    Очередь задач по статусам (один GROUP BY при сборе) и загрузка обработчика задач.
+    Регистрируется в main.py: обработчик задач импортирует сервисы, которые сами пишут метрики
+    """
+
+    def __init__(self, session_factory, runner):
+        self.session_factory = session_factory
+        self.runner = runner
+
+    def collect(self) -> Iterable:
+        jobs = GaugeMetricFamily("analysis_jobs", "Analysis jobs by status", labels=["status"])
+        db = self.session_factory()
+        try:
+            rows = db.query(AnalysisJob.status, func.count()).group_by(AnalysisJob.status).all()
+        finally:
+            db.close()
+        for job_status, count in rows:
+            jobs.add_metric([job_status or "unknown"], count)
+        yield jobs
+
+        runner = self.runner
+        yield GaugeMetricFamily("worker_running", "1 if the job runner is started in this process", int(runner.running))
+        yield GaugeMetricFamily("worker_processes", "Process pool size of the job runner", runner.concurrency)
+        yield GaugeMetricFamily("worker_active_jobs", "Jobs being executed by this process", runner.active_jobs)
+        yield GaugeMetricFamily(
+            "worker_utilization", "Share of job slots in use", runner.active_jobs / runner.concurrency
+        )
+
+
+request_metrics = RequestMetrics()
+upload_metrics = UploadMetrics()
+pool_metrics = PoolMetrics()
+pool_metrics.watch("sync", engine)
+pool_metrics.watch("async", async_engine.sync_engine)
+for collector in (request_metrics, upload_metrics, pool_metrics):
+    registry.register(collector)
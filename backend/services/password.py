@@ -1,4 +1,12 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
+from ..config import PASSWORD_HASH_CONCURRENCY, PASSWORD_HASH_MAX_QUEUE
+from .task_manager import register_shutdown_hook
 
 # pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -19,3 +27,96 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+class PasswordHasher:
+    """
+    bcrypt вне цикла событий: один хэш — сотни миллисекунд процессора,
+    и вызов прямо в async-обработчике останавливает все запросы процесса.
+    Хэши считаются в отдельном пуле из concurrency потоков (bcrypt отпускает
+    GIL); запросы сверх max_queue ожидающих отклоняются с 503.
+    Пул создаётся в start (при запуске приложения) вместе с функцией
+    остановки: cleanup_processes снимает её, и после остановки и нового
+    запуска в том же процессе пул создаётся заново.
+    """
+
+    def __init__(self, concurrency: int, max_queue: int):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def start(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="bcrypt")
+                register_shutdown_hook(self.shutdown)
+            return self._executor
+
+    def _call(self, submitted: float, func: Callable, *args):
+        started = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self.wait_seconds += started - submitted
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+                self.run_seconds += time.perf_counter() - started
+
+    async def run(self, func: Callable, *args):
+        with self._lock:
+            if self.max_queue and self.queued >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many concurrent sign-in requests, retry later",
+                    headers={"Retry-After": "1"}
+                )
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        # Вне приложения (скрипты, тесты без запуска) пул создаётся при первом хэше
+        executor = self._executor or self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self._call, time.perf_counter(), func, *args)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            completed = self.completed
+            return {
+                "concurrency": self.concurrency,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "active": self.active,
+                "max_queued": self.max_queued,
+                "completed": completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.wait_seconds / completed * 1000, 2) if completed else 0.0,
+                "avg_hash_ms": round(self.run_seconds / completed * 1000, 2) if completed else 0.0,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+hasher = PasswordHasher(PASSWORD_HASH_CONCURRENCY, PASSWORD_HASH_MAX_QUEUE)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await hasher.run(get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await hasher.run(verify_password, plain_password, hashed_password)
+
+
@@ -0,0 +1,84 @@
+"""
+Кэш аутентифицированных пользователей по токену.
+
+get_current_user выполняется на каждый запрос страницы и API: без кэша
+это разбор JWT, запрос к таблице users и новый UserInDB. Запись кэша
+живёт не дольше ttl секунд и не дольше срока действия самого токена;
+при переполнении вытесняются давно не использованные записи.
+
+Кэш свой у каждого процесса uvicorn. Отзыв токена проверяется до кэша
+(services/revocation.py), поэтому выход из системы видят все процессы.
+Отключение пользователя сбрасывает его записи в этом процессе сразу,
+в остальных — не позже чем через ttl.
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+from ..config import PRINCIPAL_CACHE_ENTRIES, PRINCIPAL_CACHE_TTL
+from ..models.user import UserInDB
+
+
+class PrincipalCache:
+    """LRU токен -> UserInDB с истечением записей; ttl=0 выключает кэш"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[str, Tuple[UserInDB, float]]" = OrderedDict()
+        self._tokens: Dict[str, Set[str]] = {}
+
+    def get(self, token: str) -> Optional[UserInDB]:
+        item = self._items.get(token)
+        if item is None:
+            self.misses += 1
+            return None
+        user, expires = item
+        if expires <= time.monotonic():
+            self.invalidate_token(token)
+            self.misses += 1
+            return None
+        self._items.move_to_end(token)
+        self.hits += 1
+        return user
+
+    def put(self, token: str, user: UserInDB, token_expires: Optional[float] = None):
+        """token_expires — поле exp токена (секунды Unix)"""
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        lifetime = self.ttl
+        if token_expires is not None:
+            lifetime = min(lifetime, token_expires - time.time())
+        if lifetime <= 0:
+            return
+        self.invalidate_token(token)
+        self._items[token] = (user, time.monotonic() + lifetime)
+        self._tokens.setdefault(user.username, set()).add(token)
+        while len(self._items) > self.max_entries:
+            self.invalidate_token(next(iter(self._items)))
+
+    def invalidate_token(self, token: str):
+        item = self._items.pop(token, None)
+        if item is None:
+            return
+        tokens = self._tokens.get(item[0].username)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens[item[0].username]
+
+    def invalidate_user(self, username: str):
+        """Сбрасывает все токены пользователя (отключение, смена данных)"""
+        for token in list(self._tokens.get(username, ())):
+            self.invalidate_token(token)
+
+    def clear(self):
+        self._items.clear()
+        self._tokens.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_TTL, PRINCIPAL_CACHE_ENTRIES)
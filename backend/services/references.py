@@ -0,0 +1,86 @@
+"""
+Сборка индексов референсов по запросу администратора.
+Сборка занимает минуты, поэтому идёт в фоновом потоке; на одно имя
+одновременно выполняется не больше одной сборки.
+"""
+import asyncio
+import re
+import uuid
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException, UploadFile, status
+from ..config import REFERENCE_DIR
+from ..pipeline.references import SOURCES_DIR, build_index, current_index, file_digest, index_version
+from .uploads import save_upload
+
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,99}$")
+_builds: Dict[str, asyncio.Task] = {}
+
+
+def resolve_reference(parameters: dict) -> Tuple[Optional[Path], Optional[str]]:
+    """Таблицы классификатора для параметров задачи или причина, по которой классификации не будет"""
+    classifier = parameters.get("classifier", "naive-bayes")
+    if classifier != "naive-bayes":
+        return None, f"Classifier '{classifier}' is not available"
+    name = f"{parameters.get('reference_sequences')}_{parameters.get('reference_db')}"
+    path = current_index(REFERENCE_DIR, name)
+    if path is None:
+        return None, f"Reference '{name}' is not installed"
+    return path, None
+
+
+def check_name(name: str):
+    if not _NAME_PATTERN.match(name):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Reference name may contain only letters, digits, '_', '.' and '-'"
+        )
+
+
+async def store_source(name: str, upload: UploadFile) -> Path:
+    """Сохраняет входной файл в <name>/sources/ под именем по его sha256"""
+    sources = REFERENCE_DIR / name / SOURCES_DIR
+    sources.mkdir(parents=True, exist_ok=True)
+    tmp_path = sources / f"incoming-{uuid.uuid4().hex}.part"
+    stats = await save_upload(upload, tmp_path)
+    suffix = ".gz" if (upload.filename or "").endswith(".gz") else ""
+    path = sources / f"{stats.sha256}{suffix}"
+    tmp_path.replace(path)
+    return path
+
+
+def _finished(name: str, task: asyncio.Task):
+    _builds.pop(name, None)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Ошибка сборки индекса {name}: {task.exception()}")
+
+
+async def start_build(
+    name: str,
+    fasta: Path,
+    taxonomy: Optional[Path],
+    k: int,
+    depth: Optional[int],
+    force: bool
+) -> dict:
+    """
+    Запускает сборку или, если индекс с теми же входами уже собран,
+    сразу делает его текущим. Возвращает версию и состояние.
+    """
+    if name in _builds:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Reference '{name}' is already being built"
+        )
+    fasta_sha256 = await asyncio.to_thread(file_digest, fasta)
+    taxonomy_sha256 = await asyncio.to_thread(file_digest, taxonomy) if taxonomy else None
+    version = index_version(fasta_sha256, taxonomy_sha256, k, depth)
+
+    if not force and (REFERENCE_DIR / name / version).is_dir():
+        await asyncio.to_thread(build_index, REFERENCE_DIR, name, fasta, taxonomy, k, depth)
+        return {"name": name, "version": version, "status": "ready"}
+
+    task = asyncio.create_task(asyncio.to_thread(build_index, REFERENCE_DIR, name, fasta, taxonomy, k, depth, force))
+    _builds[name] = task
+    task.add_done_callback(lambda t: _finished(name, t))
+    return {"name": name, "version": version, "status": "building"}
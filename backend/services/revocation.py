@@ -0,0 +1,131 @@
+"""
+Отозванные токены (выход из системы).
+
+Проверка на каждый запрос — поиск sha256 токена в словаре, O(1).
+Записи удаляются лениво: min-куча по сроку действия токена, и каждая
+операция снимает с её вершины только истёкшие записи, а не перебирает
+весь список. После срока действия отзыв не нужен: токен и так не
+пройдёт проверку подписи.
+
+С общей таблицей revoked_tokens отзыв виден всем процессам uvicorn:
+процесс пишет отзыв в таблицу и не чаще раза в sync_interval секунд
+подгружает строки с id больше последнего прочитанного, поэтому id не
+должны повторяться (AUTOINCREMENT в SQLite). Истёкшие строки удаляет тот
+процесс, который записывает новый отзыв. Запросы к таблице
+выполняются в пуле потоков, а не в event loop.
+"""
+import asyncio
+import hashlib
+import heapq
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from ..config import REVOCATION_STORE, REVOCATION_SYNC_INTERVAL
+from ..models.db_models import RevokedToken
+from .database import SessionLocal
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _timestamp(value: datetime) -> float:
+    # SQLite возвращает время без часового пояса; в таблицу пишется UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class RevocationStore:
+    """Отозванные токены до истечения их срока; session_factory=None — только память процесса"""
+
+    def __init__(self, session_factory: Optional[Callable[[], Session]] = None, sync_interval: float = 1.0):
+        self.session_factory = session_factory
+        self.sync_interval = sync_interval
+        self._expires: Dict[str, float] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._last_id = 0
+        self._next_sync = 0.0
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def _remember(self, digest: str, expires_at: float):
+        if expires_at <= self._expires.get(digest, 0.0):
+            return
+        self._expires[digest] = expires_at
+        heapq.heappush(self._heap, (expires_at, digest))
+
+    def _expire(self, now: float):
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            expires_at, digest = heapq.heappop(heap)
+            # В куче могут остаться устаревшие пары, если отзыв продлевали
+            if self._expires.get(digest) == expires_at:
+                del self._expires[digest]
+
+    async def revoke(self, token: str, expires_at: float):
+        """expires_at — срок действия токена (секунды Unix)"""
+        now = time.time()
+        if expires_at <= now:
+            return
+        digest = token_digest(token)
+        self._remember(digest, expires_at)
+        self._expire(now)
+        if self.session_factory is not None:
+            await asyncio.to_thread(self._store, digest, expires_at)
+
+    async def is_revoked(self, token: str) -> bool:
+        if self.session_factory is not None and time.monotonic() >= self._next_sync:
+            await self.sync()
+        now = time.time()
+        self._expire(now)
+        expires_at = self._expires.get(token_digest(token))
+        return expires_at is not None and expires_at > now
+
+    async def sync(self):
+        """Подгружает отзывы, записанные другими процессами после последней синхронизации"""
+        # Срок следующей синхронизации — до ожидания: одновременные проверки не запускают свою
+        self._next_sync = time.monotonic() + self.sync_interval
+        rows = await asyncio.to_thread(self._load, self._last_id)
+        for row_id, digest, expires_at in rows:
+            self._remember(digest, _timestamp(expires_at))
+            self._last_id = max(self._last_id, row_id)
+        self._expire(time.time())
+
+    # Запросы к таблице выполняются в потоке: сессия синхронная, а вызывающие — в event loop
+
+    def _store(self, digest: str, expires_at: float):
+        db = self.session_factory()
+        try:
+            # Строка с наибольшим id остаётся и после истечения: в таблицах, созданных без
+            # AUTOINCREMENT, следующий id всё равно будет больше прочитанного другими процессами
+            max_id = db.query(func.max(RevokedToken.id)).scalar()
+            db.query(RevokedToken).filter(
+                RevokedToken.expires_at <= datetime.now(timezone.utc), RevokedToken.id != max_id
+            ).delete()
+            if not db.query(RevokedToken.id).filter(RevokedToken.token_hash == digest).first():
+                db.add(RevokedToken(token_hash=digest, expires_at=datetime.fromtimestamp(expires_at, timezone.utc)))
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"Не удалось сохранить отзыв токена: {e}")
+        finally:
+            db.close()
+
+    def _load(self, last_id: int) -> list:
+        db = self.session_factory()
+        try:
+            return db.query(RevokedToken.id, RevokedToken.token_hash, RevokedToken.expires_at).filter(
+                RevokedToken.id > last_id
+            ).order_by(RevokedToken.id).all()
+        except SQLAlchemyError as e:
+            print(f"Не удалось загрузить отозванные токены: {e}")
+            return []
+        finally:
+            db.close()
+
+revocations = RevocationStore(SessionLocal if REVOCATION_STORE == "database" else None, REVOCATION_SYNC_INTERVAL)
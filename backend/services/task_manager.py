@@ -1,8 +1,14 @@
 import os
 import psutil
-from typing import List
+from typing import Callable, List
 import signal
 
+# Функции остановки подсистем (пулы процессов и т.п.), вызываются до завершения дочерних процессов
+_shutdown_hooks: List[Callable[[], None]] = []
+
+def register_shutdown_hook(hook: Callable[[], None]):
+    _shutdown_hooks.append(hook)
+
 def get_child_processes() -> List[psutil.Process]:
     current_process = psutil.Process(os.getpid())
     return current_process.children(recursive=True)
@@ -15,4 +21,10 @@ def kill_child_processes():
             pass
 
 def cleanup_processes():
+    while _shutdown_hooks:
+        hook = _shutdown_hooks.pop()
+        try:
+            hook()
+        except Exception as e:
+            print(f"Ошибка при остановке: {e}")
     kill_child_processes()
\ No newline at end of file
@@ -0,0 +1,244 @@
+import asyncio
+import time
+import uuid
+from datetime import timezone
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Tuple
+import aiofiles
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..config import UPLOADS_DIR, UPLOAD_MAX_SIZE, UPLOAD_SESSION_MIN_CHUNK, UPLOAD_SESSION_MAX_CHUNK
+from ..models.db_models import UploadSession, UploadChunk
+from .uploads import UploadStats, upload_too_large
+from .metrics import upload_metrics
+from ..pipeline.fastq import FastqFormatError
+from ..pipeline.qc import validate_prefix
+
+SESSIONS_DIR = UPLOADS_DIR / "sessions"
+
+
+def create_session(
+    db: Session,
+    user_id: int,
+    filename: str,
+    total_size: int,
+    chunk_size: int
+) -> UploadSession:
+    """
+    Создаёт сессию загрузки и резервирует файл итогового размера.
+    Каждый чанк потом пишется сразу по своему смещению, поэтому
+    при завершении файл не нужно склеивать и копировать.
+    """
+    if not UPLOAD_SESSION_MIN_CHUNK <= chunk_size <= UPLOAD_SESSION_MAX_CHUNK:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"chunk_size must be between {UPLOAD_SESSION_MIN_CHUNK} and {UPLOAD_SESSION_MAX_CHUNK} bytes"
+        )
+    if total_size > UPLOAD_MAX_SIZE:
+        # Файл резервируется сразу, поэтому размер проверяется до truncate
+        raise upload_too_large(UPLOAD_MAX_SIZE)
+
+    SESSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    upload_id = str(uuid.uuid4())
+    file_path = SESSIONS_DIR / f"{upload_id}.part"
+
+    # Разреженный файл: место на диске занимают только полученные чанки
+    with open(file_path, "wb") as f:
+        f.truncate(total_size)
+
+    session = UploadSession(
+        upload_id=upload_id,
+        user_id=user_id,
+        filename=Path(filename).name,
+        total_size=total_size,
+        chunk_size=chunk_size,
+        total_chunks=(total_size + chunk_size - 1) // chunk_size,
+        file_path=str(file_path),
+        status="open"
+    )
+    try:
+        db.add(session)
+        db.commit()
+        db.refresh(session)
+    except Exception:
+        db.rollback()
+        file_path.unlink(missing_ok=True)
+        raise
+    return session
+
+
+def get_session(db: Session, upload_id: str, user_id: int) -> UploadSession:
+    session = db.query(UploadSession).filter(
+        UploadSession.upload_id == upload_id,
+        UploadSession.user_id == user_id
+    ).first()
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload session not found"
+        )
+    return session
+
+
+def missing_chunks(db: Session, session: UploadSession) -> List[int]:
+    received = {
+        index for (index,) in db.query(UploadChunk.chunk_index).filter(
+            UploadChunk.session_id == session.id
+        )
+    }
+    return [i for i in range(session.total_chunks) if i not in received]
+
+
+def chunk_length(session: UploadSession, index: int) -> int:
+    if index == session.total_chunks - 1:
+        return session.total_size - index * session.chunk_size
+    return session.chunk_size
+
+
+def _forget_chunk(db: Session, session_id: int, index: int):
+    deleted = db.query(UploadChunk).filter(
+        UploadChunk.session_id == session_id,
+        UploadChunk.chunk_index == index
+    ).delete()
+    # Новый чанк (обычный случай) не требует отдельного коммита
+    if deleted:
+        db.commit()
+
+
+def _remember_chunk(db: Session, session_id: int, index: int):
+    try:
+        db.add(UploadChunk(session_id=session_id, chunk_index=index))
+        db.commit()
+    except IntegrityError:
+        # Чанк уже был получен ранее
+        db.rollback()
+
+
+async def write_chunk(
+    db: AsyncSession,
+    session: UploadSession,
+    index: int,
+    body: AsyncIterator[bytes],
+    content_length: Optional[int] = None
+) -> int:
+    """
+    Записывает чанк по смещению index * chunk_size.
+    Повторная отправка того же чанка безопасна: до записи чанк снова
+    считается отсутствующим и отмечается полученным, только когда
+    записан целиком, — обрыв соединения посреди записи не оставляет
+    полу-перезаписанный чанк среди полученных.
+    Отметки о чанках общие с синхронными функциями модуля, поэтому
+    выполняются через run_sync асинхронной сессии, не блокируя event loop.
+    """
+    if session.status != "open":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload session is already finalized"
+        )
+    if not 0 <= index < session.total_chunks:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Chunk index must be between 0 and {session.total_chunks - 1}"
+        )
+
+    expected = chunk_length(session, index)
+    if content_length is not None and content_length != expected:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Chunk {index} must be exactly {expected} bytes"
+        )
+
+    # Поля сессии читаются до коммита: после него объект может быть сброшен
+    session_id, file_path, offset = session.id, session.file_path, index * session.chunk_size
+    await db.run_sync(_forget_chunk, session_id, index)
+
+    written = 0
+    upload_metrics.started()
+    try:
+        async with aiofiles.open(file_path, "r+b") as f:
+            await f.seek(offset)
+            async for piece in body:
+                written += len(piece)
+                if written > expected:
+                    break
+                await f.write(piece)
+                upload_metrics.received(len(piece))
+    finally:
+        upload_metrics.finished()
+
+    if written != expected:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Chunk {index} must be exactly {expected} bytes"
+        )
+
+    if index == 0:
+        # Первый чанк проверяется сразу, чтобы не принимать гигабайты не-FASTQ данных
+        try:
+            async with aiofiles.open(file_path, "rb") as f:
+                prefix = await f.read(expected)
+            # Разбор FASTQ нагружает CPU — выполняем вне event loop
+            await asyncio.to_thread(validate_prefix, prefix)
+        except FastqFormatError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid FASTQ file: {str(e)}"
+            )
+
+    await db.run_sync(_remember_chunk, session_id, index)
+    return written
+
+
+def finalize_session(
+    db: Session,
+    upload_id: str,
+    user_id: int
+) -> Tuple[Path, str, UploadStats]:
+    """
+    Проверяет, что получены все чанки. Возвращает путь к собранному файлу,
+    исходное имя файла и статистику загрузки. Файл остаётся в сессии,
+    пока задача не создана (complete_session): если он не пройдёт проверку,
+    сессия остаётся открытой и чанки можно отправить заново.
+    """
+    session = get_session(db, upload_id, user_id)
+    if session.status != "open":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload session is already finalized"
+        )
+
+    missing = missing_chunks(db, session)
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Upload is incomplete: {len(missing)} chunks missing"
+        )
+
+    created = time.time()
+    if session.created_at:
+        started = session.created_at
+        if started.tzinfo is None:
+            # SQLite возвращает CURRENT_TIMESTAMP без зоны, но в UTC
+            started = started.replace(tzinfo=timezone.utc)
+        created = started.timestamp()
+    stats = UploadStats(bytes_written=session.total_size, seconds=max(time.time() - created, 0.0))
+    return Path(session.file_path), session.filename, stats
+
+
+def complete_session(db: Session, upload_id: str, user_id: int, stored_path: Path):
+    """
+    Отмечает сессию завершённой, когда её файл перенесён в хранилище.
+    Коммит выполняет вызывающий код вместе с созданием задачи.
+    """
+    session = get_session(db, upload_id, user_id)
+    session.status = "completed"
+    session.file_path = str(stored_path)
+
+
+def abort_session(db: Session, session: UploadSession):
+    if session.status == "open":
+        Path(session.file_path).unlink(missing_ok=True)
+    db.delete(session)
+    db.commit()
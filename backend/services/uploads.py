@@ -0,0 +1,85 @@
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+import aiofiles
+from fastapi import HTTPException, UploadFile, status
+from ..config import UPLOAD_CHUNK_SIZE, UPLOAD_MAX_SIZE
+from ..pipeline.qc import FastqInspector
+from .metrics import upload_metrics
+
+
+@dataclass
+class UploadStats:
+    bytes_written: int
+    seconds: float
+    sha256: Optional[str] = None
+    qc_summary: Optional[dict] = None
+
+    @property
+    def throughput_mbps(self) -> float:
+        """Скорость записи в МБ/с"""
+        if self.seconds <= 0:
+            return 0.0
+        return self.bytes_written / self.seconds / (1024 * 1024)
+
+
+def upload_too_large(max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File is larger than {max_size} bytes"
+    )
+
+
+async def save_upload(
+    upload: UploadFile,
+    destination: Path,
+    inspector: Optional[FastqInspector] = None,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    max_size: int = UPLOAD_MAX_SIZE
+) -> UploadStats:
+    """
+    Потоково сохраняет загруженный файл на диск блоками фиксированного размера.
+    Объём памяти ограничен chunk_size независимо от размера файла,
+    запись не блокирует event loop. Хэш sha256 считается по ходу записи,
+    inspector (если передан) проверяет FASTQ и собирает QC в том же проходе.
+    Файл больше max_size отклоняется с 413.
+    """
+    started = time.perf_counter()
+    digest = hashlib.sha256()
+    qc_summary = None
+    written = 0
+    upload_metrics.started()
+    try:
+        async with aiofiles.open(destination, "wb") as buffer:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                if written + len(chunk) > max_size:
+                    raise upload_too_large(max_size)
+                digest.update(chunk)
+                if inspector is not None:
+                    # Разбор FASTQ нагружает CPU — выполняем вне event loop
+                    await asyncio.to_thread(inspector.feed, chunk)
+                await buffer.write(chunk)
+                written += len(chunk)
+                upload_metrics.received(len(chunk))
+        if inspector is not None:
+            qc_summary = await asyncio.to_thread(inspector.close)
+    except BaseException:
+        # Не оставляем на диске обрезанный файл
+        destination.unlink(missing_ok=True)
+        raise
+    finally:
+        upload_metrics.finished()
+        await upload.close()
+
+    return UploadStats(
+        bytes_written=written,
+        seconds=time.perf_counter() - started,
+        sha256=digest.hexdigest(),
+        qc_summary=qc_summary
+    )
@@ -0,0 +1,96 @@
+"""
+Обрезка адаптеров и праймеров (backend/pipeline/adapters.py) рядом
+с фильтрацией по качеству (filtering.filter_batch) на тех же пачках.
+Обрезка одного адаптера примерно вдвое быстрее фильтрации; с обоими
+праймерами (ещё два прохода Майерса, обратный праймер — по всему
+прочтению до адаптера) она с фильтрацией наравне и на части запусков
+медленнее — это самый дорогой этап прохода по прочтениям.
+Прочтения — вставка случайной длины, за ней адаптер с заменами
+и инделами; проверяется, сколько прочтений обрезано ровно по вставке.
+
+    python -m benchmarks.bench_adapters --reads 200000 --length 250 --primers
+"""
+import argparse
+import io
+import random
+import time
+import numpy as np
+from backend.pipeline.adapters import ADAPTERS, AdapterTrimmer, TrimParams, TrimStats, reverse_complement
+from backend.pipeline.fastq import iter_batches
+from backend.pipeline.filtering import FilterParams, FilterStats, filter_batch
+
+PRIMER_FORWARD = "GTGYCAGCMGCCGCGGTAA"   # 515F
+PRIMER_REVERSE = "GGACTACNVGGGTWTCTAAT"  # 806R
+
+
+def mutate(sequence: str, rng: random.Random, rate: float) -> str:
+    """Замены, вставки и удаления с общей частотой rate"""
+    out = []
+    for base in sequence:
+        roll = rng.random()
+        if roll < rate / 3:
+            out.append(rng.choice("ACGT".replace(base, "")))
+        elif roll < 2 * rate / 3:
+            out.extend((base, rng.choice("ACGT")))
+        elif roll >= rate:
+            out.append(base)
+    return "".join(out)
+
+
+def make_reads(reads: int, length: int, primers: bool, seed: int = 1):
+    """FASTQ и длина вставки каждого прочтения (без праймеров)"""
+    rng = random.Random(seed)
+    tail = ADAPTERS["default"] + "ACACGTCTGAACTCCAGTCAC" + "A" * length
+    lines, inserts = [], []
+    for i in range(reads):
+        insert = rng.randint(length // 3, length + 20)
+        forward, reverse = "", ""
+        if primers:
+            forward = mutate(PRIMER_FORWARD.replace("Y", "C").replace("M", "A"), rng, 0.03)
+            reverse = reverse_complement(PRIMER_REVERSE.replace("N", "A").replace("V", "G").replace("W", "T"))
+        sequence = forward + "".join(rng.choices("ACGT", k=insert)) + reverse + mutate(tail, rng, 0.03)
+        sequence = sequence[:length]
+        inserts.append(min(insert, length - len(forward)))
+        lines.append(f"@read{i}\n{sequence}\n+\n{'I' * len(sequence)}\n")
+    return "".join(lines).encode(), np.array(inserts)
+
+
+def measure(label: str, func, batches: list, reads: int) -> list:
+    started = time.perf_counter()
+    result = [func(batch) for batch in batches]
+    elapsed = time.perf_counter() - started
+    print(f"{label:<18} {elapsed:8.3f} s  {reads / elapsed / 1e6:8.3f} M reads/s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reads", type=int, default=200_000)
+    parser.add_argument("--length", type=int, default=250)
+    parser.add_argument("--primers", action="store_true", help="also trim 515F/806R primers")
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    data, inserts = make_reads(args.reads, args.length, args.primers)
+    batches = list(iter_batches(io.BytesIO(data)))
+    print(f"{args.reads} reads, {len(data) / 1e6:.1f} MB")
+
+    filter_params = FilterParams(min_quality=20, max_ambiguous=2, minlen=50, maxns=1, maxee=2.0)
+    measure("quality filter", lambda batch: filter_batch(batch, filter_params, FilterStats()), batches, args.reads)
+
+    params = TrimParams(adapter="default", adapter_error_rate=args.error_rate)
+    if args.primers:
+        params.primer_forward, params.primer_reverse = PRIMER_FORWARD, PRIMER_REVERSE
+    trimmer = AdapterTrimmer(params)
+    stats = TrimStats()
+    trimmed = measure("adapter trimming", lambda batch: trimmer.trim(batch, stats), batches, args.reads)
+
+    lengths = np.concatenate([batch.lengths for batch in trimmed])
+    exact = np.count_nonzero(lengths == inserts)
+    near = np.count_nonzero(np.abs(lengths - inserts) <= 2)
+    print(f"trimmed at the insert end: {exact / args.reads:.1%} exact, {near / args.reads:.1%} within 2 bp")
+    print(stats.to_dict())
+
+
+if __name__ == "__main__":
+    main()
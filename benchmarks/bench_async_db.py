@@ -0,0 +1,205 @@
+"""
+Список задач и карточка задачи под параллельной нагрузкой: прежние
+обработчики с синхронной сессией (запрос к БД останавливает цикл событий)
+против асинхронной сессии (backend/services/database.py, get_async_db).
+Приложение запускается uvicorn на локальном порту с временной
+SQLite-базой; --clients клиентов одновременно запрашивают задачи.
+
+--db-latency-ms добавляет задержку к каждому SQL-запросу в том потоке,
+где он выполняется, — как ожидание ответа сервера PostgreSQL по сети:
+синхронный драйвер ждёт в цикле событий, aiosqlite — в своём потоке.
+С DATABASE_URL на PostgreSQL задержку можно не задавать.
+
+    python -m benchmarks.bench_async_db --clients 1 8 32 --db-latency-ms 2
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/bench.db")
+os.environ.setdefault("UPLOADS_DIR", f"{_tmp}/uploads")
+os.environ.setdefault("RESULTS_DIR", f"{_tmp}/results")
+os.environ.setdefault("CACHE_DIR", f"{_tmp}/cache")
+os.environ["WORKER_ENABLED"] = "0"
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+import uvicorn  # noqa: E402
+from fastapi import APIRouter, Depends  # noqa: E402
+from sqlalchemy import create_engine, event  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from backend.main import app  # noqa: E402
+from backend.dependencies import get_current_user  # noqa: E402
+from backend.models.db_models import AnalysisJob, User  # noqa: E402
+from backend.models.user import UserInDB  # noqa: E402
+from backend.services import database  # noqa: E402
+
+# Прежние обработчики: та же выборка через синхронную сессию
+legacy = APIRouter(prefix="/bench/sync")
+
+
+def job_row(job: AnalysisJob) -> dict:
+    return {
+        "job_id": job.job_id,
+        "type": job.type,
+        "status": job.status,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "analysis_name": json.loads(job.parameters).get("analysis_name") if job.parameters else None
+    }
+
+
+@legacy.get("/jobs")
+async def legacy_jobs(current_user: UserInDB = Depends(get_current_user), db: Session = Depends(database.get_db)):
+    jobs = db.query(AnalysisJob).filter(
+        AnalysisJob.user_id == current_user.id
+    ).order_by(AnalysisJob.created_at.desc()).all()
+    return {"jobs": [job_row(job) for job in jobs]}
+
+
+@legacy.get("/jobs/{job_id}")
+async def legacy_job(job_id: str, current_user: UserInDB = Depends(get_current_user),
+                     db: Session = Depends(database.get_db)):
+    job = db.query(AnalysisJob).filter(
+        AnalysisJob.job_id == job_id,
+        AnalysisJob.user_id == current_user.id
+    ).first()
+    return job_row(job)
+
+
+def size_sync_pool(connections: int):
+    """
+    Пул синхронного engine не меньше числа клиентов: прежний обработчик ждёт
+    соединение прямо в цикле событий, а освобождается оно при закрытии сессии
+    get_db, которое этот же цикл и должен запустить, — при нехватке соединений
+    сервер стоит до pool_timeout (30 с) и сравнение теряет смысл
+    """
+    database.engine = create_engine(
+        database.DATABASE_URL,
+        connect_args={"check_same_thread": False} if database.DATABASE_URL.startswith("sqlite") else {},
+        pool_size=connections,
+        max_overflow=0
+    )
+    database.SessionLocal.configure(bind=database.engine)
+
+
+def add_latency(seconds: float):
+    """Задержка на каждый SQL-запрос в потоке, который его выполняет"""
+    def delay(statement):
+        time.sleep(seconds)
+
+    @event.listens_for(database.engine, "connect")
+    def sync_connect(dbapi_connection, record):
+        dbapi_connection.set_trace_callback(delay)
+
+    @event.listens_for(database.async_engine.sync_engine, "connect")
+    def async_connect(dbapi_connection, record):
+        # Callback ставится в потоке aiosqlite и там же выполняется
+        dbapi_connection.run_async(lambda connection: connection.set_trace_callback(delay))
+
+
+def seed(jobs: int) -> list:
+    db = database.SessionLocal()
+    try:
+        user_id = db.query(User.id).filter(User.username == "bench").scalar()
+        ids = [f"bench-{i:05d}" for i in range(jobs)]
+        db.add_all(AnalysisJob(job_id=job_id, user_id=user_id, type="illumina", file_path="",
+                               status="completed", parameters=json.dumps({"analysis_name": job_id}))
+                   for job_id in ids)
+        db.commit()
+        return ids
+    finally:
+        db.close()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def client_loop(client: httpx.AsyncClient, paths: list, stop: asyncio.Event, offset: int) -> tuple:
+    latencies = []
+    timeouts = 0
+    i = offset
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            response = await client.get(paths[i % len(paths)])
+        except httpx.TimeoutException:
+            timeouts += 1
+            continue
+        finally:
+            i += 1
+        assert response.status_code == 200, response.text
+        latencies.append(time.perf_counter() - started)
+    return latencies, timeouts
+
+
+async def phase(base_url: str, cookies: dict, paths: list, clients: int, seconds: float, timeout: float) -> tuple:
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, cookies=cookies, timeout=timeout, limits=limits) as client:
+        tasks = [asyncio.create_task(client_loop(client, paths, stop, n)) for n in range(clients)]
+        await asyncio.sleep(seconds)
+        stop.set()
+        done = [await task for task in tasks]
+    latencies = np.concatenate([d[0] for d in done] + [[np.nan]]) * 1000
+    return (np.isfinite(latencies).sum() / seconds, np.nanpercentile(latencies, 50), np.nanpercentile(latencies, 99),
+            sum(d[1] for d in done))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--jobs", type=int, default=50, help="jobs of the benchmark user")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--timeout", type=float, default=10.0, help="request timeout, s")
+    args = parser.parse_args()
+
+    size_sync_pool(max(args.clients))
+    database.async_engine.echo = False
+    if args.db_latency_ms > 0:
+        add_latency(args.db_latency_ms / 1000)
+    app.include_router(legacy)
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    results = []
+    # Отладочный вывод приложения на каждый запрос не входит в измерение
+    with contextlib.redirect_stdout(io.StringIO()):
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+        httpx.post(f"{base_url}/api/auth/register",
+                   json={"username": "bench", "email": "bench@example.org", "password": "bench"})
+        login = httpx.post(f"{base_url}/api/auth/login", data={"username": "bench", "password": "bench"})
+        cookies = dict(login.cookies)
+        ids = seed(args.jobs)
+        for endpoint, suffix in (("list", [""]), ("details", [f"/{job_id}" for job_id in ids])):
+            for label, prefix in (("sync", "/bench/sync/jobs"), ("async", "/api/analysis/jobs")):
+                paths = [prefix + s for s in suffix]
+                for clients in args.clients:
+                    results.append((endpoint, label, clients,
+                                    *asyncio.run(phase(base_url, cookies, paths, clients, args.seconds, args.timeout))))
+        server.should_exit = True
+        thread.join()
+
+    print(f"database: {database.ASYNC_DATABASE_URL.split('://')[0]}, latency {args.db_latency_ms} ms/query, "
+          f"{args.jobs} jobs")
+    for endpoint, label, clients, rate, p50, p99, timeouts in results:
+        print(f"{endpoint:<8} {label:<6} {clients:3d} clients  {rate:7.0f} req/s  "
+              f"p50 {p50:7.1f} ms  p99 {p99:7.1f} ms  {timeouts} timeouts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Стоимость аутентификации запроса: get_current_user без кэша пользователей
+(разбор JWT и запрос к users на каждый запрос) и с кэшем по токену
+(backend/services/principal_cache.py) — запросы в секунду и число
+SQL-запросов на один HTTP-запрос. Приложение работает на временной
+SQLite-базе через TestClient, без обработчика задач.
+
+    python -m benchmarks.bench_auth --requests 2000
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/bench.db")
+os.environ.setdefault("UPLOADS_DIR", f"{_tmp}/uploads")
+os.environ.setdefault("RESULTS_DIR", f"{_tmp}/results")
+os.environ.setdefault("CACHE_DIR", f"{_tmp}/cache")
+os.environ["WORKER_ENABLED"] = "0"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from backend.main import app  # noqa: E402
+from backend.services import database  # noqa: E402
+from backend.services.principal_cache import principal_cache  # noqa: E402
+
+PATHS = ("/api/auth/check", "/")
+
+
+def measure(client: TestClient, path: str, requests: int, counter: dict) -> tuple:
+    counter["queries"] = 0
+    # Отладочный вывод приложения на каждый запрос не входит в измерение
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = client.get(path)
+            assert response.status_code == 200, response.text
+        elapsed = time.perf_counter() - started
+    return requests / elapsed, counter["queries"] / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    database.engine.echo = False
+    counter = {"queries": 0}
+    event.listen(database.engine, "before_cursor_execute",
+                 lambda *_: counter.__setitem__("queries", counter["queries"] + 1))
+
+    with TestClient(app) as client:
+        with contextlib.redirect_stdout(io.StringIO()):
+            client.post("/api/auth/register", json={"username": "bench", "email": "bench@example.org", "password": "bench"})
+            client.post("/api/auth/login", data={"username": "bench", "password": "bench"}, follow_redirects=False)
+        ttl = principal_cache.ttl
+        for label, cache_ttl in (("no cache", 0), ("cache", ttl or 60)):
+            principal_cache.clear()
+            principal_cache.ttl = cache_ttl
+            for path in PATHS:
+                rate, queries = measure(client, path, args.requests, counter)
+                print(f"{label:<9} {path:<16} {rate:8.0f} req/s  {queries:4.2f} SQL queries/request")
+        principal_cache.ttl = ttl
+
+
+if __name__ == "__main__":
+    main()
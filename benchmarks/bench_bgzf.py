@@ -0,0 +1,83 @@
+"""
+Распаковка FASTQ: обычный gzip через gzip.open (последовательно)
+против BGZF с индексом (backend/pipeline/bgzf.py) — блоки в пуле потоков
+одного процесса и диапазоны блоков в отдельных процессах.
+
+    python -m benchmarks.bench_bgzf --reads 1000000 --threads 4
+"""
+import argparse
+import gzip
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from backend.pipeline.bgzf import BgzfReader, reencode
+from .bench_filtering import make_fastq
+
+READ_SIZE = 4 * 1024 * 1024
+
+
+def read_gzip(path: Path) -> int:
+    total = 0
+    with gzip.open(path, "rb") as f:
+        while True:
+            chunk = f.read(READ_SIZE)
+            if not chunk:
+                return total
+            total += len(chunk)
+
+
+def read_bgzf(path: Path, threads: int) -> int:
+    with BgzfReader(path, threads=threads) as reader:
+        return sum(len(chunk) for chunk in reader.iter_range(0, reader.size))
+
+
+def read_bgzf_range(path: str, start: int, end: int) -> int:
+    with BgzfReader(path) as reader:
+        return sum(len(chunk) for chunk in reader.iter_range(start, end))
+
+
+def read_bgzf_processes(path: Path, processes: int) -> int:
+    with BgzfReader(path) as reader:
+        size = reader.size
+    bounds = [size * i // processes for i in range(processes + 1)]
+    with ProcessPoolExecutor(processes) as pool:
+        return sum(pool.map(read_bgzf_range, [str(path)] * processes, bounds[:-1], bounds[1:]))
+
+
+def measure(label: str, func, *args) -> int:
+    started = time.perf_counter()
+    total = func(*args)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:8.3f} s  {total / elapsed / 1e6:8.1f} MB/s")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reads", type=int, default=300_000)
+    parser.add_argument("--length", type=int, default=250)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data = make_fastq(args.reads, args.length)
+        plain_gzip = Path(tmp) / "input.fastq.gz"
+        plain_gzip.write_bytes(gzip.compress(data, compresslevel=6))
+        blocked = Path(tmp) / "input.bgzf.gz"
+
+        started = time.perf_counter()
+        reencode(plain_gzip, blocked, threads=args.threads)
+        print(f"{len(data) / 1e6:.1f} MB uncompressed, gzip {plain_gzip.stat().st_size / 1e6:.1f} MB, "
+              f"BGZF {blocked.stat().st_size / 1e6:.1f} MB (re-encoded in {time.perf_counter() - started:.2f} s)")
+
+        expected = len(data)
+        assert measure("gzip.open", read_gzip, plain_gzip) == expected
+        assert measure("bgzf, 1 thread", read_bgzf, blocked, 1) == expected
+        assert measure(f"bgzf, {args.threads} threads", read_bgzf, blocked, args.threads) == expected
+        assert measure(f"bgzf, {args.threads} processes", read_bgzf_processes, blocked, args.threads) == expected
+
+
+if __name__ == "__main__":
+    main()
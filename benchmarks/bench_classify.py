@@ -0,0 +1,69 @@
+"""
+Классификатор по k-мерам (backend/pipeline/classify.py): пакетная оценка
+против оценки запросов по одному с теми же таблицами и тем же бутстрэпом.
+
+    python -m benchmarks.bench_classify --taxa 2000 --queries 5000
+"""
+import argparse
+import random
+import tempfile
+import time
+from backend.pipeline.classify import KmerClassifier, build_tables
+
+
+def make_reference(taxa: int, per_taxon: int, length: int, rng: random.Random):
+    records, cores = [], []
+    for t in range(taxa):
+        core = "".join(rng.choices("ACGT", k=length))
+        cores.append(core)
+        lineage = f"d__Bacteria;p__P{t % 10};c__C{t % 50};o__O{t % 200};g__G{t}"
+        for _ in range(per_taxon):
+            records.append((mutate(core, 0.03, rng).encode(), lineage))
+    return records, cores
+
+
+def mutate(sequence: str, rate: float, rng: random.Random) -> str:
+    return "".join(rng.choice("ACGT") if rng.random() < rate else base for base in sequence)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--taxa", type=int, default=500)
+    parser.add_argument("--per-taxon", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--length", type=int, default=250)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    records, cores = make_reference(args.taxa, args.per_taxon, 1400, rng)
+    queries, truth = [], []
+    for _ in range(args.queries):
+        t = rng.randrange(args.taxa)
+        start = rng.randrange(len(cores[t]) - args.length)
+        queries.append(mutate(cores[t][start:start + args.length], 0.01, rng).encode())
+        truth.append(f"g__G{t}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        build_tables(records, tmp)
+        print(f"{len(records)} reference sequences, {args.taxa} taxa: tables built in {time.perf_counter() - started:.2f} s")
+        classifier = KmerClassifier(tmp)
+
+        started = time.perf_counter()
+        batched = classifier.classify(queries)
+        elapsed = time.perf_counter() - started
+        print(f"{'batched':<12} {elapsed:8.2f} s  {len(queries) / elapsed:10.0f} queries/s")
+
+        count = max(1, len(queries) // 10)
+        started = time.perf_counter()
+        single = [classifier.classify([query])[0] for query in queries[:count]]
+        elapsed = time.perf_counter() - started
+        print(f"{'one by one':<12} {elapsed:8.2f} s  {count / elapsed:10.0f} queries/s  ({count} queries)")
+
+        assert [(a.lineage, a.confidence) for a in single] == [(a.lineage, a.confidence) for a in batched[:count]]
+        correct = sum(a.lineage[-1] == t for a, t in zip(batched, truth))
+        print(f"genus assigned correctly for {correct / len(queries):.1%} of queries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Дерепликация ампликонов: словарь Python по строкам последовательностей
+против упакованной таблицы backend/pipeline/derep.py — время и пиковая
+память (tracemalloc), в том числе с бюджетом памяти, вынуждающим сброс на диск.
+
+    python -m benchmarks.bench_derep --reads 2000000 --variants 20000
+"""
+import argparse
+import random
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from backend.pipeline.derep import DerepTable, iter_uniques, merge_tables
+from backend.pipeline.fastq import iter_batches
+
+
+def make_amplicons(reads: int, variants: int, length: int, seed: int = 1) -> bytes:
+    """Численности вариантов по закону Ципфа плюс единичные ошибки секвенирования"""
+    rng = random.Random(seed)
+    sequences = ["".join(rng.choices("ACGT", k=length)) for _ in range(variants)]
+    weights = [1 / (i + 1) for i in range(variants)]
+    quality = "I" * length
+    lines = []
+    for i, sequence in enumerate(rng.choices(sequences, weights, k=reads)):
+        if rng.random() < 0.2:
+            position = rng.randrange(length)
+            sequence = sequence[:position] + rng.choice("ACGTN") + sequence[position + 1:]
+        lines.append(f"@read{i}\n{sequence}\n+\n{quality}\n")
+    return "".join(lines).encode()
+
+
+def naive_derep(path: Path) -> Counter:
+    counts = Counter()
+    with open(path) as f:
+        for i, line in enumerate(f):
+            if i % 4 == 1:
+                counts[line.rstrip("\n").upper()] += 1
+    return counts
+
+
+def table_derep(path: Path, work_dir: Path, memory_budget: int) -> dict:
+    table = DerepTable(work_dir / "table", memory_budget)
+    for batch in iter_batches(path):
+        table.add(batch)
+    stats = table.finish()
+    merged = merge_tables([table.spill_dir], work_dir / "uniques.fasta", memory_budget)
+    merged.merge(stats)
+    return {sequence.decode(): size for _, size, sequence in iter_uniques(work_dir / "uniques.fasta")}, merged
+
+
+def measure(label: str, func, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<34} {elapsed:8.2f} s  peak {peak / 1e6:8.1f} MB")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reads", type=int, default=500_000)
+    parser.add_argument("--variants", type=int, default=5_000)
+    parser.add_argument("--length", type=int, default=250)
+    parser.add_argument("--small-budget", type=int, default=4 * 1024 * 1024)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "amplicons.fastq"
+        path.write_bytes(make_amplicons(args.reads, args.variants, args.length))
+        print(f"{args.reads} reads, {path.stat().st_size / 1e6:.1f} MB")
+
+        expected = measure("dict[str]", naive_derep, path)
+        for label, budget in (("packed table", 1 << 40), (f"packed table, {args.small_budget >> 20} MiB", args.small_budget)):
+            work_dir = Path(tmp) / str(budget)
+            work_dir.mkdir()
+            uniques, stats = measure(label, table_derep, path, work_dir, budget)
+            assert uniques == dict(expected), "dereplication differs from dict"
+            print(f"{'':<34} {stats.uniques} uniques, {stats.spills} spills, {stats.spilled_bytes / 1e6:.1f} MB spilled")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Сравнение векторизованного фильтра (backend/pipeline/filtering.py)
+с наивной реализацией, обрабатывающей прочтения по одному.
+Векторизованная версия быстрее наивной в 2–3 раза, но это сотни тысяч
+прочтений в секунду на ядро, а не миллионы: каждая пачка — несколько
+проходов numpy по всему буферу (выборка вероятностей ошибки, суммы по
+окнам через reduceat), и скорость упирается в память.
+
+    python -m benchmarks.bench_filtering --reads 500000 --length 250
+"""
+import argparse
+import io
+import random
+import time
+from backend.pipeline.filtering import FilterParams, filter_stream
+from backend.pipeline.qc import ERROR_PROBABILITY
+
+# Те же значения вероятностей, что и в векторизованной версии, чтобы сравнение было точным
+ERROR_TABLE = [float(p) for p in ERROR_PROBABILITY]
+
+
+def make_fastq(reads: int, length: int, seed: int = 1) -> bytes:
+    rng = random.Random(seed)
+    bases = "ACGT" * 20 + "N"
+    lines = []
+    for i in range(reads):
+        read_length = rng.randint(length // 2, length)
+        sequence = "".join(rng.choices(bases, k=read_length))
+        # Качество падает к концу прочтения, как в реальных данных Illumina
+        quality = "".join(chr(33 + max(2, 40 - j // 8 - rng.randint(0, 10))) for j in range(read_length))
+        lines.append(f"@read{i}\n{sequence}\n+\n{quality}\n")
+    return "".join(lines).encode()
+
+
+def naive_filter(data: bytes, params: FilterParams) -> bytes:
+    out = []
+    lines = data.split(b"\n")
+    for i in range(0, len(lines) - 3, 4):
+        name, sequence, quality = lines[i][1:], lines[i + 1], lines[i + 3]
+        end = len(sequence) if params.trim_after_base is None else min(len(sequence), params.trim_after_base)
+        sequence = sequence[params.trim_first_bases:end]
+        quality = quality[params.trim_first_bases:end]
+        if params.truncq is not None:
+            for j, q in enumerate(quality):
+                if q - 33 <= params.truncq:
+                    sequence, quality = sequence[:j], quality[:j]
+                    break
+        if len(sequence) < max(params.minlen, 1):
+            continue
+        if params.maxns is not None and sequence.upper().count(b"N") > params.maxns:
+            continue
+        if params.max_ambiguous is not None and sum(b not in b"ACGTacgt" for b in sequence) > params.max_ambiguous:
+            continue
+        if params.maxee is not None and sum(ERROR_TABLE[q] for q in quality) > params.maxee:
+            continue
+        if params.min_quality is not None and sum(q - 33 for q in quality) < params.min_quality * len(quality):
+            continue
+        out.append(b"@" + name + b"\n" + sequence + b"\n+\n" + quality + b"\n")
+    return b"".join(out)
+
+
+def vectorized_filter(data: bytes, params: FilterParams) -> bytes:
+    out = io.BytesIO()
+    filter_stream(io.BytesIO(data), out, params)
+    return out.getvalue()
+
+
+def measure(label: str, func, data: bytes, params: FilterParams, reads: int) -> bytes:
+    started = time.perf_counter()
+    result = func(data, params)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<12} {elapsed:8.3f} s  {reads / elapsed / 1e6:8.3f} M reads/s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reads", type=int, default=200_000)
+    parser.add_argument("--length", type=int, default=250)
+    args = parser.parse_args()
+
+    params = FilterParams(min_quality=20, max_ambiguous=2, minlen=100, maxns=1, maxee=2.0,
+                          trim_first_bases=10, trim_after_base=240, truncq=2)
+    data = make_fastq(args.reads, args.length)
+    print(f"{args.reads} reads, {len(data) / 1e6:.1f} MB")
+
+    vectorized = measure("vectorized", vectorized_filter, data, params, args.reads)
+    naive = measure("naive", naive_filter, data, params, args.reads)
+    assert vectorized == naive, "vectorized and naive outputs differ"
+    kept = vectorized.count(b"\n") // 4
+    print(f"outputs identical, {kept} reads kept")
+
+
+if __name__ == "__main__":
+    main()
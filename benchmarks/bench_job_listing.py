@@ -0,0 +1,131 @@
+"""
+Список задач пользователя с тысячами задач: прежний ответ со всеми
+задачами (json.loads(parameters) на каждую строку) против первой страницы
+keyset-пагинации по индексу (user_id, id) и полного обхода
+страниц по next_cursor. Приложение работает на временной SQLite-базе
+через TestClient, без обработчика задач.
+
+    python -m benchmarks.bench_job_listing --jobs 5000 --limit 50
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/bench.db")
+os.environ.setdefault("UPLOADS_DIR", f"{_tmp}/uploads")
+os.environ.setdefault("RESULTS_DIR", f"{_tmp}/results")
+os.environ.setdefault("CACHE_DIR", f"{_tmp}/cache")
+os.environ["WORKER_ENABLED"] = "0"
+
+from fastapi import APIRouter, Depends  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from backend.main import app  # noqa: E402
+from backend.dependencies import get_current_user  # noqa: E402
+from backend.models.db_models import AnalysisJob, User  # noqa: E402
+from backend.models.user import UserInDB  # noqa: E402
+from backend.services import database  # noqa: E402
+
+# Прежний обработчик: все задачи пользователя, имя анализа из JSON параметров
+legacy = APIRouter(prefix="/bench/legacy")
+
+
+@legacy.get("/jobs")
+async def legacy_jobs(current_user: UserInDB = Depends(get_current_user), db: Session = Depends(database.get_db)):
+    jobs = db.query(AnalysisJob).filter(
+        AnalysisJob.user_id == current_user.id
+    ).order_by(AnalysisJob.created_at.desc()).all()
+    return {
+        "jobs": [
+            {
+                "job_id": job.job_id,
+                "type": job.type,
+                "status": job.status,
+                "created_at": job.created_at.isoformat() if job.created_at else None,
+                "completed_at": job.completed_at.isoformat() if job.completed_at else None,
+                "analysis_name": json.loads(job.parameters).get("analysis_name") if job.parameters else None
+            }
+            for job in jobs
+        ]
+    }
+
+
+def seed(jobs: int):
+    db = database.SessionLocal()
+    try:
+        user_id = db.query(User.id).filter(User.username == "bench").scalar()
+        started = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        # Параметры типичного размера: разбор JSON стоит столько же, сколько в настоящих задачах
+        params = {"minlen": 150, "maxns": 5, "maxee": 2.0, "classifier": "naive-bayes",
+                  "reference_sequences": "silva", "reference_db": "gtdb", "adapter_sequence": "AGATCGGAAGAGC" * 3}
+        db.add_all(AnalysisJob(job_id=f"bench-{i:06d}", user_id=user_id, type=("illumina", "nanopore")[i % 2],
+                               file_path="", status=("completed", "failed", "pending")[i % 3],
+                               created_at=started + timedelta(minutes=i), analysis_name=f"run {i}",
+                               parameters=json.dumps({**params, "analysis_name": f"run {i}"}))
+                   for i in range(jobs))
+        db.commit()
+    finally:
+        db.close()
+
+
+def timed(client: TestClient, path: str, repeat: int) -> tuple:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        response = client.get(path)
+        assert response.status_code == 200, response.text
+    return (time.perf_counter() - started) / repeat * 1000, response.json()
+
+
+def walk(client: TestClient, limit: int) -> tuple:
+    """Все страницы по next_cursor: время и число задач"""
+    started = time.perf_counter()
+    seen = 0
+    cursor = None
+    while True:
+        path = f"/api/analysis/jobs?limit={limit}" + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(path).json()
+        seen += len(body["jobs"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return (time.perf_counter() - started) * 1000, seen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=50, help="page size")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    database.engine.echo = False
+    database.async_engine.echo = False
+    app.include_router(legacy)
+    with TestClient(app) as client:
+        # Отладочный вывод приложения на каждый запрос не входит в измерение
+        with contextlib.redirect_stdout(io.StringIO()):
+            client.post("/api/auth/register", json={"username": "bench", "email": "bench@example.org", "password": "bench"})
+            client.post("/api/auth/login", data={"username": "bench", "password": "bench"}, follow_redirects=False)
+            seed(args.jobs)
+            rows = [
+                ("all jobs (legacy)", *timed(client, "/bench/legacy/jobs", args.repeat)),
+                ("first page", *timed(client, f"/api/analysis/jobs?limit={args.limit}", args.repeat)),
+                ("first page, status=failed",
+                 *timed(client, f"/api/analysis/jobs?limit={args.limit}&status=failed", args.repeat)),
+            ]
+            walk_ms, seen = walk(client, args.limit)
+
+    print(f"{args.jobs} jobs, page size {args.limit}")
+    for label, ms, body in rows:
+        print(f"{label:<27} {ms:8.2f} ms/request  {len(body['jobs']):5d} jobs")
+    assert seen == args.jobs
+    print(f"{'all pages by cursor':<27} {walk_ms:8.2f} ms total  {seen:5d} jobs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Задержка страниц во время волны входов в систему: bcrypt прямо в цикле
+событий (как раньше) против пула потоков PasswordHasher
+(backend/services/password.py). Приложение запускается uvicorn на
+локальном порту с временной SQLite-базой; один клиент открывает главную
+страницу, --logins клиентов одновременно входят в систему.
+
+    python -m benchmarks.bench_login_storm --logins 16 --seconds 5
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import socket
+import tempfile
+import threading
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/bench.db")
+os.environ.setdefault("UPLOADS_DIR", f"{_tmp}/uploads")
+os.environ.setdefault("RESULTS_DIR", f"{_tmp}/results")
+os.environ.setdefault("CACHE_DIR", f"{_tmp}/cache")
+os.environ["WORKER_ENABLED"] = "0"
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+import uvicorn  # noqa: E402
+from backend.main import app  # noqa: E402
+from backend.services import database, password  # noqa: E402
+
+
+class InlineHasher:
+    """Прежнее поведение: хэш считается в самом обработчике запроса"""
+
+    async def run(self, func, *args):
+        return func(*args)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def page_latencies(client: httpx.AsyncClient, stop: asyncio.Event) -> list:
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/")
+        assert response.status_code == 200
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+    return latencies
+
+
+async def login_loop(base_url: str, stop: asyncio.Event) -> int:
+    logins = 0
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        while not stop.is_set():
+            await client.post("/api/auth/login", data={"username": "bench", "password": "bench"})
+            logins += 1
+    return logins
+
+
+async def phase(base_url: str, logins: int, seconds: float) -> tuple:
+    stop = asyncio.Event()
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        pages = asyncio.create_task(page_latencies(client, stop))
+        storm = [asyncio.create_task(login_loop(base_url, stop)) for _ in range(logins)]
+        await asyncio.sleep(seconds)
+        stop.set()
+        latencies = np.array(await pages) * 1000
+        done = sum(await asyncio.gather(*storm))
+    return np.percentile(latencies, 50), np.percentile(latencies, 99), latencies.max(), done
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=16, help="concurrent login clients")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    database.engine.echo = False
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    results = []
+    # Отладочный вывод приложения на каждый запрос не входит в измерение
+    with contextlib.redirect_stdout(io.StringIO()):
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+        httpx.post(f"{base_url}/api/auth/register",
+                   json={"username": "bench", "email": "bench@example.org", "password": "bench"})
+        executor = password.hasher
+        for label, hasher, logins in (("idle", executor, 0), ("inline", InlineHasher(), args.logins),
+                                      ("executor", executor, args.logins)):
+            password.hasher = hasher
+            results.append((label, logins, *asyncio.run(phase(base_url, logins, args.seconds))))
+        password.hasher = executor
+        server.should_exit = True
+        thread.join()
+
+    for label, logins, p50, p99, worst, done in results:
+        print(f"{label:<9} {logins:3d} login clients  page p50 {p50:7.1f} ms  p99 {p99:7.1f} ms  "
+              f"max {worst:7.1f} ms  {done / args.seconds:5.1f} logins/s")
+    print(executor.metrics())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Длинные прочтения Nanopore: пачки по объёму сырых байтов против пачек
+с ограничением по числу оснований (backend/pipeline/batches.py) — время
+и пиковая память обработки пачки (обрезка, фильтрация, QC, дерепликация).
+
+    python -m benchmarks.bench_longreads --reads 4000 --mean-length 8000 --batch-bytes 33554432
+"""
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from backend.pipeline.batches import DEFAULT_BATCH_BASES, DEFAULT_MEMORY_SAMPLE, BatchMeter, iter_base_batches
+from backend.pipeline.derep import DerepTable
+from backend.pipeline.fastq import DEFAULT_BATCH_BYTES, iter_batches
+from backend.pipeline.filtering import FilterParams, FilterStats, filter_batch, format_fastq
+from backend.pipeline.qc import QcAccumulator
+
+
+def write_reads(path: Path, reads: int, mean_length: int, seed: int = 1):
+    """Длины по логнормальному распределению, как у прочтений Nanopore: от сотен оснований до ~20 средних"""
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        for i in range(reads):
+            length = max(200, min(int(rng.lognormvariate(0, 0.9) * mean_length / 1.5), 20 * mean_length))
+            sequence = "".join(rng.choices("ACGT", k=length))
+            quality = "".join(rng.choices("+-5:?", k=length))
+            f.write(f"@read{i}\n{sequence}\n+\n{quality}\n")
+
+
+def run(label: str, batches, params: FilterParams, work_dir: Path, sample_every: int):
+    stats = FilterStats()
+    qc = QcAccumulator(params.maxee)
+    derep = DerepTable(work_dir / label, 512 * 1024 * 1024)
+    started = time.perf_counter()
+    meter = BatchMeter(sample_every)
+    with open(work_dir / f"{label}.fastq", "wb") as out:
+        for batch in batches:
+            with meter.measure(batch):
+                passed = filter_batch(batch, params, stats)
+                qc.update(passed)
+                derep.add(passed)
+                out.write(format_fastq(passed))
+    elapsed = time.perf_counter() - started
+    batch_stats = meter.stats
+    print(f"{label:<8} {elapsed:7.2f} s  {stats.bases_in / elapsed / 1e6:7.1f} M bases/s  "
+          f"{batch_stats.batches:5d} batches  max {batch_stats.max_bases / 1e6:6.2f} M bases  "
+          f"peak {batch_stats.peak_bytes / 1e6:8.1f} MB/batch ({batch_stats.measured} measured)")
+    derep.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reads", type=int, default=5_000)
+    parser.add_argument("--mean-length", type=int, default=8_000)
+    parser.add_argument("--batch-bytes", type=int, default=DEFAULT_BATCH_BYTES)
+    parser.add_argument("--batch-bases", type=int, default=DEFAULT_BATCH_BASES)
+    parser.add_argument("--memory-sample", type=int, default=DEFAULT_MEMORY_SAMPLE,
+                        help="measure memory of every N-th batch (1 = all, 0 = none)")
+    args = parser.parse_args()
+
+    params = FilterParams(min_quality=10, minlen=500, maxns=5, maxee=None, trim_first_bases=80)
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        path = work_dir / "reads.fastq"
+        write_reads(path, args.reads, args.mean_length)
+        print(f"{args.reads} reads, {path.stat().st_size / 1e6:.1f} MB")
+        run("bytes", iter_batches(path, args.batch_bytes, validate=False), params, work_dir,
+            args.memory_sample)
+        run("bases", iter_base_batches(iter_batches(path, args.batch_bytes, validate=False), args.batch_bases),
+            params, work_dir, args.memory_sample)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Стоимость учёта запроса в MetricsMiddleware (backend/services/metrics.py):
+один и тот же минимальный ASGI-обработчик вызывается напрямую и через
+middleware, без сети и сервера, — разница и есть накладные расходы
+метрик на запрос. Дополнительно — время сбора /metrics при заданном
+числе рядов гистограммы.
+
+    python -m benchmarks.bench_metrics --requests 200000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/bench.db")
+os.environ.setdefault("UPLOADS_DIR", f"{_tmp}/uploads")
+os.environ.setdefault("RESULTS_DIR", f"{_tmp}/results")
+os.environ.setdefault("CACHE_DIR", f"{_tmp}/cache")
+os.environ["WORKER_ENABLED"] = "0"
+
+from prometheus_client import generate_latest  # noqa: E402
+from backend.services.metrics import MetricsMiddleware, registry, request_metrics  # noqa: E402
+
+
+class Routes:
+    """Заменяет приложение FastAPI в scope: middleware ищет шаблон маршрута по endpoint"""
+
+    def __init__(self, routes: int):
+        self.routes = [type("Route", (), {"endpoint": i, "path": f"/route/{i}"})() for i in range(routes)]
+
+
+async def endpoint(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def receive():
+    return {"type": "http.request"}
+
+
+async def send(message):
+    pass
+
+
+async def measure(app, scopes: list, requests: int) -> float:
+    started = time.perf_counter()
+    for i in range(requests):
+        await app(scopes[i % len(scopes)], receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--routes", type=int, default=30)
+    args = parser.parse_args()
+
+    routes = Routes(args.routes)
+    scopes = [{"type": "http", "method": "GET", "app": routes, "endpoint": i % args.routes} for i in range(args.routes)]
+    bare = asyncio.run(measure(endpoint, scopes, args.requests))
+    metered = asyncio.run(measure(MetricsMiddleware(endpoint), scopes, args.requests))
+    print(f"{args.requests} requests over {args.routes} routes")
+    print(f"without metrics  {bare:6.2f} us/request")
+    print(f"with metrics     {metered:6.2f} us/request  (+{metered - bare:.2f} us)")
+
+    started = time.perf_counter()
+    size = len(generate_latest(registry))
+    print(f"scrape           {(time.perf_counter() - started) * 1000:6.2f} ms  "
+          f"{len(request_metrics.histograms)} series, {size} bytes")
+
+
+if __name__ == "__main__":
+    main()
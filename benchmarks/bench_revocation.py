@@ -0,0 +1,67 @@
+"""
+Проверка отозванного токена на каждый запрос: прежний чёрный список
+(словарь пересобирается без истёкших записей перед каждой проверкой)
+против RevocationStore (backend/services/revocation.py) в памяти и
+с общей таблицей в SQLite — проверок в секунду при разном числе отзывов.
+
+    python -m benchmarks.bench_revocation --revoked 1000 10000 100000
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from datetime import datetime, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend.models.db_models import Base
+from backend.services.revocation import RevocationStore
+
+
+class RebuiltBlacklist:
+    """Прежняя реализация: словарь токен -> срок, очистка полной пересборкой"""
+
+    def __init__(self):
+        self.tokens = {}
+
+    async def revoke(self, token: str, expires_at: float):
+        self.tokens[token] = datetime.fromtimestamp(expires_at, timezone.utc)
+
+    async def is_revoked(self, token: str) -> bool:
+        now = datetime.now(timezone.utc)
+        self.tokens = {k: v for k, v in self.tokens.items() if v > now}
+        return token in self.tokens
+
+
+async def measure(label: str, store, revoked: int, checks: int):
+    now = time.time()
+    for i in range(revoked):
+        await store.revoke(f"token-{i}", now + 3600)
+    started = time.perf_counter()
+    found = 0
+    # Половина проверяемых токенов не отозвана
+    for i in range(checks):
+        found += await store.is_revoked(f"token-{i % (2 * revoked)}")
+    elapsed = time.perf_counter() - started
+    print(f"{label:<10} {revoked:8d} revoked  {checks / elapsed:12.0f} checks/s  ({found} revoked hits)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--revoked", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--checks", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        Base.metadata.create_all(engine)
+        session_factory = sessionmaker(bind=engine)
+        for revoked in args.revoked:
+            # Пересборка линейна по числу отзывов: проверок меньше, чтобы замер шёл секунды
+            asyncio.run(measure("rebuilt", RebuiltBlacklist(), revoked, max(10, args.checks * 100 // revoked)))
+            asyncio.run(measure("memory", RevocationStore(), revoked, args.checks))
+        # Каждый отзыв — транзакция в таблице, поэтому отзывов меньше
+        asyncio.run(measure("database", RevocationStore(session_factory, sync_interval=0.1), 1000, args.checks))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Масштабирование обработки одного FASTQ-файла по числу процессов
+(шарды по границам записей, backend/pipeline/sharding.py).
+Заодно проверяется, что вывод не зависит от числа шардов.
+
+    python -m benchmarks.bench_sharding --reads 2000000 --length 250
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from backend.pipeline.runner import FILTERED_FILE, merge_shards, run_shard
+from backend.pipeline.sharding import plan_shards
+from .bench_filtering import make_fastq
+
+PARAMETERS = {"min_quality": 20, "max_ambiguous": 2, "minlen": 100, "maxns": 1, "maxee": 2.0}
+
+
+def run(path: Path, output_dir: Path, processes: int) -> float:
+    started = time.perf_counter()
+    shards = plan_shards(path, processes, min_shard_bytes=1024 * 1024)
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(run_shard, "illumina", path, PARAMETERS, shard, output_dir) for shard in shards]
+        merge_shards("illumina", [f.result() for f in futures], output_dir)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reads", type=int, default=500_000)
+    parser.add_argument("--length", type=int, default=250)
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "input.fastq"
+        path.write_bytes(make_fastq(args.reads, args.length))
+        print(f"{args.reads} reads, {path.stat().st_size / 1e6:.1f} MB, {os.cpu_count()} CPUs")
+
+        reference, baseline = None, None
+        processes = 1
+        while processes <= args.max_processes:
+            output_dir = Path(tmp) / f"out{processes}"
+            elapsed = run(path, output_dir, processes)
+            output = (output_dir / FILTERED_FILE).read_bytes()
+            reference = reference if reference is not None else output
+            baseline = baseline or elapsed
+            assert output == reference, f"output with {processes} processes differs"
+            print(f"{processes:3d} processes  {elapsed:8.3f} s  {args.reads / elapsed / 1e6:6.3f} M reads/s"
+                  f"  speedup {baseline / elapsed:5.2f}x")
+            processes *= 2
+        print("outputs identical for all shard counts")
+
+
+if __name__ == "__main__":
+    main()
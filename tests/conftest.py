@@ -0,0 +1,62 @@
+"""
+Общие фикстуры: приложение на временной SQLite-базе и временных каталогах,
+без обработчика задач. Переменные окружения задаются до импорта backend,
+так как backend.config читает их при импорте.
+"""
+import contextlib
+import io
+import os
+import tempfile
+import uuid
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["UPLOADS_DIR"] = f"{_tmp}/uploads"
+os.environ["RESULTS_DIR"] = f"{_tmp}/results"
+os.environ["CACHE_DIR"] = f"{_tmp}/cache"
+os.environ["REFERENCE_DIR"] = f"{_tmp}/references"
+os.environ["WORKER_ENABLED"] = "0"
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from backend.main import app  # noqa: E402
+from backend.models.db_models import User  # noqa: E402
+from backend.services import database  # noqa: E402
+
+database.engine.echo = False
+database.async_engine.echo = False
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_db()
+
+
+@pytest.fixture
+def db():
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client() -> TestClient:
+    """Клиент, вошедший под новым пользователем; его id — client.user_id"""
+    client = TestClient(app)
+    username = f"user-{uuid.uuid4().hex[:12]}"
+    with contextlib.redirect_stdout(io.StringIO()):
+        client.post("/api/auth/register", json={"username": username, "email": f"{username}@example.org",
+                                                "password": "secret"})
+        response = client.post("/api/auth/login", data={"username": username, "password": "secret"},
+                               follow_redirects=False)
+    assert response.status_code == 303, response.text
+    session = database.SessionLocal()
+    try:
+        client.user_id = session.query(User.id).filter(User.username == username).scalar()
+    finally:
+        session.close()
+    return client
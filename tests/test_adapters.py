@@ -0,0 +1,144 @@
+import random
+import pytest
+from backend.pipeline.adapters import ADAPTERS, IUPAC, MAX_PATTERN, AdapterTrimmer, TrimParams, reverse_complement
+from backend.pipeline.fastq import parse_records
+
+ADAPTER = ADAPTERS["default"]
+PRIMER_FORWARD = "GTGYCAGCMGCCGCGGTAA"
+PRIMER_REVERSE = "GGACTACNVGGGTWTCTAAT"
+
+
+def trim(reads: list, **params) -> list:
+    data = b"".join(b"@r%d\n%s\n+\n%s\n" % (i, read.encode(), b"I" * len(read)) for i, read in enumerate(reads))
+    batch, _ = parse_records(data, final=True)
+    trimmed = AdapterTrimmer(TrimParams(**params)).trim(batch)
+    raw = bytes(trimmed.data)
+    return [raw[start:start + length].decode() for start, length in zip(trimmed.seq_start, trimmed.lengths)]
+
+
+def matches(base: str, read_base: str) -> bool:
+    return read_base in IUPAC[base]
+
+
+def distances(pattern: str, text: str, anchored: bool) -> list:
+    """Расстояние шаблона до текста, кончающегося в каждом столбце (полная матрица)"""
+    column = list(range(len(pattern) + 1))
+    result = []
+    for char in text:
+        new = [column[0] + 1 if anchored else 0]
+        for i, base in enumerate(pattern, 1):
+            new.append(min(column[i - 1] + (not matches(base, char)), column[i] + 1, new[i - 1] + 1))
+        column = new
+        result.append(column)
+    return result
+
+
+def naive_cut(read: str, adapter: str, error_rate: float, min_overlap: int) -> int:
+    m = len(adapter)
+    k = int(error_rate * m)
+    columns = distances(adapter, read, anchored=False)
+    scores = [column[m] for column in columns]
+    first = next((j for j, score in enumerate(scores) if score <= k), None)
+    if first is None:
+        # Самый длинный префикс адаптера на конце прочтения
+        last = columns[-1] if columns else [0] * (m + 1)
+        for i in range(min(m - 1, len(read)), min_overlap - 1, -1):
+            if last[i] <= int(error_rate * i):
+                return len(read) - i
+        return len(read)
+    end = min(range(first, min(first + k, len(read) - 1) + 1), key=lambda j: (scores[j], j))
+    # Начало — выравнивание перевёрнутого адаптера от конца вхождения влево
+    span = min(end + 1, m + k)
+    back = [column[m] for column in distances(adapter[::-1], read[end::-1][:span], anchored=True)]
+    candidates = [t for t in range(max(1, m - k), span + 1) if back[t - 1] <= k]
+    if candidates:
+        consumed = min(candidates, key=lambda t: (back[t - 1], t))
+    else:
+        consumed = min(m, end + 1)
+    return end + 1 - consumed
+
+
+def mutate(sequence: str, rng: random.Random, rate: float) -> str:
+    out = []
+    for base in sequence:
+        roll = rng.random()
+        if roll < rate / 3:
+            out.append(rng.choice("ACGT".replace(base, "")))
+        elif roll < 2 * rate / 3:
+            out.extend((base, rng.choice("ACGT")))
+        elif roll >= rate:
+            out.append(base)
+    return "".join(out)
+
+
+@pytest.mark.parametrize("error_rate", [0.0, 0.1, 0.2])
+def test_3prime_cut_matches_naive_alignment(error_rate):
+    rng = random.Random(7)
+    reads = []
+    for _ in range(400):
+        insert = "".join(rng.choice("ACGTN" if rng.random() < 0.1 else "ACGT") for _ in range(rng.randrange(0, 90)))
+        tail = mutate(ADAPTER + "ACACGTCTGAACTCCAGTCAC", rng, 0.15)[:rng.randrange(0, 40)]
+        reads.append(insert + tail)
+    # Без адаптера и с двумя вхождениями: обрезка по самому левому
+    reads += ["ACGT" * 30, "TTT" + ADAPTER + "GGG" + ADAPTER, ADAPTER, ""]
+
+    trimmed = trim(reads, adapter="default", adapter_error_rate=error_rate)
+    for read, result in zip(reads, trimmed):
+        assert result == read[:naive_cut(read, ADAPTER, error_rate, 3)], read
+
+
+def test_partial_adapter_at_3prime_end():
+    insert = "CCTTGACCATTGCAGTCCATTGACCTAGT"
+    assert trim([insert + ADAPTER[:5]], adapter="default") == [insert]
+    assert trim([insert + ADAPTER[:12]], adapter="default", adapter_error_rate=0.0) == [insert]
+    # Префикс короче min_overlap остаётся
+    assert trim([insert + ADAPTER[:2]], adapter="default") == [insert + ADAPTER[:2]]
+    assert trim([insert + ADAPTER[:4]], adapter="default", adapter_min_overlap=5) == [insert + ADAPTER[:4]]
+
+
+def test_forward_primer_is_anchored():
+    insert = "CCTTGACCATTGCAGTCCATTGACCTAGT"
+    primer = "GTGCCAGCAGCCGCGGTAA"  # вариант вырожденного 515F
+    assert trim([primer + insert], primer_forward=PRIMER_FORWARD) == [insert]
+    # Одна замена в праймере допустима при доле ошибок 0.1
+    assert trim(["GTGCCAGCTGCCGCGGTAA" + insert], primer_forward=PRIMER_FORWARD) == [insert]
+    # Праймер не в начале прочтения не ищется
+    assert trim(["ACGTACGTAC" + primer + insert], primer_forward=PRIMER_FORWARD) == ["ACGTACGTAC" + primer + insert]
+
+
+def test_reverse_primer_is_trimmed_as_reverse_complement():
+    insert = "CCTTGACCATTGCAGTCCATTGACCTAGT"
+    primer = "GGACTACAAGGGTATCTAAT"  # вариант вырожденного 806R
+    reads = [
+        insert + reverse_complement(primer) + ADAPTER + "ACACGTC",
+        insert + reverse_complement(primer),
+        insert + primer,
+    ]
+    trimmed = trim(reads, adapter="default", primer_reverse=PRIMER_REVERSE)
+    assert trimmed == [insert, insert, insert + primer]
+
+
+def test_both_primers_and_adapter():
+    insert = "CCTTGACCATTGCAGTCCATTGACCTAGT"
+    read = "GTGCCAGCAGCCGCGGTAA" + insert + reverse_complement("GGACTACAAGGGTATCTAAT") + ADAPTER + "ACAC"
+    assert trim([read], adapter="default", primer_forward=PRIMER_FORWARD, primer_reverse=PRIMER_REVERSE) == [insert]
+
+
+@pytest.mark.parametrize("params, message", [
+    ({"adapter": "custom"}, "requires an adapter sequence"),
+    ({"adapter": "custom", "adapter_sequence": "  "}, "requires an adapter sequence"),
+    ({"adapter": "truseq"}, "Unknown adapter"),
+    ({"adapter": "default", "adapter_error_rate": 0.5}, "error rate"),
+    ({"adapter": "default", "adapter_error_rate": -0.1}, "error rate"),
+    ({"adapter": "custom", "adapter_sequence": "AGATCXGG"}, "Invalid base"),
+    ({"adapter": "custom", "adapter_sequence": "A" * (MAX_PATTERN + 1)}, "limited to"),
+    ({"primer_forward": "GTG-CAG"}, "Invalid base"),
+])
+def test_invalid_parameters(params, message):
+    with pytest.raises(ValueError, match=message):
+        AdapterTrimmer(TrimParams(**params))
+
+
+def test_custom_adapter():
+    insert = "CCTTGACCATTGCAGTCCATTGACCTAGT"
+    assert trim([insert + "tggaattctcgggtgcc"], adapter="custom", adapter_sequence="UGGAAUUCUCGG") == [insert]
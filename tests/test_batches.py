@@ -0,0 +1,73 @@
+import random
+import tracemalloc
+import numpy as np
+from backend.pipeline.batches import BatchMeter, iter_base_batches
+from backend.pipeline.fastq import iter_batches, parse_records
+from backend.pipeline.runner import run_analysis
+
+
+def fastq(lengths: list) -> bytes:
+    rng = random.Random(3)
+    return b"".join(
+        b"@r%d\n%s\n+\n%s\n" % (i, "".join(rng.choices("ACGT", k=n)).encode(), b"I" * n)
+        for i, n in enumerate(lengths)
+    )
+
+
+def records(batch) -> list:
+    raw = bytes(batch.data)
+    return [raw[s:s + n] for s, n in zip(batch.seq_start, batch.lengths)]
+
+
+def test_batches_are_bounded_by_bases():
+    lengths = [random.Random(i).randrange(100, 5000) for i in range(300)] + [50_000] + [300] * 20
+    batch, _ = parse_records(fastq(lengths), final=True)
+    parts = list(iter_base_batches([batch], 10_000))
+
+    # Записи и их порядок сохраняются, каждая пачка — не больше лимита, кроме прочтения длиннее него
+    assert [r for part in parts for r in records(part)] == records(batch)
+    for part in parts:
+        assert part.total_bases <= 10_000 or len(part) == 1
+    assert [len(part) for part in parts if part.total_bases > 10_000] == [1]
+    # Пачка заполняется до лимита: две соседние не помещаются в одну
+    for a, b in zip(parts, parts[1:]):
+        assert a.total_bases + int(b.lengths[0]) > 10_000
+    # Участок буфера пачки — только её записи
+    for part in parts:
+        assert part.data[0] == ord("@") and len(part.data) == part.qual_start[-1] + part.lengths[-1]
+
+
+def test_meter_samples_memory():
+    batch, _ = parse_records(fastq([1000] * 10), final=True)
+    meter = BatchMeter(sample_every=4)
+    for i in range(10):
+        with meter.measure(batch):
+            if i % 4 == 0:
+                buffer = np.ones(4 * 1024 * 1024, dtype=np.uint8)
+                del buffer
+            assert tracemalloc.is_tracing() == (i % 4 == 0)
+    stats = meter.stats
+    assert (stats.batches, stats.measured, stats.max_reads, stats.max_bases) == (10, 3, 10, 10_000)
+    assert stats.peak_bytes >= 4 * 1024 * 1024 + batch.data.nbytes
+    assert not tracemalloc.is_tracing()
+
+    meter = BatchMeter(sample_every=0)
+    with meter.measure(batch):
+        assert not tracemalloc.is_tracing()
+    assert (meter.stats.batches, meter.stats.measured, meter.stats.peak_bytes) == (1, 0, 0)
+
+
+def test_base_batches_do_not_change_results(tmp_path):
+    path = tmp_path / "reads.fastq"
+    path.write_bytes(fastq([random.Random(i).randrange(200, 6000) for i in range(400)]))
+    parameters = {"minlen": 500, "trim_first_bases": 20}
+
+    plain = run_analysis("nanopore", path, parameters, tmp_path / "plain")
+    batched = run_analysis("nanopore", path, parameters, tmp_path / "batched", batch_bases=20_000, memory_sample=2)
+
+    assert (tmp_path / "plain" / "uniques.fasta").read_bytes() == (tmp_path / "batched" / "uniques.fasta").read_bytes()
+    assert batched["filtering"] == plain["filtering"]
+    assert "batches" not in plain
+    assert batched["batches"]["max_bases"] <= 20_000
+    assert batched["batches"]["batches"] > len(list(iter_batches(path)))
+    assert batched["batches"]["measured"] == (batched["batches"]["batches"] + 1) // 2
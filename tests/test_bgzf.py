@@ -0,0 +1,109 @@
+import gzip
+import hashlib
+import random
+import struct
+import zlib
+from backend.config import UPLOAD_SESSION_MIN_CHUNK
+from backend.pipeline import bgzf
+from backend.pipeline.runner import prepare_input
+from backend.services import blob_store, upload_sessions
+
+
+def fastq(reads: int) -> bytes:
+    records = []
+    for i in range(reads):
+        seq = "".join(random.choice("ACGT") for _ in range(120))
+        records.append(f"@read{i}\n{seq}\n+\n{'I' * 120}\n")
+    return "".join(records).encode()
+
+
+def test_reencode_round_trip_and_index(tmp_path):
+    data = fastq(2000)
+    # Многочленный gzip: каждый член распаковывается отдельным декодером
+    source = tmp_path / "reads.fastq.gz"
+    source.write_bytes(gzip.compress(data[:100_000]) + gzip.compress(data[100_000:]))
+    target = tmp_path / "reads.bgzf.gz"
+
+    assert bgzf.needs_reencode(source)
+    offsets = bgzf.reencode(source, target, threads=2)
+    assert gzip.decompress(target.read_bytes()) == data
+    assert bgzf.is_bgzf(target) and not bgzf.needs_reencode(target)
+    assert len(offsets) > 1 and offsets[0] == (0, 0)
+    assert bgzf.read_index(target) == offsets
+
+    # Каждый блок — отдельный gzip-член не больше 64 КиБ
+    raw = target.read_bytes()
+    starts = [c for c, _ in offsets] + [len(raw) - len(bgzf.EOF_BLOCK)]
+    for (start, uncompressed), end in zip(offsets, starts[1:]):
+        assert end - start <= bgzf.MAX_BLOCK_SIZE
+        assert struct.unpack_from("<H", raw, start + 16)[0] + 1 == end - start
+        block = zlib.decompress(raw[start:end], zlib.MAX_WBITS | 16)
+        assert block == data[uncompressed:uncompressed + bgzf.BLOCK_DATA_SIZE]
+    assert raw.endswith(bgzf.EOF_BLOCK)
+
+    # Индекс по заголовкам блоков совпадает с записанным при перепаковке, плюс пустой блок EOF
+    bgzf.index_path(target).unlink()
+    assert bgzf.build_index(target) == offsets + [(len(raw) - len(bgzf.EOF_BLOCK), len(data))]
+
+    with bgzf.BgzfReader(target, threads=2) as reader:
+        assert reader.size == len(data)
+        for _ in range(50):
+            start = random.randrange(len(data))
+            length = random.randrange(1, 3 * bgzf.BLOCK_DATA_SIZE)
+            assert reader.read(start, length) == data[start:start + length]
+
+
+def test_reencode_rejects_truncated_gzip(tmp_path):
+    source = tmp_path / "reads.fastq.gz"
+    source.write_bytes(gzip.compress(fastq(100))[:-20])
+    target = tmp_path / "reads.bgzf.gz"
+    try:
+        bgzf.reencode(source, target)
+    except bgzf.FastqFormatError:
+        pass
+    else:
+        raise AssertionError("truncated gzip was accepted")
+    assert not target.exists() and not bgzf.index_path(target).exists()
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_prepare_input_never_rewrites_the_file(tmp_path):
+    plain = tmp_path / "plain.fastq.gz"
+    plain.write_bytes(gzip.compress(fastq(50)))
+    blocked = tmp_path / "blocked.fastq.gz"
+    bgzf.reencode(plain, blocked)
+    bgzf.index_path(blocked).unlink()
+    before = {path: path.read_bytes() for path in (plain, blocked)}
+
+    assert not prepare_input(plain)
+    assert prepare_input(blocked)
+    assert bgzf.index_path(blocked).exists() and not bgzf.index_path(plain).exists()
+    assert {path: path.read_bytes() for path in (plain, blocked)} == before
+
+
+def test_gzip_upload_is_stored_as_bgzf(client):
+    data = fastq(300)
+    upload = gzip.compress(data)
+    response = client.post("/api/analysis/nanopore", files={"fastq_file": ("reads.fastq.gz", upload)})
+    assert response.status_code == 200, response.text
+
+    path = blob_store.blob_path(hashlib.sha256(upload).hexdigest())
+    assert bgzf.is_bgzf(path) and bgzf.index_path(path).exists()
+    assert gzip.decompress(path.read_bytes()) == data
+    with bgzf.BgzfReader(path) as reader:
+        assert reader.read(0, len(data)) == data
+    assert not list(blob_store.INCOMING_DIR.glob("*"))
+
+
+def test_gzip_session_upload_is_stored_as_bgzf(client):
+    data = fastq(300)
+    upload = gzip.compress(data)
+    upload_id = client.post("/api/analysis/uploads", json={"filename": "reads.fastq.gz", "size": len(upload),
+                                                           "chunk_size": UPLOAD_SESSION_MIN_CHUNK}).json()["upload_id"]
+    assert client.put(f"/api/analysis/uploads/{upload_id}/chunks/0", content=upload).status_code == 200
+    response = client.post("/api/analysis/nanopore", data={"upload_id": upload_id})
+    assert response.status_code == 200, response.text
+
+    path = blob_store.blob_path(hashlib.sha256(upload).hexdigest())
+    assert bgzf.is_bgzf(path) and gzip.decompress(path.read_bytes()) == data
+    assert not list(upload_sessions.SESSIONS_DIR.glob(f"{upload_id}*"))
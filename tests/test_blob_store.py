@@ -0,0 +1,101 @@
+import hashlib
+import random
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.config import UPLOAD_SESSION_MIN_CHUNK
+from backend.models.db_models import Blob
+from backend.services import blob_store, upload_sessions
+
+
+def fastq(reads: int) -> bytes:
+    records = []
+    for i in range(reads):
+        seq = "".join(random.choice("ACGT") for _ in range(60))
+        records.append(f"@read{i}\n{seq}\n+\n{'I' * 60}\n")
+    return "".join(records).encode()
+
+
+def submit_nanopore(client, data: bytes):
+    return client.post("/api/analysis/nanopore", files={"fastq_file": ("reads.fastq", data)})
+
+
+def blob(db, data: bytes):
+    db.expire_all()
+    return db.get(Blob, hashlib.sha256(data).hexdigest())
+
+
+def test_blob_is_shared_and_released_with_last_job(client, db):
+    data = fastq(4)
+    first = submit_nanopore(client, data).json()["job_id"]
+    second = submit_nanopore(client, data).json()["job_id"]
+    sha256 = hashlib.sha256(data).hexdigest()
+    assert blob(db, data).ref_count == 2
+
+    assert client.delete(f"/api/analysis/jobs/{first}").status_code == 200
+    assert blob(db, data).ref_count == 1
+    assert blob_store.blob_path(sha256).exists()
+
+    assert client.delete(f"/api/analysis/jobs/{second}").status_code == 200
+    assert blob(db, data) is None
+    assert not blob_store.blob_path(sha256).exists()
+
+
+def test_rejected_pair_leaves_no_blobs(client, db):
+    r1, r2 = fastq(3), fastq(2)
+    response = client.post(
+        "/api/analysis/illumina",
+        data={"sequencing_type": "paired-end"},
+        files={"fastq_file": ("r1.fastq", r1), "fastq_file_r2": ("r2.fastq", r2)}
+    )
+
+    assert response.status_code == 400
+    for data in (r1, r2):
+        assert blob(db, data) is None
+        assert not blob_store.blob_path(hashlib.sha256(data).hexdigest()).exists()
+    assert not list(blob_store.INCOMING_DIR.glob("*.part"))
+
+
+def test_failed_commit_keeps_session_file_and_stores_nothing(client, db, monkeypatch):
+    data = fastq(4)
+    upload = client.post("/api/analysis/uploads", json={"filename": "reads.fastq", "size": len(data),
+                                                        "chunk_size": UPLOAD_SESSION_MIN_CHUNK}).json()
+    upload_id = upload["upload_id"]
+    assert client.put(f"/api/analysis/uploads/{upload_id}/chunks/0", content=data).status_code == 200
+
+    async def failing_commit(self):
+        raise OperationalError("COMMIT", {}, Exception("disk I/O error"))
+
+    monkeypatch.setattr(AsyncSession, "commit", failing_commit)
+    response = client.post("/api/analysis/nanopore", data={"upload_id": upload_id})
+    monkeypatch.undo()
+
+    assert response.status_code == 500
+    assert blob(db, data) is None
+    assert not blob_store.blob_path(hashlib.sha256(data).hexdigest()).exists()
+    status = client.get(f"/api/analysis/uploads/{upload_id}").json()
+    assert status["status"] == "open"
+    assert (upload_sessions.SESSIONS_DIR / f"{upload_id}.part").read_bytes() == data
+
+
+def test_rolled_back_release_keeps_blob_file(db):
+    data = fastq(3)
+    sha256 = hashlib.sha256(data).hexdigest()
+    tmp_path = blob_store.incoming_path(sha256)
+    tmp_path.write_bytes(data)
+    path = blob_store.store_file(db, tmp_path, sha256, len(data))
+    assert not path.exists()
+    db.commit()
+    blob_store.finish(db, True)
+    assert path.read_bytes() == data and not tmp_path.exists()
+
+    blob_store.release(db, sha256)
+    db.rollback()
+    blob_store.finish(db, False)
+    assert path.read_bytes() == data
+    assert blob(db, data).ref_count == 1
+
+    blob_store.release(db, sha256)
+    db.commit()
+    blob_store.finish(db, True)
+    assert not path.exists() and not list(path.parent.glob(f"{sha256}*"))
+    assert blob(db, data) is None
@@ -0,0 +1,17 @@
+import random
+from backend.pipeline.classify import KmerClassifier, build_tables
+
+
+def test_bootstrap_does_not_depend_on_batch(tmp_path):
+    rng = random.Random(1)
+    cores = ["".join(rng.choices("ACGT", k=600)) for _ in range(20)]
+    build_tables([(core.encode(), f"d__Bacteria;g__G{t}") for t, core in enumerate(cores)], tmp_path)
+    classifier = KmerClassifier(tmp_path)
+    queries = [cores[rng.randrange(20)][start:start + rng.randrange(40, 250)].encode()
+               for start in rng.choices(range(300), k=40)] + [b"", b"ACG"]
+
+    batched = classifier.classify(queries)
+    single = [classifier.classify([query])[0] for query in queries]
+
+    assert [(a.lineage, a.confidence) for a in batched] == [(a.lineage, a.confidence) for a in single]
+    assert all(a.confidence[-1] > 0.5 for a in batched[:40])
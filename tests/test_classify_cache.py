@@ -0,0 +1,51 @@
+import random
+import time
+from backend.pipeline import classify_cache
+from backend.pipeline.classify import ClassifyParams, KmerClassifier, build_tables
+from backend.pipeline.classify_cache import _ROW_OVERHEAD, CacheConfig, CacheStats, _DiskTier, classify_cached
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    row = len("ns") + 16 + 8 + _ROW_OVERHEAD
+    tier = _DiskTier(str(tmp_path / "cache.sqlite3"), max_bytes=10 * row)
+    digests = [bytes([i]) * 16 for i in range(10)]
+    for digest in digests:
+        clock[0] += 1
+        tier.put_many("ns", [(digest, 1, b"\0" * 8)])
+    clock[0] += 1
+    tier.get_many("ns", digests[:2])
+
+    # Сверх лимита: вытесняются записи, к которым дольше всего не обращались, до 90% лимита
+    clock[0] += 1
+    tier.put_many("ns", [(b"\xff" * 16, 1, b"\0" * 8)])
+
+    kept = tier.get_many("ns", digests + [b"\xff" * 16])
+    assert set(kept) == (set(digests) - {digests[2], digests[3]}) | {b"\xff" * 16}
+    assert tier.db.execute("SELECT bytes FROM usage").fetchone()[0] == 9 * row
+
+
+def test_classify_cached_reuses_results_across_processes(tmp_path, monkeypatch):
+    rng = random.Random(3)
+    cores = ["".join(rng.choices("ACGT", k=500)) for _ in range(10)]
+    build_tables([(core.encode(), f"d__Bacteria;g__G{t}") for t, core in enumerate(cores)], tmp_path / "ref",
+                 metadata={"name": "cache_test", "version": "1"})
+    classifier = KmerClassifier(tmp_path / "ref")
+    queries = [core[100:300].encode() for core in cores]
+    config = CacheConfig(str(tmp_path / "cache.sqlite3"))
+    params = ClassifyParams(bootstrap=20)
+    monkeypatch.setattr(classify_cache, "_memory", None)
+
+    first = CacheStats()
+    computed = classify_cached(classifier, queries, params, config, first)
+    # Новый процесс пула: пустой уровень в памяти, общий файл SQLite
+    monkeypatch.setattr(classify_cache, "_memory", None)
+    second = CacheStats()
+    cached = classify_cached(classifier, queries, params, config, second)
+    third = CacheStats()
+    classify_cached(classifier, queries, params, config, third)
+
+    assert (first.hits, second.disk_hits, third.memory_hits) == (0, 10, 10)
+    assert second.bytes_saved == sum(len(q) for q in queries)
+    assert [(a.lineage, a.confidence) for a in cached] == [(a.lineage, a.confidence) for a in computed]
@@ -0,0 +1,111 @@
+import random
+from collections import Counter
+import numpy as np
+from backend.pipeline import derep
+from backend.pipeline.derep import DerepTable, iter_uniques, merge_tables
+from backend.pipeline.fastq import parse_records
+from backend.pipeline.paired import BASE_CODE
+
+
+def batch(sequences: list):
+    data = "".join(f"@r{i}\n{s}\n+\n{'I' * len(s)}\n" for i, s in enumerate(sequences)).encode()
+    parsed, _ = parse_records(data, final=True)
+    return parsed
+
+
+def random_reads(count: int, seed: int = 1) -> list:
+    """Много повторов и хвост редких последовательностей, часть с N и строчными буквами"""
+    rng = random.Random(seed)
+    common = ["".join(rng.choices("ACGT", k=rng.randrange(1, 150))) for _ in range(300)]
+    reads = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.7:
+            sequence = common[min(int(rng.expovariate(0.05)), len(common) - 1)]
+        else:
+            sequence = "".join(rng.choices("ACGTN" if roll < 0.75 else "ACGT", k=rng.randrange(1, 150)))
+        reads.append(sequence.lower() if rng.random() < 0.05 else sequence)
+    return reads
+
+
+def dereplicate(chunks: list, tmp_path, memory_budget: int, partitions: int = derep.PARTITIONS):
+    tables = []
+    for i, reads in enumerate(chunks):
+        table = DerepTable(tmp_path / f"shard{i}", memory_budget, partitions)
+        for start in range(0, len(reads), 500):
+            table.add(batch(reads[start:start + 500]))
+        table.finish()
+        tables.append(table)
+    output = tmp_path / "uniques.fasta"
+    stats = merge_tables([t.spill_dir for t in tables], output, memory_budget, partitions)
+    return [(size, sequence.decode()) for _, size, sequence in iter_uniques(output)], stats, tables
+
+
+def naive(reads: list) -> list:
+    counts = Counter(read.upper() for read in reads)
+    return sorted(((size, sequence) for sequence, size in counts.items()), key=lambda x: (-x[0], x[1]))
+
+
+def test_pack_round_trip_with_odd_lengths():
+    rng = random.Random(2)
+    for bits, alphabet in ((derep._PACKED_BITS, "ACGT"), (derep._RAW_BITS, "ACGTNRY")):
+        per_word = 64 // bits
+        for width in (1, 2, 3):
+            # Длины на границах слов и четвёрок оснований, включая неполные
+            lengths = [n for n in range((width - 1) * per_word + 1, width * per_word + 1)]
+            sequences = ["".join(rng.choices(alphabet, k=n)) for n in lengths]
+            data = "".join(sequences).encode()
+            values = BASE_CODE[np.frombuffer(data, dtype=np.uint8)] if bits == derep._PACKED_BITS \
+                else np.frombuffer(data, dtype=np.uint8).copy()
+            values = np.concatenate([values, np.zeros(width * per_word, dtype=np.uint8)])
+            starts = np.cumsum(lengths) - lengths
+            rows = derep._pack(values, starts, np.array(lengths), bits, width)
+
+            assert rows.shape == (len(lengths), width + 1)
+            assert [s.decode() for s in derep._unpack(rows, bits)] == sequences
+
+
+def test_packed_row_order_is_sequence_order():
+    # Хвост слова заполняется нулями (код A), поэтому длина — в отдельном столбце строки
+    sequences = ["ACGT", "ACG", "ACGTA", "T", "A", "AA"]
+    values = np.concatenate([BASE_CODE[np.frombuffer("".join(sequences).encode(), dtype=np.uint8)],
+                             np.zeros(32, dtype=np.uint8)])
+    lengths = np.array([len(s) for s in sequences])
+    rows = derep._pack(values, np.cumsum(lengths) - lengths, lengths, derep._PACKED_BITS, 1)
+    assert len({tuple(row) for row in rows.tolist()}) == len(sequences)
+    by_words = [sequences[i] for i in np.lexsort((lengths, rows[:, 1]))]
+    assert by_words == sorted(sequences, key=lambda s: (s.ljust(32, "A"), len(s)))
+
+
+def test_in_memory_dereplication_matches_naive(tmp_path):
+    reads = random_reads(5000)
+
+    uniques, stats, (table,) = dereplicate([reads], tmp_path, 1 << 30)
+
+    assert uniques == naive(reads)
+    assert table.stats.spills == 0
+    assert stats.uniques == len(uniques)
+    assert stats.singletons == sum(size == 1 for size, _ in uniques)
+    assert stats.max_size == uniques[0][0]
+
+
+def test_spills_and_split_merge_match_naive(tmp_path, monkeypatch):
+    reads = random_reads(8000, seed=3)
+    depths = []
+    merge_partition = derep._merge_partition
+
+    def tracked(files, work_dir, memory_budget, partitions, depth, runs):
+        depths.append(depth)
+        return merge_partition(files, work_dir, memory_budget, partitions, depth, runs)
+
+    monkeypatch.setattr(derep, "_merge_partition", tracked)
+
+    # Бюджет меньше одной пачки: каждый add сбрасывает таблицу на диск,
+    # а разделы больше бюджета при объединении делятся по следующим битам хэша
+    uniques, stats, tables = dereplicate([reads[:3000], reads[3000:]], tmp_path, 4096, partitions=4)
+
+    assert uniques == naive(reads)
+    assert all(table.stats.spills > 0 and table.stats.spilled_bytes > 0 for table in tables)
+    assert max(depths) >= 2
+    assert stats.uniques == len(uniques)
+    assert not (tmp_path / "uniques.fasta.work").exists()
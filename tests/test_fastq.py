@@ -0,0 +1,25 @@
+import pytest
+from backend.pipeline.fastq import FastqFormatError, FastqStreamParser
+
+
+def records(count: int, length: int) -> bytes:
+    return b"".join(b"@r%d\n%s\n+\n%s\n" % (i, b"ACGT" * (length // 4), b"I" * length) for i in range(count))
+
+
+def parse(data: bytes, chunk: int, **kwargs) -> list:
+    parser = FastqStreamParser(**kwargs)
+    batches = [batch for i in range(0, len(data), chunk) for batch in parser.feed(data[i:i + chunk])]
+    batches += list(parser.close())
+    return [int(length) for batch in batches for length in batch.lengths]
+
+
+@pytest.mark.parametrize("chunk", [5, 1000, 1 << 20])
+def test_records_longer_than_chunks(chunk):
+    data = records(10, 100) + records(2, 40000) + records(10, 100)
+
+    assert parse(data, chunk) == [100] * 10 + [40000] * 2 + [100] * 10
+
+
+def test_record_longer_than_limit_is_rejected():
+    with pytest.raises(FastqFormatError, match="longer than"):
+        parse(records(1, 100) + b"@no-newlines-" + b"A" * 10000, 256, max_record_bytes=4096)
@@ -0,0 +1,92 @@
+import random
+import pytest
+from backend.pipeline.fastq import parse_records
+from backend.pipeline.filtering import REJECT_REASONS, FilterParams, FilterStats, filter_batch, format_fastq
+from backend.pipeline.qc import ERROR_PROBABILITY
+
+ERROR_TABLE = [float(p) for p in ERROR_PROBABILITY]
+
+
+def make_reads(count: int, seed: int = 1) -> list:
+    """Прочтения с N, IUPAC и строчными буквами, качество падает к концу"""
+    rng = random.Random(seed)
+    bases = "ACGT" * 30 + "acgt" * 5 + "N" * 3 + "RYK"
+    reads = []
+    for i in range(count):
+        length = rng.choice([0, 1, rng.randrange(2, 40), rng.randrange(40, 300)])
+        sequence = "".join(rng.choices(bases, k=length))
+        quality = "".join(chr(33 + max(2, min(41, 40 - j // 6 - rng.randint(-2, 12)))) for j in range(length))
+        reads.append((f"read{i} extra", sequence, quality))
+    return reads
+
+
+def reference(reads: list, params: FilterParams):
+    """Фильтр по одному прочтению: эталон для векторизованной версии"""
+    passed, rejected = [], dict.fromkeys(REJECT_REASONS, 0)
+    for name, sequence, quality in reads:
+        end = len(sequence) if params.trim_after_base is None else min(len(sequence), params.trim_after_base)
+        sequence, quality = sequence[params.trim_first_bases:end], quality[params.trim_first_bases:end]
+        if params.truncq is not None:
+            cut = next((j for j, q in enumerate(quality) if ord(q) - 33 <= params.truncq), len(quality))
+            sequence, quality = sequence[:cut], quality[:cut]
+        checks = [
+            ("too_short", len(sequence) < max(params.minlen, 1)),
+            ("too_many_ns", params.maxns is not None and sequence.upper().count("N") > params.maxns),
+            ("too_many_ambiguous", params.max_ambiguous is not None
+             and sum(base not in "ACGTacgt" for base in sequence) > params.max_ambiguous),
+            ("expected_errors", params.maxee is not None
+             and sum(ERROR_TABLE[ord(q)] for q in quality) > params.maxee),
+            ("low_quality", params.min_quality is not None
+             and sum(ord(q) - 33 for q in quality) < params.min_quality * len(quality)),
+        ]
+        reason = next((reason for reason, failed in checks if failed), None)
+        if reason is None:
+            passed.append((name, sequence, quality))
+        else:
+            rejected[reason] += 1
+    return passed, rejected
+
+
+@pytest.mark.parametrize("params", [
+    FilterParams(),
+    FilterParams(minlen=50),
+    FilterParams(maxns=0),
+    FilterParams(maxns=2, max_ambiguous=1),
+    FilterParams(maxee=1.0),
+    FilterParams(maxee=0.5, minlen=20),
+    FilterParams(min_quality=25),
+    FilterParams(truncq=10, minlen=30),
+    FilterParams(trim_first_bases=15, trim_after_base=120, minlen=40),
+    FilterParams(min_quality=20, max_ambiguous=2, minlen=100, maxns=1, maxee=2.0,
+                 trim_first_bases=10, trim_after_base=240, truncq=2),
+])
+def test_filter_matches_reference_loop(params):
+    reads = make_reads(2000)
+    data = "".join(f"@{name}\n{seq}\n+\n{qual}\n" for name, seq, qual in reads).encode()
+    batch, _ = parse_records(data, final=True)
+    stats = FilterStats()
+
+    result = filter_batch(batch, params, stats)
+
+    passed, rejected = reference(reads, params)
+    assert format_fastq(result).decode() == "".join(f"@{name}\n{seq}\n+\n{qual}\n" for name, seq, qual in passed)
+    assert stats.rejected == rejected
+    assert (stats.reads_in, stats.reads_out) == (len(reads), len(passed))
+    assert stats.bases_in == sum(len(seq) for _, seq, _ in reads)
+    assert stats.bases_out == sum(len(seq) for _, seq, _ in passed)
+
+
+def test_thresholds_are_inclusive():
+    # Ровно на пороге прочтение проходит: maxns, max_ambiguous — «не больше», min_quality — «не меньше»
+    reads = [("a", "ANNA", "IIII"), ("b", "ARYA", "IIII"), ("c", "ACGT", "++++"), ("d", "ACGT", "5555")]
+    data = "".join(f"@{name}\n{seq}\n+\n{qual}\n" for name, seq, qual in reads).encode()
+    batch, _ = parse_records(data, final=True)
+
+    assert len(filter_batch(batch, FilterParams(maxns=2))) == 4
+    assert len(filter_batch(batch, FilterParams(maxns=1))) == 3
+    assert len(filter_batch(batch, FilterParams(max_ambiguous=2))) == 4
+    assert len(filter_batch(batch, FilterParams(max_ambiguous=1))) == 2
+    assert len(filter_batch(batch, FilterParams(maxee=0.41))) == 4
+    assert len(filter_batch(batch, FilterParams(maxee=0.39))) == 3
+    assert len(filter_batch(batch, FilterParams(min_quality=20))) == 3
+    assert len(filter_batch(batch, FilterParams(min_quality=21))) == 2
@@ -0,0 +1,55 @@
+import json
+from backend.models.db_models import AnalysisJob
+
+
+def add_jobs(db, user_id: int, count: int, **fields) -> list:
+    # created_at не задаётся: server_default с точностью до секунды даёт одинаковое время
+    jobs = [
+        AnalysisJob(job_id=f"{user_id}-{i}-{fields.get('status', 'pending')}", user_id=user_id, type="illumina",
+                    file_path="", parameters=json.dumps({}), analysis_name=f"run {i}", **fields)
+        for i in range(count)
+    ]
+    db.add_all(jobs)
+    db.commit()
+    return [job.job_id for job in jobs]
+
+
+def walk(client, query: str = "") -> list:
+    pages, cursor = [], None
+    while True:
+        response = client.get("/api/analysis/jobs?limit=2" + query + (f"&cursor={cursor}" if cursor else ""))
+        assert response.status_code == 200, response.text
+        body = response.json()
+        pages.append([job["job_id"] for job in body["jobs"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+        assert len(pages) < 10, "pagination does not advance"
+
+
+def test_pages_cover_all_jobs_newest_first(client, db):
+    ids = add_jobs(db, client.user_id, 5)
+
+    pages = walk(client)
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sum(pages, []) == ids[::-1]
+
+
+def test_filters_apply_across_pages(client, db):
+    add_jobs(db, client.user_id, 3, status="completed")
+    failed = add_jobs(db, client.user_id, 3, status="failed")
+
+    pages = walk(client, "&status=failed")
+
+    assert sum(pages, []) == failed[::-1]
+
+
+def test_other_users_jobs_are_not_listed(client, db):
+    add_jobs(db, client.user_id + 1000, 2)
+
+    assert walk(client) == [[]]
+
+
+def test_invalid_cursor_is_rejected(client):
+    assert client.get("/api/analysis/jobs?cursor=not-a-cursor").status_code == 400
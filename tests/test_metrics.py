@@ -0,0 +1,12 @@
+from prometheus_client import generate_latest
+from backend.services.metrics import registry
+
+
+def test_metrics_endpoint_exposes_pool_and_request_metrics(client):
+    client.get("/api/analysis/jobs")
+
+    text = client.get("/metrics").text
+
+    assert 'db_pool_connection_hold_seconds_count{engine="async"}' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/analysis/jobs",status="200"}' in text
+    assert "db_pool_checkout_seconds" not in generate_latest(registry).decode()
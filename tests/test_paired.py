@@ -0,0 +1,117 @@
+import random
+import pytest
+from backend.pipeline.fastq import FastqFormatError, parse_records
+from backend.pipeline.paired import (
+    MergeParams, MergeStats, check_merge_rate, iter_interleaved, iter_pairs, merge_pairs
+)
+from backend.pipeline.runner import run_analysis
+
+COMPLEMENT = str.maketrans("ACGT", "TGCA")
+
+
+def revcomp(sequence: str) -> str:
+    return sequence.translate(COMPLEMENT)[::-1]
+
+
+def fastq(records) -> bytes:
+    return "".join(f"@{name}\n{seq}\n+\n{qual}\n" for name, seq, qual in records).encode()
+
+
+def batch(records):
+    parsed, _ = parse_records(fastq(records), final=True)
+    return parsed
+
+
+def reads(merged) -> list:
+    raw = bytes(merged.data)
+    return [
+        (raw[a:b].decode(), raw[s:s + n].decode(), raw[q:q + n].decode())
+        for a, b, s, q, n in zip(
+            merged.name_start, merged.name_end, merged.seq_start, merged.qual_start, merged.lengths
+        )
+    ]
+
+
+def amplicons(count: int, length: int, read_length: int, seed: int = 1):
+    """Пары R1/R2 без ошибок: R1 — начало ампликона, R2 — обратный комплемент конца"""
+    rng = random.Random(seed)
+    pairs = []
+    for i in range(count):
+        amplicon = "".join(rng.choices("ACGT", k=length))
+        pairs.append((
+            (f"p{i}/1", amplicon[:read_length], "I" * read_length),
+            (f"p{i}/2", revcomp(amplicon[-read_length:]), "I" * read_length),
+            amplicon,
+        ))
+    return pairs
+
+
+def test_overlapping_pairs_are_merged():
+    pairs = amplicons(50, 300, 200) + amplicons(50, 180, 150, seed=2)
+    stats = MergeStats()
+
+    merged = merge_pairs(batch([p[0] for p in pairs]), batch([p[1] for p in pairs]), MergeParams(), stats)
+
+    assert [seq for _, seq, _ in reads(merged)] == [p[2] for p in pairs]
+    assert [name for name, _, _ in reads(merged)] == [p[0][0] for p in pairs]
+    assert (stats.pairs, stats.merged, stats.no_overlap, stats.too_many_diffs) == (100, 100, 0, 0)
+
+
+def test_mismatch_takes_the_better_quality_base():
+    (r1, r2, amplicon), = amplicons(1, 300, 200)
+    # Позиция 150 — в перекрытии (100..199): в R1 ошибка с низким качеством,
+    # позиция 120 — ошибка в R2 с низким качеством
+    wrong = "A" if amplicon[150] != "A" else "C"
+    seq1 = r1[1][:150] + wrong + r1[1][151:]
+    qual1 = "I" * 150 + "+" + "I" * 49
+    j = 299 - 120  # позиция 120 ампликона в R2 (обратный комплемент)
+    other = "A" if amplicon[120] != "A" else "C"
+    seq2 = r2[1][:j] + revcomp(other) + r2[1][j + 1:]
+    qual2 = "5" * j + "#" + "5" * (199 - j)
+
+    (_, sequence, quality), = reads(merge_pairs(batch([(r1[0], seq1, qual1)]), batch([(r2[0], seq2, qual2)]),
+                                                MergeParams()))
+
+    assert sequence == amplicon
+    # Расхождение: качество |Q1 - Q2|; совпадение — большее из двух
+    assert quality[150] == chr(33 + abs(10 - 20)) and quality[120] == chr(33 + 40 - 2)
+    assert quality[101] == "I" and quality[250] == "5"
+
+
+def test_pairs_without_overlap_fail_the_merge_rate():
+    pairs = amplicons(10, 300, 200) + amplicons(30, 500, 200, seed=3)
+    stats = MergeStats()
+    merged = merge_pairs(batch([p[0] for p in pairs]), batch([p[1] for p in pairs]), MergeParams(), stats)
+
+    assert len(merged) == 10
+    assert (stats.merged, stats.no_overlap) == (10, 30)
+    check_merge_rate(stats, MergeParams(min_merge_rate=0.25))
+    with pytest.raises(ValueError, match="Only 10 of 40 read pairs"):
+        check_merge_rate(stats, MergeParams(min_merge_rate=0.3))
+
+
+def test_interleaved_and_two_files_give_the_same_pairs():
+    pairs = amplicons(30, 300, 200)
+    interleaved = batch([read for p in pairs for read in p[:2]])
+
+    # Пачки делятся посреди пары: R1 последней пары ждёт свой R2 в следующей пачке
+    from_interleaved = iter_interleaved([interleaved.records(0, 25), interleaved.records(25, 60)])
+    from_files = iter_pairs([batch([p[0] for p in pairs[:20]]), batch([p[0] for p in pairs[20:]])],
+                            [batch([p[1] for p in pairs])])
+
+    merged = [[read for r1, r2 in stream for read in reads(merge_pairs(r1, r2, MergeParams()))]
+              for stream in (from_interleaved, from_files)]
+    assert merged[0] == merged[1]
+    assert [seq for _, seq, _ in merged[0]] == [p[2] for p in pairs]
+    with pytest.raises(FastqFormatError, match="odd number"):
+        list(iter_interleaved([interleaved.records(0, 59)]))
+    with pytest.raises(FastqFormatError, match="out of sync"):
+        list(iter_interleaved([interleaved.records(1, 59)]))
+
+
+def test_paired_job_with_unmergeable_reads_fails(tmp_path):
+    path = tmp_path / "reads.fastq"
+    path.write_bytes(fastq([read for p in amplicons(40, 600, 250) for read in p[:2]]))
+
+    with pytest.raises(ValueError, match="Only 0 of 40 read pairs"):
+        run_analysis("illumina", path, {"sequencing_type": "paired-end"}, tmp_path / "out")
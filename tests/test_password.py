@@ -0,0 +1,63 @@
+import asyncio
+import contextlib
+import io
+import threading
+import uuid
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from backend.main import app
+from backend.services.password import (
+    PasswordHasher, get_password_hash_async, verify_password, verify_password_async
+)
+
+
+def test_async_hashing_results():
+    async def run():
+        hashed = await get_password_hash_async("secret")
+        return hashed, await verify_password_async("secret", hashed), await verify_password_async("wrong", hashed)
+
+    hashed, good, bad = asyncio.run(run())
+    assert hashed.startswith("$2") and hashed != "secret"
+    assert verify_password("secret", hashed)
+    assert good and not bad
+
+
+def test_requests_over_the_queue_cap_are_rejected():
+    hasher = PasswordHasher(concurrency=1, max_queue=2)
+    release = threading.Event()
+
+    async def run():
+        # Первый вызов занимает единственный поток, два следующих ждут в очереди
+        first = asyncio.ensure_future(hasher.run(release.wait))
+        while not hasher.active:
+            await asyncio.sleep(0.01)
+        queued = [asyncio.ensure_future(hasher.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as rejected:
+            await hasher.run(release.wait)
+        release.set()
+        await asyncio.gather(first, *queued)
+        return rejected.value
+
+    try:
+        error = asyncio.run(run())
+    finally:
+        release.set()
+        hasher.shutdown()
+    assert error.status_code == 503 and error.headers == {"Retry-After": "1"}
+    metrics = hasher.metrics()
+    assert (metrics["completed"], metrics["rejected"], metrics["max_queued"], metrics["queued"]) == (3, 1, 2, 0)
+
+
+def test_hashing_works_after_the_app_restarts():
+    username = f"user-{uuid.uuid4().hex[:12]}"
+    for attempt in range(3):
+        # Каждый выход из контекста — остановка приложения (cleanup_processes)
+        with contextlib.redirect_stdout(io.StringIO()), TestClient(app) as client:
+            if attempt == 0:
+                client.post("/api/auth/register", json={"username": username, "email": f"{username}@example.org",
+                                                        "password": "secret"})
+            response = client.post("/api/auth/login", data={"username": username, "password": "secret"},
+                                   follow_redirects=False)
+            assert response.status_code == 303, response.text
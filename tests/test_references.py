@@ -0,0 +1,106 @@
+import asyncio
+import json
+import random
+from backend.config import REFERENCE_DIR
+from backend.pipeline.classify import KmerClassifier
+from backend.pipeline.references import build_index, current_index, load_exact_matches
+from backend.pipeline import derep
+from backend.pipeline.runner import CLASSIFY_BATCH, SUMMARY_FILE, classification_parts, classify_part
+from backend.pipeline.derep import UNIQUES_FILE
+from backend.services import job_results
+
+
+def write_fasta(path, records):
+    path.write_text("".join(f">{record_id} {lineage}\n{sequence}\n" for record_id, lineage, sequence in records))
+
+
+def reference(tmp_path, name="test_exact"):
+    rng = random.Random(2)
+    sequences = ["".join(rng.choices("ACGT", k=300)) for _ in range(4)]
+    records = [
+        ("a", "d__Bacteria;p__A;g__A1", sequences[0]),
+        ("b", "d__Bacteria;p__A;g__A2", sequences[1]),
+        ("c", "d__Bacteria;p__B;g__B1", sequences[2]),
+        # Одна последовательность у двух таксонов — точное совпадение неоднозначно
+        ("d", "d__Bacteria;p__B;g__B1", sequences[3]),
+        ("e", "d__Bacteria;p__B;g__B2", sequences[3]),
+    ]
+    fasta = tmp_path / "ref.fasta"
+    write_fasta(fasta, records)
+    build_index(REFERENCE_DIR, name, fasta)
+    return current_index(REFERENCE_DIR, name), sequences
+
+
+def test_exact_matches(tmp_path):
+    path, sequences = reference(tmp_path)
+    taxa = KmerClassifier(path).taxa
+
+    found = load_exact_matches(str(path)).lookup([s.lower().encode() for s in sequences] + [b"ACGT" * 20])
+
+    assert [taxa[t] for t in found[:3]] == ["d__Bacteria;p__A;g__A1", "d__Bacteria;p__A;g__A2",
+                                            "d__Bacteria;p__B;g__B1"]
+    assert found[3:].tolist() == [-1, -1]
+
+
+def test_classify_part_uses_exact_matches(tmp_path):
+    path, sequences = reference(tmp_path)
+    uniques = [sequences[0], sequences[2][:200]]
+    (tmp_path / UNIQUES_FILE).write_text("".join(f">u{i};size=5\n{s}\n" for i, s in enumerate(uniques)))
+
+    counts = classify_part(tmp_path, path, {}, 0, 2, 0)
+
+    assert counts["uniques"] == 2
+    assert counts["exact_matches"] == 1
+    lines = (tmp_path / "classification" / f"{0:010d}.tsv").read_text().splitlines()
+    assert lines[0].split("\t")[1:] == ["d__Bacteria;p__A;g__A1", "1.0000"]
+
+
+def test_classification_parts_start_at_their_records(tmp_path, monkeypatch):
+    path, sequences = reference(tmp_path)
+    rng = random.Random(5)
+    count = 3 * CLASSIFY_BATCH + 17
+    uniques = [sequences[i % 3][:rng.randrange(50, 300)] for i in range(count)]
+    (tmp_path / UNIQUES_FILE).write_text("".join(f">Uniq{i + 1};size={count - i}\n{s}\n" for i, s in enumerate(uniques)))
+    (tmp_path / SUMMARY_FILE).write_text(json.dumps({"dereplication": {"uniques": count}}))
+    # Смещения записей ищутся по кускам файла: границы кусков посреди записей
+    monkeypatch.setattr(derep, "_OFFSETS_CHUNK", 4096 + 7)
+
+    parts = classification_parts(tmp_path, 3)
+
+    assert [(start, end) for start, end, _ in parts] == [(0, count // 3), (count // 3, 2 * count // 3), (2 * count // 3, count)]
+    names = []
+    for start, end, offset in parts:
+        assert classify_part(tmp_path, path, {}, start, end, offset)["uniques"] == end - start
+        lines = (tmp_path / "classification" / f"{start:010d}.tsv").read_text().splitlines()
+        names += [line.split("\t")[0] for line in lines]
+    assert names == [f"Uniq{i + 1};size={count - i}" for i in range(count)]
+
+
+def test_taxonomy_tree_endpoint(client, tmp_path):
+    reference(tmp_path, "test_tree")
+
+    tree = client.get("/api/references/test_tree/taxonomy").json()
+
+    assert tree["count"] == 5
+    assert {child["name"]: child["count"] for child in tree["children"][0]["children"]} == {"p__A": 2, "p__B": 3}
+    assert client.get("/api/references/missing_ref/taxonomy").status_code == 404
+
+
+def test_submit_resolves_reference_off_the_event_loop(client, monkeypatch):
+    # Ключ результата читает файлы текущей версии референса — не в цикле событий
+    calls = []
+
+    def resolve(parameters):
+        try:
+            asyncio.get_running_loop()
+            calls.append("event loop")
+        except RuntimeError:
+            calls.append("thread")
+        return None, "not installed"
+
+    monkeypatch.setattr(job_results, "resolve_reference", resolve)
+    data = b"@r\nACGTACGTAC\n+\nIIIIIIIIII\n"
+    response = client.post("/api/analysis/nanopore", files={"fastq_file": ("reads.fastq", data)})
+
+    assert response.status_code == 200, response.text
+    assert calls == ["thread"]
@@ -0,0 +1,56 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from backend.models.db_models import RevokedToken
+from backend.services import database
+from backend.services.revocation import RevocationStore
+
+
+def test_revocation_expires_with_token(monkeypatch):
+    async def scenario():
+        store = RevocationStore()
+        now = time.time()
+        await store.revoke("short", now + 10)
+        await store.revoke("long", now + 3600)
+        await store.revoke("expired", now - 1)
+        assert await store.is_revoked("short")
+        assert not await store.is_revoked("expired")
+
+        monkeypatch.setattr(time, "time", lambda: now + 60)
+        assert not await store.is_revoked("short")
+        assert await store.is_revoked("long")
+        assert len(store) == 1
+
+    asyncio.run(scenario())
+
+
+def test_revocation_is_shared_through_the_table():
+    async def scenario():
+        writer = RevocationStore(database.SessionLocal, sync_interval=0)
+        reader = RevocationStore(database.SessionLocal, sync_interval=0)
+        assert not await reader.is_revoked("shared-token")
+        await writer.revoke("shared-token", time.time() + 3600)
+        assert await reader.is_revoked("shared-token")
+        assert not await reader.is_revoked("other-token")
+
+    asyncio.run(scenario())
+
+
+def test_revocation_after_expired_rows_are_removed():
+    async def scenario():
+        writer = RevocationStore(database.SessionLocal, sync_interval=0)
+        reader = RevocationStore(database.SessionLocal, sync_interval=0)
+        await writer.revoke("before-expiry", time.time() + 3600)
+        assert await reader.is_revoked("before-expiry")
+
+        # Все отзывы истекли: следующая запись удаляет их и получает новый id
+        db = database.SessionLocal()
+        try:
+            db.query(RevokedToken).update({RevokedToken.expires_at: datetime.now(timezone.utc) - timedelta(seconds=1)})
+            db.commit()
+        finally:
+            db.close()
+        await writer.revoke("after-expiry", time.time() + 3600)
+        assert await reader.is_revoked("after-expiry")
+
+    asyncio.run(scenario())
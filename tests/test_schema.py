@@ -0,0 +1,53 @@
+import contextlib
+import io
+import json
+from sqlalchemy import create_engine, inspect, text
+from backend.models.db_models import Base
+from backend.services.database import init_db
+
+# Таблицы первой версии приложения, до новых столбцов и индексов
+OLD_SCHEMA = [
+    """CREATE TABLE users (
+        id INTEGER PRIMARY KEY, username VARCHAR(50) NOT NULL UNIQUE, email VARCHAR(100) NOT NULL UNIQUE,
+        hashed_password VARCHAR(255) NOT NULL, full_name VARCHAR(100), country VARCHAR(50), role VARCHAR(50),
+        institution_type VARCHAR(50), disabled BOOLEAN, registration_date DATETIME DEFAULT (CURRENT_TIMESTAMP)
+    )""",
+    """CREATE TABLE analysis_jobs (
+        id INTEGER PRIMARY KEY, job_id VARCHAR(36) NOT NULL UNIQUE,
+        user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE, type VARCHAR(20) NOT NULL,
+        file_path VARCHAR(500) NOT NULL, parameters TEXT NOT NULL, status VARCHAR(20),
+        created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), completed_at DATETIME, result_path VARCHAR(500)
+    )""",
+    "INSERT INTO users (id, username, email, hashed_password) VALUES (1, 'old', 'old@example.com', 'x')",
+    """INSERT INTO analysis_jobs (job_id, user_id, type, file_path, parameters, status) VALUES
+        ('job-1', 1, 'illumina', '/data/a.fastq', '{"analysis_name": "Soil"}', 'completed'),
+        ('job-2', 1, 'nanopore', '/data/b.fastq', '{}', 'failed')""",
+]
+
+
+def test_old_database_is_upgraded_in_place(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        for statement in OLD_SCHEMA:
+            conn.execute(text(statement))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db(engine)
+        # Повторный запуск ничего не меняет
+        init_db(engine)
+
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        assert {c.name for c in table.columns} <= {c["name"] for c in inspector.get_columns(table.name)}
+        assert {i.name for i in table.indexes} <= {i["name"] for i in inspector.get_indexes(table.name)}
+    index = next(i for i in inspector.get_indexes("analysis_jobs") if i["name"] == "ix_analysis_jobs_user_id")
+    assert index["column_names"] == ["user_id", "id"]
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT job_id, analysis_name, input_hash, status FROM analysis_jobs ORDER BY id"))
+        assert [tuple(row) for row in rows] == [("job-1", "Soil", None, "completed"), ("job-2", None, None, "failed")]
+        # Новые столбцы принимают записи старых задач
+        conn.execute(text("UPDATE analysis_jobs SET stages = :stages WHERE job_id = 'job-1'"),
+                     {"stages": json.dumps({"filtering": "key"})})
+        conn.commit()
+    engine.dispose()
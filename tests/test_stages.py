@@ -0,0 +1,54 @@
+import json
+import os
+from backend.pipeline.stages import StageStore, stage_keys
+
+PARAMETERS = {"minlen": 150, "maxee": 2.0, "classifier": "naive-bayes", "reference_sequences": "silva",
+              "reference_db": "gtdb", "min_confidence": 0.8, "analysis_name": "run"}
+
+
+def keys(**changes):
+    return stage_keys("illumina", "r1-hash", None, {**PARAMETERS, **changes}, "silva_gtdb@1")
+
+
+def test_downstream_parameters_keep_upstream_keys():
+    base = keys()
+
+    assert keys(analysis_name="other", additional_email=None) == base
+    reclassified = keys(min_confidence=0.5)
+    assert reclassified["filtering"] == base["filtering"]
+    assert reclassified["classification"] != base["classification"]
+    refiltered = keys(minlen=100)
+    assert refiltered["filtering"] != base["filtering"]
+    assert refiltered["classification"] != base["classification"]
+
+
+def job_output(path, uniques: bytes):
+    path.mkdir()
+    (path / "filtered.fastq").write_bytes(b"@r\nACGT\n+\nIIII\n")
+    (path / "uniques.fasta").write_bytes(uniques)
+    (path / "summary.json").write_text(json.dumps({"filtering": {"reads_in": 1}, "dereplication": {"uniques": 1}}))
+    return path
+
+
+def test_saved_stage_is_restored_into_a_new_job(tmp_path):
+    store = StageStore(tmp_path / "stages", max_bytes=1 << 20)
+    store.save("filtering", "key", job_output(tmp_path / "first", b">u;size=1\nACGT\n"), ["filtering"])
+
+    assert store.restore("filtering", "key", tmp_path / "second")
+    assert (tmp_path / "second" / "uniques.fasta").read_bytes() == b">u;size=1\nACGT\n"
+    assert json.loads((tmp_path / "second" / "summary.json").read_text()) == {"filtering": {"reads_in": 1}}
+    assert not store.restore("filtering", "other-key", tmp_path / "third")
+
+
+def test_least_recently_used_stage_is_evicted(tmp_path):
+    store = StageStore(tmp_path / "stages", max_bytes=1 << 20)
+    for i, key in enumerate(("first", "second", "third")):
+        store.save("filtering", key, job_output(tmp_path / key, b"A" * 300_000), ["filtering"])
+        os.utime(tmp_path / "stages" / "filtering" / key / "stage.json", (1000 + i, 1000 + i))
+    # Восстановление обновляет время использования
+    assert store.restore("filtering", "first", tmp_path / "restored")
+
+    store.max_bytes = 700_000
+    store.evict()
+
+    assert sorted(entry.name for entry in store.entries()) == ["first", "third"]
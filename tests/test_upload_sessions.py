@@ -0,0 +1,108 @@
+import asyncio
+import random
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+from backend.config import UPLOAD_SESSION_MIN_CHUNK
+from backend.models.db_models import UploadSession
+from backend.services import database, upload_sessions
+
+CHUNK = UPLOAD_SESSION_MIN_CHUNK
+
+
+def fastq(size: int) -> bytes:
+    records, total, i = [], 0, 0
+    while total < size:
+        seq = "".join(random.choice("ACGT") for _ in range(150))
+        records.append(f"@read{i}\n{seq}\n+\n{'I' * 150}\n".encode())
+        total += len(records[-1])
+        i += 1
+    return b"".join(records)
+
+
+def create(client, data: bytes) -> dict:
+    response = client.post("/api/analysis/uploads", json={"filename": "reads.fastq", "size": len(data),
+                                                          "chunk_size": CHUNK})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def put(client, upload_id: str, data: bytes, index: int, body: bytes = None):
+    body = data[index * CHUNK:(index + 1) * CHUNK] if body is None else body
+    return client.put(f"/api/analysis/uploads/{upload_id}/chunks/{index}", content=body)
+
+
+def missing(client, upload_id: str) -> list:
+    return client.get(f"/api/analysis/uploads/{upload_id}").json()["missing_chunks"]
+
+
+def test_chunks_resume_out_of_order_and_finalize(client):
+    data = fastq(3 * CHUNK)
+    upload = create(client, data)
+    upload_id = upload["upload_id"]
+    assert upload["total_chunks"] == 4
+
+    for index in (3, 0):
+        assert put(client, upload_id, data, index).status_code == 200
+    assert missing(client, upload_id) == [1, 2]
+    for index in (2, 1, 1):
+        assert put(client, upload_id, data, index).status_code == 200
+    assert missing(client, upload_id) == []
+
+    response = client.post("/api/analysis/nanopore", data={"upload_id": upload_id})
+    assert response.status_code == 200, response.text
+    status = client.get(f"/api/analysis/uploads/{upload_id}").json()
+    assert status["status"] == "completed"
+    assert client.post("/api/analysis/nanopore", data={"upload_id": upload_id}).status_code == 409
+
+
+def test_interrupted_resend_marks_chunk_missing(client):
+    data = fastq(2 * CHUNK)
+    upload_id = create(client, data)["upload_id"]
+    assert put(client, upload_id, data, 1).status_code == 200
+    assert 1 not in missing(client, upload_id)
+
+    async def disconnected():
+        yield data[CHUNK:CHUNK + 1000]
+        raise ConnectionError("client disconnected")
+
+    async def resend():
+        # Своё соединение: пул общего async engine привязан к циклу событий клиента
+        engine = create_async_engine(database.ASYNC_DATABASE_URL, poolclass=NullPool)
+        try:
+            async with AsyncSession(engine) as db:
+                session = (await db.execute(
+                    select(UploadSession).filter(UploadSession.upload_id == upload_id)
+                )).scalar_one()
+                await upload_sessions.write_chunk(db, session, 1, disconnected())
+        finally:
+            await engine.dispose()
+
+    try:
+        asyncio.run(resend())
+    except ConnectionError:
+        pass
+    assert 1 in missing(client, upload_id)
+
+
+def test_invalid_file_keeps_session_open(client):
+    data = fastq(2 * CHUNK)
+    upload_id = create(client, data)["upload_id"]
+    assert put(client, upload_id, data, 0).status_code == 200
+    assert put(client, upload_id, data, 1, b"X" * CHUNK).status_code == 200
+    assert put(client, upload_id, data, 2).status_code == 200
+
+    response = client.post("/api/analysis/nanopore", data={"upload_id": upload_id})
+    assert response.status_code == 400
+    assert client.get(f"/api/analysis/uploads/{upload_id}").json()["status"] == "open"
+
+    # Повторно отправленный чанк исправляет файл, оставшийся в сессии
+    assert put(client, upload_id, data, 1).status_code == 200
+    assert client.post("/api/analysis/nanopore", data={"upload_id": upload_id}).status_code == 200
+
+
+def test_session_size_is_capped(client, monkeypatch):
+    monkeypatch.setattr(upload_sessions, "UPLOAD_MAX_SIZE", 10 * CHUNK)
+    response = client.post("/api/analysis/uploads", json={"filename": "reads.fastq", "size": 10 * CHUNK + 1,
+                                                          "chunk_size": CHUNK})
+    assert response.status_code == 413